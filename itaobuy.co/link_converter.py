@@ -1,11 +1,52 @@
 from __future__ import annotations
 
+import argparse
+import asyncio
+import codecs
+import csv
+import functools
+import io
+import itertools
+import json
+import os
 import re
-from typing import Dict, List, Optional, Tuple
-from urllib.parse import parse_qs, urlencode, urlparse
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import asynccontextmanager, contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    TypeVar,
+)
+from urllib.parse import parse_qs, quote_plus, urlparse
 
 import httpx
 
+try:  # HTTP/2 is used when the optional h2 package is installed
+    import h2  # noqa: F401
+
+    _HAS_HTTP2 = True
+except ImportError:  # pragma: no cover - depends on environment
+    _HAS_HTTP2 = False
+
 from app.marketplace import (
     build_1688_url,
     build_marketplace_url,
@@ -16,6 +57,79 @@ from app.marketplace import (
 Marketplace = str
 ItemId = str
 
+_REQUEST_HEADERS = {"User-Agent": "python-link-converter"}
+
+_T = TypeVar("_T")
+
+# ---------------------------------------------------------------------- #
+# Precompiled pattern bank: every parser below uses these instead of     #
+# inline pattern strings, so no call goes through re's pattern cache.    #
+# ---------------------------------------------------------------------- #
+_LEADING_AT_RE = re.compile(r"^@+")
+_PID_INVALID_CHARS_RE = re.compile(r"[^\w\-]")
+
+# URL extraction from pasted text
+_URL_TERMINATOR_RE = re.compile(r"[\s\]\)<>'\"]+")
+_URL_TRAILING_PUNCT_RE = re.compile(r"[.,;:!?)+\]]+$")
+_URL_IN_TEXT_RE = re.compile(r"https?://[^\s\"')<>]+", re.IGNORECASE)
+_INNER_URL_PARAM_RE = re.compile(
+    r"(?:^|[?&#])(?:url|link|u|productLink)=([^&#\s]+)", re.IGNORECASE
+)
+
+# Marketplace / agent URL shapes
+_OFFER_PATH_RE = re.compile(r"/offer/(\d+)")
+_MARKETPLACE_HOST_RE = re.compile(r"(taobao|tmall|weidian|1688)\.com$")
+_PICKSLY_ITEM_RE = re.compile(r"/item/([A-Z_]+)/(\d+)")
+_ITEM_HTML_1688_RE = re.compile(r"item-1688-(\d+)\.html")
+_ITEM_HTML_MICRO_RE = re.compile(r"item-micro-(\d+)\.html")
+_ITEM_HTML_RE = re.compile(r"item-(\d+)\.html")
+_EASTMALL_ID_RE = re.compile(r"(?:1688ID|itemID)=(\d+)")
+
+# Product ids in free text, one alternation in extract_platform_and_id_from_text
+# priority order (offer page > weidian itemID > taobao id > /item/PLATFORM/id)
+_TEXT_ID_RE = re.compile(
+    r"offer/(?P<offer>\d+)\.html"
+    r"|(?:itemID|itemId)=(?P<itemid>\d{6,})"
+    r"|[?&]id=(?P<id>\d{6,})"
+    r"|(?i:/item/(?P<platform>TAOBAO|TMALL|WEIDIAN|ALIBABA|1688)/)(?P<platform_id>\d+)"
+)
+_TEXT_ID_RANK = {"offer": 0, "itemid": 1, "id": 2, "platform_id": 3}
+
+# Already-canonical marketplace URLs, answered by convert_link without any
+# other stage; the groups name the marketplace each shape belongs to
+_CANONICAL_MARKETPLACE_URL_RE = re.compile(
+    r"https?://(?:www\.)?(?:"
+    r"(?P<taobao_host>item\.taobao\.com|detail\.tmall\.com)/item\.htm\?id=(?P<taobao>\d+)"
+    r"|(?P<weidian_host>weidian\.com)/item\.html\?itemI[Dd]=(?P<weidian>\d+)"
+    r"|(?P<ali_host>detail\.1688\.com)/offer/(?P<ali>\d+)\.html"
+    r")"
+)
+
+# HTML bodies (probe and short-link landing pages)
+_ENCODED_MARKETPLACE_URL_RE = re.compile(
+    r"https%3A%2F%2F(?:weidian\.com%2Fitem\.html%3FitemID%3D\d+|item\.taobao\.com%2Fitem\.htm%3Fid%3D\d+|detail\.1688\.com%2Foffer%2F\d+\.html)",
+    re.IGNORECASE,
+)
+_PLAIN_MARKETPLACE_URL_RE = re.compile(
+    r"https?://(?:weidian\.com/item\.html\?itemID=\d+|item\.taobao\.com/item\.htm\?id=\d+|detail\.1688\.com/offer/\d+\.html)",
+    re.IGNORECASE,
+)
+# Answers from servers that do not implement HEAD properly; the hop is
+# retried with a GET whose body is never read
+_HEAD_REJECTED_STATUSES = frozenset({400, 403, 405, 501})
+
+# Longest marketplace URL / text-ID match the streaming probe must see whole
+# across a chunk boundary
+_PROBE_OVERLAP = 256
+_META_REFRESH_RE = re.compile(
+    r'(?:http-equiv="refresh" content="\d+;\s*url=|href=")(https?://[^"\' >\s]+)',
+    re.IGNORECASE,
+)
+_JS_LOCATION_RE = re.compile(
+    r"""location(?:\.href)?\s*=\s*["'](https?://[^"']+)["']"""
+    r"""|location\.(?:replace|assign)\(\s*["'](https?://[^"']+)["']""",
+)
+
 # Default affiliate/invite codes per agent (ported from link_converter.ts)
 DEFAULT_AFFCODES: Dict[str, str] = {
     "kakobuy": "peter",
@@ -45,6 +159,1296 @@ DEFAULT_AFFCODES: Dict[str, str] = {
 }
 
 
+# Agent product-link templates (ported from the build_agent_link branches of
+# link_converter.ts). Per agent:
+#   url             template used unless `by_marketplace` has one for the
+#                   marketplace
+#   codes           marketplace -> platform code for {code}; marketplaces not
+#                   listed get `default_code` (None = the marketplace itself)
+#   aff             suffix appended as {aff} when the agent has an affiliate
+#                   code ({} = the encoded code); {affcode} is the bare code
+# Placeholders: {pid}, {mp}, {code}, {raw} (encoded raw marketplace URL).
+_ALI_WEIDIAN_TAOBAO = {"1688": "ALI_1688", "weidian": "WEIDIAN"}
+_HIPOBUY_CODES = {"1688": "0", "taobao": "1"}
+
+AGENT_LINK_SPECS: Dict[str, Dict[str, Any]] = {
+    "kakobuy": {
+        "url": "https://www.kakobuy.com/item/details?url={raw}{aff}",
+        "aff": "&affcode={}",
+    },
+    "hipobuy": {
+        "url": "https://hipobuy.com/product/{code}/{pid}{aff}",
+        "codes": _HIPOBUY_CODES,
+        "default_code": "weidian",
+        "aff": "?inviteCode={}",
+    },
+    "cnfans": {
+        "url": "https://cnfans.com/product?id={pid}&platform={code}{aff}",
+        "codes": _ALI_WEIDIAN_TAOBAO,
+        "default_code": "TAOBAO",
+        "aff": "&ref={}",
+    },
+    "acbuy": {
+        "url": "https://www.acbuy.com/product?id={pid}&source={code}{aff}",
+        "codes": {"1688": "AL", "weidian": "WD"},
+        "default_code": "TB",
+        "aff": "&u={}",
+    },
+    "mulebuy": {
+        "url": "https://mulebuy.com/product?id={pid}&platform={code}{aff}",
+        "codes": _ALI_WEIDIAN_TAOBAO,
+        "default_code": "TAOBAO",
+        "aff": "&ref={}",
+    },
+    "oopbuy": {
+        "url": "https://oopbuy.com/product/{code}/{pid}{aff}",
+        "codes": _HIPOBUY_CODES,
+        "default_code": "weidian",
+        "aff": "?inviteCode={}",
+    },
+    "lovegobuy": {
+        "url": "https://lovegobuy.com/product?id={pid}&shop_type={code}{aff}",
+        "codes": {"1688": "ali_1688"},
+        "default_code": None,
+        "aff": "&invite_code={}",
+    },
+    "itaobuy": {
+        "url": "https://www.itaobuy.com/product-detail?url={raw}{aff}",
+        "aff": "&inviteCode={}",
+    },
+    "cssbuy": {
+        "url": "https://cssbuy.com/item-{pid}.html",
+        "by_marketplace": {
+            "1688": "https://cssbuy.com/item-1688-{pid}.html",
+            "weidian": "https://cssbuy.com/item-micro-{pid}.html",
+        },
+    },
+    "usfans": {
+        "url": "https://usfans.com/product/{code}/{pid}{aff}",
+        "codes": {"1688": "1", "taobao": "2"},
+        "default_code": "3",
+        "aff": "?ref={}",
+    },
+    "superbuy": {
+        "url": "https://www.superbuy.com/en/page/buy/?platform={code}&id={pid}{aff}",
+        "codes": {"1688": "ALIBABA", "weidian": "WD"},
+        "default_code": "TMALL",
+        "aff": "&partnercode={}",
+    },
+    "basetao": {
+        "url": "https://www.basetao.com/best-taobao-agent-service/products/agent/{mp}/{pid}.html",
+    },
+    "eastmallbuy": {
+        "url": "https://eastmallbuy.com/index/item/index.html?tp=taobao&url={raw}{aff}",
+        "by_marketplace": {
+            "1688": "https://eastmallbuy.com/item?tp=1688&tid={pid}&inviter={affcode}",
+            "weidian": "https://eastmallbuy.com/item?tp=micro&tid={pid}&inviter={affcode}",
+        },
+        "aff": "&inviter={}",
+    },
+    "pingubuy": {
+        "url": "https://pingubuy.com/item-{pid}.html{aff}",
+        "by_marketplace": {
+            "1688": "https://pingubuy.com/item-1688-{pid}.html",
+            "weidian": "https://pingubuy.com/item-micro-{pid}.html",
+        },
+        "aff": "?promotionCode={}",
+    },
+    "hoobuy": {
+        "url": "https://hoobuy.com/product/{code}/{pid}{aff}",
+        "codes": {"1688": "0", "taobao": "1"},
+        "default_code": "2",
+        "aff": "?inviteCode={}",
+    },
+    "orientdig": {
+        "url": "https://orientdig.com/product?id={pid}&platform={code}{aff}",
+        "codes": _ALI_WEIDIAN_TAOBAO,
+        "default_code": "TAOBAO",
+        "aff": "&ref={}",
+    },
+    "ootdbuy": {
+        "url": "https://www.ootdbuy.com/goods/details?id={pid}&channel={code}",
+        "codes": {"taobao": "TAOBAO"},
+        "default_code": None,
+    },
+    "sugargoo": {
+        "url": "https://www.sugargoo.com/productDetail?productLink={raw}{aff}",
+        "aff": "&memberId={}",
+    },
+    "joyagoo": {
+        "url": "https://joyagoo.com/product?id={pid}&platform={code}{aff}",
+        "codes": _ALI_WEIDIAN_TAOBAO,
+        "default_code": "TAOBAO",
+        "aff": "&ref={}",
+    },
+    "pantherbuy": {
+        "url": "https://pantherbuy.com/index/item/index.html?tp=taobao&url={raw}{aff}",
+        "by_marketplace": {
+            "1688": "https://pantherbuy.com/item?tp=1688&tid={pid}",
+            "weidian": "https://pantherbuy.com/item?tp=micro&tid={pid}",
+        },
+        "aff": "&inviteid={}",
+    },
+    "ponybuy": {
+        "url": "https://www.ponybuy.com/products/{code}/{pid}{aff}",
+        "codes": {"1688": "2", "taobao": "1"},
+        "default_code": "3",
+        "aff": "?inviteCode={}",
+    },
+    "bbdbuy": {
+        "url": "https://bbdbuy.com/index/item/index.html?tp=taobao&tid={pid}",
+        "by_marketplace": {
+            "1688": "https://bbdbuy.com/index/item1688/index.html?tp=1688&tid={pid}",
+            "weidian": "https://bbdbuy.com/index/item/index.html?tp=micro&tid={pid}",
+        },
+    },
+    "gonestbuy": {
+        "url": "https://buy.gonest.cn/en/product/0?platform=micro&type=2&keyword={raw}",
+        "by_marketplace": {
+            "1688": "https://buy.gonest.cn/en/product/{pid}?platform=1688&type=0",
+            "taobao": "https://buy.gonest.cn/en/product/{pid}?platform=taobao&type=1",
+        },
+    },
+    "loongbuy": {
+        "url": "https://loongbuy.com/product-details?url={raw}",
+        "by_marketplace": {
+            "1688": "https://loongbuy.com/product-details?1688={pid}",
+            "weidian": "https://loongbuy.com/product-details?weidian={pid}",
+            "taobao": "https://loongbuy.com/product-details?taobao={pid}",
+        },
+    },
+}
+
+
+# Agent registrable domains -> display names; earlier entries win when a
+# host matches several (detect_agent)
+_AGENT_DOMAINS: Dict[str, str] = {
+    "cnfans.com": "CNFans",
+    "pandabuy.com": "PandaBuy",
+    "wegobuy.com": "WegoBuy",
+    "superbuy.com": "SuperBuy",
+    "cssbuy.com": "CSSBuy",
+    "sugargoo.com": "SugarGoo",
+    "acbuy.com": "ACBuy",
+    "kakobuy.com": "KakoBuy",
+    "oopbuy.com": "OopBuy",
+    "hipobuy.com": "HipoBuy",
+    "mulebuy.com": "MuleBuy",
+    "lovegobuy.com": "LoveGoBuy",
+    "itaobuy.com": "ItaoBuy",
+    "usfans.com": "USFans",
+    "basetao.com": "BaseTao",
+    "eastmallbuy.com": "EastMallBuy",
+    "pingubuy.com": "PinguBuy",
+    "hoobuy.com": "HooBuy",
+    "orientdig.com": "OrientDig",
+    "ootdbuy.com": "OotdBuy",
+    "joyagoo.com": "JoyaGoo",
+    "pantherbuy.com": "PantherBuy",
+    "ponybuy.com": "PonyBuy",
+    "bbdbuy.com": "BBDBuy",
+    "gonest.cn": "GonestBuy",
+    "loongbuy.com": "LoongBuy",
+}
+
+
+class _HostClass(NamedTuple):
+    agent: Optional[str]
+    shortener: bool
+    known_site: bool
+
+    @property
+    def kind(self) -> str:
+        if self.shortener:
+            return "shortener"
+        if self.agent:
+            return "agent"
+        return "marketplace" if self.known_site else "unknown"
+
+
+class _HostTrieNode:
+    __slots__ = ("children", "agent", "shortener", "known_site")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_HostTrieNode"] = {}
+        self.agent: Optional[Tuple[int, str]] = None
+        self.shortener = False
+        self.known_site = False
+
+
+class _HostClassifier:
+    """
+    Classifies a (www-less) host in one walk over its labels, right to left,
+    through a trie of the agent domains, shortener hosts and known
+    agent/marketplace hosts. Hosts the trie cannot place go through two
+    precomputed patterns reproducing the looser legacy rules: a known site
+    is any host *ending* in one of the known hosts (not label-aligned), and
+    an agent is any host containing an agent's domain stem. Agent ties go
+    to the earlier _AGENT_DOMAINS entry, as with the old linear scans.
+    """
+
+    def __init__(
+        self,
+        agents: Dict[str, str],
+        shorteners: Iterable[str],
+        known_sites: Iterable[str],
+    ) -> None:
+        self._root = _HostTrieNode()
+        for order, (domain, name) in enumerate(agents.items()):
+            node = self._insert(domain)
+            if node.agent is None:
+                node.agent = (order, name)
+        for host in shorteners:
+            self._insert(host).shortener = True
+        known_sites = list(known_sites)
+        for host in known_sites:
+            self._insert(host).known_site = True
+        self._site_suffix_re = re.compile(
+            "(?:%s)\\Z" % "|".join(re.escape(h) for h in known_sites)
+        )
+        # A lookahead at every position finds overlapping stems; alternation
+        # order makes the earliest agent win at each position
+        self._stems = list(agents.values())
+        self._agent_stem_re = re.compile(
+            "(?=%s)"
+            % "|".join(
+                "(?P<a%d>%s)" % (i, re.escape(domain.split(".")[0]))
+                for i, domain in enumerate(agents)
+            )
+        )
+        self.classify = functools.lru_cache(maxsize=4096)(self._classify)
+        self.agent_info = functools.lru_cache(maxsize=4096)(self._agent_info)
+
+    def _insert(self, host: str) -> _HostTrieNode:
+        node = self._root
+        for label in reversed(host.split(".")):
+            node = node.children.setdefault(label, _HostTrieNode())
+        return node
+
+    def _classify(self, host: str) -> _HostClass:
+        node = self._root
+        agent: Optional[Tuple[int, str]] = None
+        known_site = shortener = False
+        for label in reversed(host.split(".")):
+            node = node.children.get(label)  # type: ignore[assignment]
+            if node is None:
+                break
+            if node.agent is not None and (agent is None or node.agent < agent):
+                agent = node.agent
+            known_site = known_site or node.known_site
+        else:
+            shortener = node.shortener
+        if not known_site:
+            known_site = self._site_suffix_re.search(host) is not None
+        return _HostClass(
+            agent[1] if agent is not None else self._fuzzy_agent(host),
+            shortener,
+            known_site,
+        )
+
+    def _agent_info(self, host: str) -> AgentInfo:
+        return AgentInfo(host, self.classify(host).agent)
+
+    def _fuzzy_agent(self, host: str) -> Optional[str]:
+        best: Optional[int] = None
+        for m in self._agent_stem_re.finditer(host):
+            order = int(m.lastgroup[1:])  # type: ignore[index]
+            if best is None or order < best:
+                best = order
+        return None if best is None else self._stems[best]
+
+
+def _hash_query(fragment: str) -> Optional[Dict[str, str]]:
+    """Query string after the `?` of an SPA hash route, first value per key."""
+    q_index = fragment.find("?") if fragment else -1
+    if q_index == -1:
+        return None
+    parsed = parse_qs(fragment[q_index + 1 :])
+    return {k: v[0] for k, v in parsed.items() if v}
+
+
+class _ParsedUrl:
+    """
+    One urlparse of a URL string plus the views the pipeline stages need:
+    lowercased host, host without `www.`, query dict and SPA hash query.
+    Built through _parse_url, so every stage shares one instance per
+    distinct string; the dicts are shared too and must not be mutated.
+    """
+
+    __slots__ = (
+        "scheme",
+        "netloc",
+        "path",
+        "query",
+        "fragment",
+        "host",
+        "bare_host",
+        "hash_params",
+        "_query_params",
+    )
+
+    def __init__(self, url: str) -> None:
+        parts = urlparse(url)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.path = parts.path
+        self.query = parts.query
+        self.fragment = parts.fragment
+        self.host = parts.netloc.lower()
+        self.bare_host = self.host.replace("www.", "")
+        self.hash_params = _hash_query(parts.fragment)
+        self._query_params: Optional[Dict[str, List[str]]] = None
+
+    @property
+    def is_absolute(self) -> bool:
+        return bool(self.scheme and self.netloc)
+
+    @property
+    def query_params(self) -> Dict[str, List[str]]:
+        if self._query_params is None:
+            self._query_params = parse_qs(self.query)
+        return self._query_params
+
+
+@functools.lru_cache(maxsize=8192)
+def _parse_url(url: str) -> _ParsedUrl:
+    return _ParsedUrl(url)
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if value else value
+
+
+class AgentInfo(Mapping[str, object]):
+    """
+    detect_agent's answer: a read-only mapping with the keys "isAgent",
+    "agentName" (agents only) and "originalDomain". Instances are shared
+    per host, so treat them as immutable; as_dict() returns a plain copy.
+    """
+
+    __slots__ = ("is_agent", "agent_name", "original_domain", "_keys")
+
+    _AGENT_KEYS = ("isAgent", "agentName", "originalDomain")
+    _OTHER_KEYS = ("isAgent", "originalDomain")
+
+    def __init__(self, original_domain: str, agent_name: Optional[str] = None) -> None:
+        self.is_agent = agent_name is not None
+        self.agent_name = _intern(agent_name)
+        self.original_domain = _intern(original_domain)
+        self._keys = self._AGENT_KEYS if self.is_agent else self._OTHER_KEYS
+
+    def __getitem__(self, key: str) -> object:
+        if key == "isAgent":
+            return self.is_agent
+        if key == "originalDomain":
+            return self.original_domain
+        if key == "agentName" and self.is_agent:
+            return self.agent_name
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"AgentInfo({self.as_dict()!r})"
+
+    def as_dict(self) -> Dict[str, object]:
+        return {key: self[key] for key in self._keys}
+
+
+_INVALID_URL_AGENT = AgentInfo("invalid-url")
+
+
+class ConvertedLink(Mapping[str, object]):
+    """
+    convert_link's answer as a read-only mapping.
+
+    Which keys are present depends on how the conversion ended (an error
+    result has no "agentName", only valid ones carry "agentLink", ...),
+    exactly as with the dicts this replaces; the key tuple is shared per
+    shape rather than stored per result. as_dict() gives the JSON object.
+    """
+
+    __slots__ = (
+        "raw_link",
+        "marketplace",
+        "product_id",
+        "is_valid",
+        "agent_link",
+        "error",
+        "is_agent",
+        "agent_name",
+        "original_domain",
+        "timed_out",
+        "_keys",
+    )
+
+    _ATTRS = {
+        "rawLink": "raw_link",
+        "marketplace": "marketplace",
+        "productId": "product_id",
+        "isValid": "is_valid",
+        "agentLink": "agent_link",
+        "error": "error",
+        "isAgent": "is_agent",
+        "agentName": "agent_name",
+        "originalDomain": "original_domain",
+        "timedOut": "timed_out",
+    }
+    VALID_KEYS = (
+        "rawLink",
+        "marketplace",
+        "productId",
+        "isValid",
+        "agentLink",
+        "isAgent",
+        "agentName",
+        "originalDomain",
+    )
+    INVALID_KEYS = (
+        "rawLink",
+        "marketplace",
+        "productId",
+        "isValid",
+        "error",
+        "isAgent",
+        "agentName",
+        "originalDomain",
+    )
+    UNRESOLVED_KEYS = (
+        "rawLink",
+        "marketplace",
+        "productId",
+        "isValid",
+        "isAgent",
+        "agentName",
+        "originalDomain",
+    )
+    ERROR_KEYS = (
+        "rawLink",
+        "marketplace",
+        "productId",
+        "isValid",
+        "error",
+        "isAgent",
+        "originalDomain",
+    )
+    # Canonical key tuple per shape, so results share one
+    _SHAPES: Dict[Tuple[str, ...], Tuple[str, ...]] = {
+        keys: keys for keys in (VALID_KEYS, INVALID_KEYS, UNRESOLVED_KEYS, ERROR_KEYS)
+    }
+
+    def __init__(
+        self,
+        keys: Tuple[str, ...],
+        raw_link: str = "",
+        marketplace: str = "",
+        product_id: str = "",
+        is_valid: bool = False,
+        agent_link: Optional[str] = None,
+        error: Optional[str] = None,
+        is_agent: bool = False,
+        agent_name: Optional[str] = None,
+        original_domain: Optional[str] = None,
+        timed_out: bool = False,
+    ) -> None:
+        self._keys = keys
+        self.raw_link = raw_link
+        self.marketplace = _intern(marketplace)
+        self.product_id = product_id
+        self.is_valid = is_valid
+        self.agent_link = agent_link
+        self.error = error
+        self.is_agent = is_agent
+        self.agent_name = agent_name
+        self.original_domain = original_domain
+        self.timed_out = timed_out
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, object]) -> "ConvertedLink":
+        """Rebuilds a result from as_dict() output (e.g. a stored one)."""
+        keys = tuple(key for key in data if key in cls._ATTRS)
+        keys = cls._SHAPES.setdefault(keys, keys)
+        fields = {cls._ATTRS[key]: data[key] for key in keys}
+        for name in ("error", "agent_name", "original_domain"):
+            if isinstance(fields.get(name), str):
+                fields[name] = sys.intern(fields[name])  # type: ignore[arg-type]
+        return cls(keys, **fields)  # type: ignore[arg-type]
+
+    def replace(self, **changes: object) -> "ConvertedLink":
+        """A copy with some fields changed; a field the result does not
+        carry yet (e.g. timed_out) gains its key."""
+        copy = ConvertedLink.__new__(ConvertedLink)
+        for name in self.__slots__:
+            setattr(copy, name, changes.get(name, getattr(self, name)))
+        added = tuple(
+            key
+            for key, name in self._ATTRS.items()
+            if name in changes and key not in self._keys
+        )
+        if added:
+            keys = self._keys + added
+            copy._keys = self._SHAPES.setdefault(keys, keys)
+        return copy
+
+    def __getitem__(self, key: str) -> object:
+        if key not in self._keys:
+            raise KeyError(key)
+        return getattr(self, self._ATTRS[key])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __repr__(self) -> str:
+        return f"ConvertedLink({self.as_dict()!r})"
+
+    def as_dict(self) -> Dict[str, object]:
+        attrs = self._ATTRS
+        return {key: getattr(self, attrs[key]) for key in self._keys}
+
+
+class _AgentLinkTemplate:
+    """
+    One AGENT_LINK_SPECS entry compiled for a fixed affiliate code: the aff
+    suffix is encoded and baked into the templates up front, so building a
+    link is a dict lookup plus one str.format.
+    """
+
+    __slots__ = ("_by_marketplace", "_default", "_codes", "_default_code")
+
+    def __init__(self, spec: Dict[str, Any], affcode: str) -> None:
+        encoded = quote_plus(affcode) if affcode else ""
+        aff = spec["aff"].format(encoded) if encoded and "aff" in spec else ""
+
+        def bake(template: str) -> Tuple[str, bool]:
+            baked = template.replace("{aff}", aff).replace("{affcode}", encoded)
+            return baked, "{raw}" in baked
+
+        self._default = bake(spec["url"])
+        self._by_marketplace = {
+            mp: bake(template)
+            for mp, template in spec.get("by_marketplace", {}).items()
+        }
+        self._codes: Dict[str, str] = spec.get("codes", {})
+        self._default_code: Optional[str] = spec.get("default_code")
+
+    def template_for(self, mp: str) -> Tuple[str, bool]:
+        """(template, needs_raw) for a lowercased marketplace."""
+        return self._by_marketplace.get(mp, self._default)
+
+    def code_for(self, mp: str) -> str:
+        code = self._codes.get(mp, self._default_code)
+        return mp if code is None else code
+
+    def bind(self, mp: str) -> Tuple[str, str, str]:
+        """
+        Template for one marketplace with {mp}/{code} filled in, split around
+        its single remaining field: (field, head, tail) where field is "pid",
+        "raw" or "" (no per-item field). A link is then head + value + tail.
+        """
+        template = (
+            self.template_for(mp)[0]
+            .replace("{mp}", mp)
+            .replace("{code}", self.code_for(mp))
+        )
+        for field in ("pid", "raw"):
+            marker = "{" + field + "}"
+            if marker in template:
+                head, tail = template.split(marker, 1)
+                return field, head, tail
+        return "", template, ""
+
+    def build(self, mp: str, pid: str, encoded_raw: str) -> str:
+        """`encoded_raw` is the quote_plus'ed raw URL ("" if not needed)."""
+        return self.template_for(mp)[0].format(
+            pid=pid, mp=mp, code=self.code_for(mp), raw=encoded_raw
+        )
+
+
+@functools.lru_cache(maxsize=1024)
+def _agent_link_template(agent: str, affcode: str) -> Optional[_AgentLinkTemplate]:
+    """`agent`'s template compiled for `affcode`, once per (agent, code)."""
+    spec = AGENT_LINK_SPECS.get(agent)
+    return _AgentLinkTemplate(spec, affcode) if spec is not None else None
+
+
+class ResolutionCache:
+    """
+    Bounded in-process LRU cache for short-link resolutions.
+
+    Entries expire after `ttl` seconds; failed resolutions (the short link
+    resolved to itself) are kept for the shorter `negative_ttl` so a flapping
+    shortener is retried soon. `max_entries=0` disables caching.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10_000,
+        ttl: float = 3600.0,
+        negative_ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: str, negative: bool = False) -> None:
+        if self.max_entries <= 0:
+            return
+        ttl = self.negative_ttl if negative else self.ttl
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class HostLimit:
+    """
+    Outbound limits for one host (and its subdomains): at most `rate`
+    requests per second with bursts of up to `burst`, and at most
+    `max_concurrency` requests in flight. None leaves that limit to the
+    converter's defaults (no rate limit, max_connections_per_host).
+    """
+
+    __slots__ = ("rate", "burst", "max_concurrency")
+
+    def __init__(
+        self,
+        rate: Optional[float] = None,
+        burst: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+
+
+# The shared redirect-checker API throttles bulk callers with 429s
+DEFAULT_HOST_LIMITS: Dict[str, HostLimit] = {
+    "api.redirect-checker.net": HostLimit(rate=10.0, burst=20, max_concurrency=8),
+}
+
+
+class _TokenBucket:
+    """
+    Reservation-style token bucket: take() always takes a token and returns
+    how long the caller must wait before using it, so the same bucket serves
+    threads (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    __slots__ = ("rate", "capacity", "_tokens", "_updated", "_lock", "_clock")
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def take(self) -> float:
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def give_back(self) -> None:
+        """Returns a token whose request was abandoned before being sent."""
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + 1)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one outbound host.
+
+    Transport errors, 429/5xx answers and calls slower than `slow_call`
+    seconds are failures; `failure_threshold` of them in a row open the
+    circuit and calls are refused for `reset_timeout` seconds. Then a single
+    trial call is let through (half-open): success closes the circuit,
+    failure opens it for another `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        slow_call: float = 3.0,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if self._trial else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            now = self._clock()
+            if now - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            # Re-arming the timer admits exactly one trial per reset_timeout,
+            # even if the trial never reports back
+            self._opened_at = now
+            self._trial = True
+            return True
+
+    def record_response(self, status_code: int, elapsed: float) -> None:
+        if status_code == 429 or status_code >= 500 or elapsed > self.slow_call:
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    self.opened += 1
+                self._opened_at = self._clock()
+                self._trial = False
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {"state": self.state, "opened": self.opened, "rejected": self.rejected}
+
+
+class _Hedger:
+    """
+    Latency samples and load accounting behind hedged short-link resolution:
+    the hedge delay is the p95 of recent primary attempts, and hedges are
+    admitted only while they stay under `max_ratio` of primary attempts.
+    """
+
+    def __init__(
+        self,
+        max_ratio: float,
+        default_delay: float,
+        window: int = 256,
+        min_samples: int = 20,
+    ) -> None:
+        self.max_ratio = max_ratio
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.primaries = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def delay(self) -> float:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default_delay
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def start(self) -> None:
+        with self._lock:
+            self.primaries += 1
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def admit(self) -> bool:
+        with self._lock:
+            if self.hedged + 1 > self.max_ratio * self.primaries:
+                return False
+            self.hedged += 1
+            return True
+
+    def stats(self) -> Dict[str, float]:
+        delay = self.delay()
+        with self._lock:
+            return {
+                "primaries": self.primaries,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "delay_ms": delay * 1000,
+            }
+
+
+class _CircuitOpen(Exception):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+
+class _HostGate:
+    """
+    Concurrency slot, optional token bucket, circuit breaker, queue-wait
+    counters and HEAD support of one host.
+    """
+
+    __slots__ = (
+        "slot",
+        "bucket",
+        "breaker",
+        "rejects_head",
+        "requests",
+        "delayed",
+        "wait_seconds",
+        "max_wait",
+    )
+
+    def __init__(
+        self, slot: Any, bucket: Optional[_TokenBucket], breaker: CircuitBreaker
+    ) -> None:
+        self.slot = slot
+        self.bucket = bucket
+        self.breaker = breaker
+        self.rejects_head = False
+        self.requests = 0
+        self.delayed = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+
+    def record(self, waited: float) -> None:
+        # Unlocked: the counters are metrics, an occasional lost update is fine
+        self.requests += 1
+        if waited > 0.001:
+            self.delayed += 1
+            self.wait_seconds += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "requests": self.requests,
+            "delayed": self.delayed,
+            "wait_seconds": self.wait_seconds,
+            "max_wait": self.max_wait,
+            "circuit": self.breaker.stats(),
+        }
+
+
+class _ProbeScanner:
+    """
+    Incremental form of the probe's HTML checks, fed the body chunk by chunk.
+
+    A marketplace URL (percent-encoded checked before plain) ends the scan at
+    the first hit; the text-ID fallback keeps the best-ranked match seen so
+    far. Each window is the new chunk plus the tail of the previous one, and
+    a match touching the end of a window is only trusted once the next chunk
+    shows where it ends.
+    """
+
+    __slots__ = ("_converter", "_decoder", "_tail", "_best", "bytes_read", "max_bytes")
+
+    def __init__(self, converter: "LinkConverter", encoding: str, max_bytes: int) -> None:
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")
+        self._converter = converter
+        self._decoder = decoder(errors="replace")
+        self._tail = ""
+        self._best: Optional["re.Match[str]"] = None
+        self.bytes_read = 0
+        self.max_bytes = max_bytes
+
+    @property
+    def full(self) -> bool:
+        return self.bytes_read >= self.max_bytes
+
+    def feed(self, chunk: bytes) -> str:
+        chunk = chunk[: self.max_bytes - self.bytes_read]
+        self.bytes_read += len(chunk)
+        return self._scan(self._tail + self._decoder.decode(chunk), final=self.full)
+
+    def finish(self) -> str:
+        found = self._scan(self._tail + self._decoder.decode(b"", True), final=True)
+        if found or self._best is None:
+            return found
+        id_in_html = self._converter._text_id_from_match(self._best)
+        return self._converter.build_marketplace_link(
+            id_in_html["marketplace"], id_in_html["productId"]
+        )
+
+    def _scan(self, window: str, final: bool) -> str:
+        converter = self._converter
+        limit = len(window) if final else len(window) - 1
+        for m in _ENCODED_MARKETPLACE_URL_RE.finditer(window):
+            if m.end() > limit:
+                break
+            decoded = converter.safe_decode(m.group(0))
+            if converter.is_valid_url(decoded):
+                return decoded
+        for m in _PLAIN_MARKETPLACE_URL_RE.finditer(window):
+            if m.end() > limit:
+                break
+            if converter.is_valid_url(m.group(0)):
+                return m.group(0)
+
+        if self._best is None or _TEXT_ID_RANK[self._best.lastgroup] > 0:
+            text = converter.multi_decode(window)
+            text_limit = len(text) if final else len(text) - 1
+            for m in _TEXT_ID_RE.finditer(text):
+                if m.end() > text_limit:
+                    break
+                best = self._best
+                if best is None or _TEXT_ID_RANK[m.lastgroup] < _TEXT_ID_RANK[best.lastgroup]:
+                    self._best = m
+                    if _TEXT_ID_RANK[m.lastgroup] == 0:
+                        break
+        self._tail = window[-_PROBE_OVERLAP:]
+        return ""
+
+
+class Deadline:
+    """
+    Absolute time budget for one conversion, shared by all of its network
+    stages: each request gets min(request timeout, time left), loops over
+    hops and body chunks stop when it runs out, and a stage still running
+    then is abandoned to finish in the background.
+    """
+
+    __slots__ = ("expires_at",)
+
+    def __init__(self, budget_ms: float) -> None:
+        self.expires_at = time.monotonic() + budget_ms / 1000.0
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+
+class _BudgetExhausted(Exception):
+    """Raised by the network layer when a Deadline leaves no time for a call."""
+
+
+def _time_left(deadline: Optional[Deadline]) -> Optional[float]:
+    return None if deadline is None else deadline.remaining()
+
+
+def _expired(deadline: Optional[Deadline]) -> bool:
+    return deadline is not None and deadline.expired
+
+
+# Marks threads whose callers already wait with a deadline (see _bounded)
+_bounded_thread = threading.local()
+
+
+def _mark_bounded_thread() -> None:
+    _bounded_thread.active = True
+
+
+class _Unsettled(Exception):
+    """
+    Raised by a coalesced call whose answer only holds for its own caller,
+    typically a partial one cut short by the leader's budget: the leader
+    gets `value`, followers retry with their own budget instead of sharing it.
+    """
+
+    def __init__(self, value: Any) -> None:
+        super().__init__(value)
+        self.value = value
+
+
+class _SingleFlight:
+    """
+    Coalesces concurrent calls that share a key: the first caller runs the
+    function, everyone arriving while it is in flight waits for and receives
+    the same result (or exception), unless the function raises _Unsettled.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[str, "Future[Any]"] = {}
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], _T], timeout: Optional[float] = None) -> _T:
+        """`timeout` bounds how long a follower waits; the leader runs fn."""
+        expires = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                if future is None:
+                    future = self._calls[key] = Future()
+                    break
+                self.coalesced += 1
+            left = None if expires is None else max(0.0, expires - time.monotonic())
+            try:
+                return future.result(timeout=left)
+            except FutureTimeoutError as exc:
+                raise _BudgetExhausted("timed out waiting for in-flight call") from exc
+            except (_Unsettled, _BudgetExhausted):
+                continue  # the leader's answer was its own; lead the next call
+        try:
+            result = fn()
+        except _Unsettled as exc:
+            self._forget(key)
+            future.set_exception(exc)
+            return exc.value
+        except BaseException as exc:
+            self._forget(key)
+            future.set_exception(exc)
+            raise
+        # Forgotten before waking followers, so a retrying one starts afresh
+        self._forget(key)
+        future.set_result(result)
+        return result
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            del self._calls[key]
+
+
+class _AsyncSingleFlight:
+    """asyncio flavour of _SingleFlight; the shared call runs as one task."""
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, "asyncio.Future[Any]"] = {}
+        self._waiters: Dict["asyncio.Future[Any]", int] = {}
+        self.coalesced = 0
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[_T]],
+        timeout: Optional[float] = None,
+    ) -> _T:
+        loop = asyncio.get_running_loop()
+        expires = None if timeout is None else loop.time() + timeout
+        while True:
+            task = self._calls.get(key)
+            leader = task is None or task.done()
+            if leader:
+                task = self._calls[key] = asyncio.ensure_future(fn())
+                task.add_done_callback(lambda done: self._forget(key, done))
+            else:
+                self.coalesced += 1
+            left = None if expires is None else max(0.0, expires - loop.time())
+            try:
+                return await self._wait(task, left)
+            except _Unsettled as exc:
+                if leader:
+                    return exc.value
+                # the leader's answer was its own; lead the next call
+
+    async def _wait(self, task: "asyncio.Future[_T]", timeout: Optional[float]) -> _T:
+        # shield: a cancelled or timed-out waiter must not cancel the call
+        # others share (a timed-out one still completes and fills the caches)
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError as exc:
+            raise _BudgetExhausted("timed out waiting for in-flight call") from exc
+        except asyncio.CancelledError:
+            # ...unless it was the last one: nobody needs the result any more
+            if self._waiters[task] == 1:
+                task.cancel()
+            raise
+        finally:
+            if self._waiters[task] == 1:
+                del self._waiters[task]
+            else:
+                self._waiters[task] -= 1
+
+    def _forget(self, key: str, task: "asyncio.Future[Any]") -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, even if every waiter timed out
+
+
+class SQLiteResolutionStore:
+    """
+    Persistent resolution store shared by every converter process on a host.
+
+    Holds network-derived convert_link results and redirect chains in a local
+    SQLite file in WAL mode, so readers never block each other or the writer
+    and a freshly deployed worker starts warm instead of re-hitting the
+    shorteners. Rows carry an absolute expiry; expired rows are ignored on
+    read and deleted by compact(), which also runs every `compact_interval`
+    seconds of writes.
+    """
+
+    _schema = (
+        "CREATE TABLE IF NOT EXISTS conversions ("
+        " key TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS redirects ("
+        " key TEXT PRIMARY KEY, final_url TEXT NOT NULL, chain TEXT NOT NULL,"
+        " expires_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS conversions_expiry ON conversions (expires_at)",
+        "CREATE INDEX IF NOT EXISTS redirects_expiry ON redirects (expires_at)",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 7 * 24 * 3600.0,
+        negative_ttl: float = 3600.0,
+        compact_interval: float = 3600.0,
+        mmap_size: int = 64 * 1024 * 1024,
+    ) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.compact_interval = compact_interval
+        self._mmap_size = mmap_size
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._last_compaction = time.time()
+        conn = self._connection()
+        with conn:
+            for statement in self._schema:
+                conn.execute(statement)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets them read concurrently.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA mmap_size={int(self._mmap_size)}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get_conversion(self, key: str) -> Optional[Dict[str, object]]:
+        row = self._connection().execute(
+            "SELECT result FROM conversions WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_conversion(
+        self, key: str, result: Dict[str, object], negative: bool = False
+    ) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO conversions (key, result, expires_at)"
+            " VALUES (?, ?, ?)",
+            (key, json.dumps(result), self._expiry(negative)),
+        )
+
+    def get_redirect(self, key: str) -> Optional[Tuple[str, List[str]]]:
+        row = self._connection().execute(
+            "SELECT final_url, chain FROM redirects WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put_redirect(
+        self, key: str, final_url: str, chain: List[str], negative: bool = False
+    ) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO redirects (key, final_url, chain, expires_at)"
+            " VALUES (?, ?, ?, ?)",
+            (key, final_url, json.dumps(chain), self._expiry(negative)),
+        )
+
+    def compact(self) -> int:
+        """Delete expired rows; returns how many were removed."""
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            removed = conn.execute(
+                "DELETE FROM conversions WHERE expires_at <= ?", (now,)
+            ).rowcount
+            removed += conn.execute(
+                "DELETE FROM redirects WHERE expires_at <= ?", (now,)
+            ).rowcount
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+        self._last_compaction = now
+        return removed
+
+    def close(self) -> None:
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+    def _expiry(self, negative: bool) -> float:
+        return time.time() + (self.negative_ttl if negative else self.ttl)
+
+    def _write(self, sql: str, params: Tuple[object, ...]) -> None:
+        conn = self._connection()
+        with conn:
+            conn.execute(sql, params)
+        if time.time() - self._last_compaction >= self.compact_interval:
+            self.compact()
+
+
 class LinkConverter:
     """
     Python port of link_converter.ts
@@ -119,129 +1523,264 @@ class LinkConverter:
 
     _url_param_keys = ("url", "link", "u", "productLink")
 
+    # Built once from the host lists above; subclasses that override either
+    # list get their own (see __init_subclass__)
+    _host_classifier = _HostClassifier(
+        _AGENT_DOMAINS, known_shortener_hosts, known_agent_or_marketplace_hosts
+    )
+
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        own = vars(cls)
+        if "known_shortener_hosts" in own or "known_agent_or_marketplace_hosts" in own:
+            cls._host_classifier = _HostClassifier(
+                _AGENT_DOMAINS,
+                cls.known_shortener_hosts,
+                cls.known_agent_or_marketplace_hosts,
+            )
+
+    # Per-request timeout (seconds) for every outbound call
+    request_timeout = 6.0
+    # Short-link resolver stages, tried in order until one answers; see
+    # _short_link_stages for the names
+    short_link_resolvers: Tuple[str, ...] = ("redirects", "html", "api")
+    # Hosts whose redirects must be walked with GET; others are tried with
+    # HEAD first and remembered on their host gate when they reject it
+    head_rejecting_hosts: FrozenSet[str] = frozenset()
+    # Host gates kept at once; beyond that the least recently used is dropped,
+    # so arbitrary input cannot grow them without bound
+    max_host_gates = 1024
+    # Per-host circuit breakers (see CircuitBreaker)
+    breaker_failure_threshold = 5
+    breaker_slow_call = 3.0
+    breaker_reset_timeout = 30.0
+    # Hedged short-link resolution (hedge=True): the chain that races a
+    # primary attempt slower than its p95, capped at hedge_max_ratio extra
+    # attempts; hedge_default_delay applies until enough samples exist
+    hedge_resolvers: Tuple[str, ...] = ("api",)
+    hedge_max_ratio = 0.1
+    hedge_default_delay = 1.0
+    # Threads shared by all conversions for concurrent probes and hedges
+    probe_workers = 32
+    # Threads that run budgeted network stages, so the caller can stop
+    # waiting at its deadline (see _bounded)
+    stage_workers = 64
+    # Streaming probe: bytes read per chunk and at most per page
+    probe_chunk_size = 16 * 1024
+    probe_max_bytes = 1024 * 1024
+
+    def __init__(
+        self,
+        client: Optional[httpx.Client] = None,
+        *,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        max_connections_per_host: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: Optional[bool] = None,
+        resolution_cache: Optional[ResolutionCache] = None,
+        store: Optional[SQLiteResolutionStore] = None,
+        budget_ms: Optional[float] = None,
+        host_limits: Optional[Dict[str, HostLimit]] = None,
+        resolvers: Optional[Sequence[str]] = None,
+        hedge: bool = False,
+    ) -> None:
+        """
+        The pooled client is created lazily on the first network call and kept
+        for the converter's lifetime, so every hop of every resolution reuses
+        warm keep-alive connections. Pass `client` to share an existing pool
+        (it is then not closed by close()).
+
+        Short-link resolutions are memoized in `resolution_cache` (a default
+        ResolutionCache when omitted). An optional `store` additionally
+        persists network-derived results and redirect chains across restarts
+        and processes; it is not closed by close().
+
+        `budget_ms` is the default latency budget of convert_link (None means
+        only the per-request timeouts apply).
+
+        Outbound requests pass a per-host gate: `host_limits` (merged over
+        DEFAULT_HOST_LIMITS, keyed by host or parent domain) sets each host's
+        rate and concurrency; other hosts get `max_connections_per_host`
+        concurrent requests and no rate limit. Each host also has a
+        CircuitBreaker, so a failing or very slow host is skipped instead of
+        costing a timeout per call. host_stats() reports each gate's queue
+        wait and circuit state.
+
+        `resolvers` reorders or trims the short-link resolver chain (default
+        short_link_resolvers); resolver_stats() reports per-stage timings to
+        choose the order by. With `hedge`, a short-link resolution slower than
+        its recent p95 is raced against the hedge_resolvers chain (see
+        hedge_stats()).
+        """
+        self._client = client
+        self._owns_client = client is None
+        self._client_lock = threading.Lock()
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._http2 = _HAS_HTTP2 if http2 is None else http2
+        self._max_connections_per_host = max_connections_per_host
+        self.host_limits = dict(DEFAULT_HOST_LIMITS)
+        self.host_limits.update(host_limits or {})
+        self._host_gates: "OrderedDict[str, _HostGate]" = OrderedDict()
+        self._host_gates_lock = threading.Lock()
+        self.resolution_cache = (
+            resolution_cache if resolution_cache is not None else ResolutionCache()
+        )
+        self.store = store
+        self._inflight = _SingleFlight()
+        self._probe_pool: Optional[ThreadPoolExecutor] = None
+        self._stage_pool: Optional[ThreadPoolExecutor] = None
+        self.budget_ms = budget_ms
+        if resolvers is not None:
+            unknown = [n for n in resolvers if n not in self._short_link_stages]
+            if unknown:
+                raise ValueError(f"unknown short-link resolvers: {', '.join(unknown)}")
+            self.short_link_resolvers = tuple(resolvers)
+        self.hedge = hedge
+        self._hedger = _Hedger(self.hedge_max_ratio, self.hedge_default_delay)
+        self._stage_stats: Dict[str, Dict[str, float]] = {
+            name: {"calls": 0, "resolved": 0, "errors": 0, "seconds": 0.0}
+            for name in self._short_link_stages
+        }
+
+    @property
+    def client(self) -> httpx.Client:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def _create_client(self) -> httpx.Client:
+        return httpx.Client(
+            limits=self._limits, http2=self._http2, timeout=self.request_timeout
+        )
+
+    def close(self) -> None:
+        with self._client_lock:
+            for pool in (self._probe_pool, self._stage_pool):
+                if pool is not None:
+                    pool.shutdown(wait=False, cancel_futures=True)
+            self._probe_pool = self._stage_pool = None
+            if self._client is not None and self._owns_client:
+                self._client.close()
+                self._client = None
+
+    def __enter__(self) -> "LinkConverter":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
     # ------------------------------------------------------------------ #
     # Public API                                                         #
     # ------------------------------------------------------------------ #
     def convert_link(
-        self, encoded_url: str, preferred_agent: Optional[str] = None
-    ) -> Dict[str, object]:
+        self,
+        encoded_url: str,
+        preferred_agent: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+    ) -> ConvertedLink:
         """
         Best-effort conversion of an arbitrary URL/text to a raw marketplace link.
-        Returns a ConvertedLink-like dict.
+        Returns a ConvertedLink (a read-only mapping; as_dict() for JSON).
+
+        `budget_ms` (default: the converter's budget_ms) caps the whole call:
+        every network stage only gets the time left and is abandoned when it
+        runs out, so the call returns shortly after the deadline with the
+        best partial answer and "timedOut": True.
         """
         try:
-            sanitized_input = (encoded_url or "").strip()
-            if sanitized_input.startswith("@"):
-                sanitized_input = re.sub(r"^@+", "", sanitized_input).strip()
-            sanitized_input = self.multi_decode(sanitized_input)
-
-            if not self.is_valid_url(sanitized_input):
-                extracted = self.extract_first_url_from_string(sanitized_input)
-                if extracted:
-                    sanitized_input = extracted
+            canonical = self._convert_canonical(encoded_url, preferred_agent)
+            if canonical is not None:
+                return canonical
 
+            sanitized_input = self._sanitize_input(encoded_url)
             if not self.is_valid_url(sanitized_input):
                 return self._result_invalid("Invalid URL format")
 
-            working_url = sanitized_input
-            probe_candidates: List[str] = [working_url]
+            probe_candidates: List[str] = [sanitized_input]
+            working_url = self._unwrap_working_url(sanitized_input, probe_candidates)
+            short_link = self.is_likely_short_link(working_url)
+            if not short_link:
+                result, agent_info = self._convert_offline(
+                    sanitized_input, working_url, probe_candidates, preferred_agent
+                )
+                if result is not None:
+                    return result
 
-            # 1) unwrap query params
-            working_url, extracted_inner = self._try_unwrap_common_params(
-                working_url, probe_candidates
-            )
-            if not extracted_inner:
-                inner = self.unwrap_inner_url_anywhere(working_url)
-                if inner:
-                    probe_candidates.append(working_url)
-                    working_url = inner
+            # Only input that needs the network gets this far
+            stored = self._load_conversion(sanitized_input, preferred_agent)
+            if stored is not None:
+                return stored
+            deadline = self._start_deadline(budget_ms)
 
             # 2) resolve short links
-            if self.is_likely_short_link(working_url):
-                resolved = self.resolve_short_link_via_api(working_url)
-                if self.is_valid_url(resolved):
-                    probe_candidates.append(resolved)
-                    working_url = resolved
-
-            # 2b) handle SPA hash params
-            working_url = self._handle_spa_hash(working_url)
-
-            agent_info = self.detect_agent(sanitized_input)
-
-            if self.is_registration_or_non_product_link(working_url):
-                return self._result_invalid(
-                    "Not a product link (registration/invite)",
-                    agent_info=agent_info,
+            if short_link:
+                resolved = self.resolve_short_link_via_api(
+                    working_url, deadline=deadline
                 )
-
-            probe_candidates.append(working_url)
-            working_url = self.normalize_agent_url_to_raw(working_url)
-
-            product_id, marketplace = self.extract_id_and_marketplace(working_url)
-            if not product_id or not marketplace:
-                # fallback: heuristic
-                fallback = self.extract_platform_and_id_from_text(working_url)
-                if fallback["productId"] and fallback["marketplace"]:
-                    return self._result_valid(
-                        raw=self.build_marketplace_link(
-                            fallback["marketplace"], fallback["productId"]
-                        ),
-                        marketplace=fallback["marketplace"],
-                        product_id=fallback["productId"],
-                        agent_info=agent_info,
-                        preferred_agent=preferred_agent,
-                    )
-
-                # probe HTML
-                for candidate in probe_candidates:
-                    probed = self.probe_for_raw_url_via_http(candidate)
-                    if self.is_valid_url(probed):
-                        normalized = self.normalize_agent_url_to_raw(probed)
-                        pid2, mp2 = self.extract_id_and_marketplace(normalized)
-                        if pid2 and mp2:
-                            return self._result_valid(
-                                raw=self.build_marketplace_link(mp2, pid2),
-                                marketplace=mp2,
-                                product_id=pid2,
-                                agent_info=agent_info,
-                                preferred_agent=preferred_agent,
-                            )
-
-                final_hop = self.follow_redirects_manually(sanitized_input)
-                if self.is_valid_url(final_hop):
-                    info = self.detect_agent(final_hop)
-                    return {
-                        "rawLink": final_hop,
-                        "marketplace": "",
-                        "productId": "",
-                        "isValid": True,
-                        "isAgent": info["isAgent"],
-                        "agentName": info.get("agentName"),
-                        "originalDomain": info.get("originalDomain"),
-                    }
-
-                return self._result_invalid(
-                    "Could not extract product ID or marketplace",
-                    agent_info=agent_info,
+                working_url = self._accept_resolved(
+                    working_url, resolved, probe_candidates
                 )
+                result, agent_info = self._convert_offline(
+                    sanitized_input, working_url, probe_candidates, preferred_agent
+                )
+                if result is not None:
+                    return self._finish_conversion(sanitized_input, result, deadline)
 
-            return self._result_valid(
-                raw=working_url,
-                marketplace=marketplace,
-                product_id=product_id,
-                agent_info=agent_info,
-                preferred_agent=preferred_agent,
+            # probe HTML
+            result = self._probe_first(
+                probe_candidates, agent_info, preferred_agent, deadline
+            )
+            if result is not None:
+                return self._finish_conversion(sanitized_input, result, deadline)
+
+            # Out of budget: the most-resolved URL so far is the best answer
+            final_hop = (
+                probe_candidates[-1]
+                if _expired(deadline)
+                else self.follow_redirects_manually(sanitized_input, deadline=deadline)
+            )
+            return self._finish_conversion(
+                sanitized_input,
+                self._result_from_final_hop(final_hop, agent_info),
+                deadline,
             )
         except Exception as exc:  # pragma: no cover - defensive
-            return {
-                "rawLink": "",
-                "marketplace": "",
-                "productId": "",
-                "isValid": False,
-                "error": str(exc),
-                "isAgent": False,
-                "originalDomain": "error",
-            }
+            return self._result_error(exc)
+
+    def convert_many(
+        self,
+        urls: Iterable[str],
+        preferred_agent: Optional[str] = None,
+        concurrency: int = 16,
+        budget_ms: Optional[float] = None,
+    ) -> List[ConvertedLink]:
+        """
+        convert_link over a batch, results in input order.
+
+        Inputs that resolve offline are answered inline; only those needing
+        short-link resolution or probing go to a pool of `concurrency`
+        threads. Duplicate network-bound inputs are converted once.
+        `budget_ms` applies to each conversion separately.
+        """
+        results, pending = self._split_offline(urls, preferred_agent)
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                futures = {
+                    url: pool.submit(self.convert_link, url, preferred_agent, budget_ms)
+                    for url in pending
+                }
+                for url, indexes in pending.items():
+                    result = futures[url].result()
+                    for index in indexes:
+                        results[index] = result
+        return results  # type: ignore[return-value]
 
     def resolve_marketplace_and_id(
         self, marketplace_hint: str, item_or_url: str
@@ -291,250 +1830,413 @@ class LinkConverter:
             return build_1688_url(pid)
         return build_taobao_url(pid)
 
+    # Agent links: `affcodes` (agent -> affiliate code) replaces
+    # DEFAULT_AFFCODES for one call. Codes are read on every call, so changes
+    # to DEFAULT_AFFCODES apply at once; templates are compiled once per
+    # (agent, code) pair.
+    def _agent_template(
+        self, agent: str, affcodes: Optional[Mapping[str, str]]
+    ) -> Optional[_AgentLinkTemplate]:
+        codes = DEFAULT_AFFCODES if affcodes is None else affcodes
+        return _agent_link_template(agent, codes.get(agent) or "")
+
     def build_agent_link(
-        self, agent: str, platform: str, product_id: str, raw_url: Optional[str] = None
+        self,
+        agent: str,
+        platform: str,
+        product_id: str,
+        raw_url: Optional[str] = None,
+        affcodes: Optional[Mapping[str, str]] = None,
     ) -> Optional[str]:
-        agent_lower = (agent or "").lower()
+        template = self._agent_template((agent or "").lower(), affcodes)
+        if template is None:
+            return None
         pid = self.sanitize_product_id(product_id)
         mp = (platform or "").lower()
-        raw = raw_url or self.build_marketplace_link(mp, pid)
-        aff = DEFAULT_AFFCODES.get(agent_lower, "")
-
-        def enc(val: str) -> str:
-            return urlencode({"": val})[1:] if val else ""
-
-        if agent_lower == "kakobuy":
-            aff_param = f"&affcode={enc(aff)}" if aff else ""
-            return f"https://www.kakobuy.com/item/details?url={enc(raw)}{aff_param}"
-        if agent_lower == "hipobuy":
-            code = "0" if mp == "1688" else "1" if mp == "taobao" else "weidian"
-            suffix = f"?inviteCode={enc(aff)}" if aff else ""
-            return f"https://hipobuy.com/product/{code}/{pid}{suffix}"
-        if agent_lower == "cnfans":
-            plat = "ALI_1688" if mp == "1688" else "WEIDIAN" if mp == "weidian" else "TAOBAO"
-            ref = f"&ref={enc(aff)}" if aff else ""
-            return f"https://cnfans.com/product?id={pid}&platform={plat}{ref}"
-        if agent_lower == "acbuy":
-            src = "AL" if mp == "1688" else "WD" if mp == "weidian" else "TB"
-            ref = f"&u={enc(aff)}" if aff else ""
-            return f"https://www.acbuy.com/product?id={pid}&source={src}{ref}"
-        if agent_lower == "mulebuy":
-            plat = "ALI_1688" if mp == "1688" else "WEIDIAN" if mp == "weidian" else "TAOBAO"
-            ref = f"&ref={enc(aff)}" if aff else ""
-            return f"https://mulebuy.com/product?id={pid}&platform={plat}{ref}"
-        if agent_lower == "oopbuy":
-            code = "0" if mp == "1688" else "1" if mp == "taobao" else "weidian"
-            ref = f"?inviteCode={enc(aff)}" if aff else ""
-            return f"https://oopbuy.com/product/{code}/{pid}{ref}"
-        if agent_lower == "lovegobuy":
-            shop_type = "ali_1688" if mp == "1688" else mp
-            ref = f"&invite_code={enc(aff)}" if aff else ""
-            return f"https://lovegobuy.com/product?id={pid}&shop_type={shop_type}{ref}"
-        if agent_lower == "itaobuy":
-            ref = f"&inviteCode={enc(aff)}" if aff else ""
-            return f"https://www.itaobuy.com/product-detail?url={enc(raw)}{ref}"
-        if agent_lower == "cssbuy":
-            if mp == "1688":
-                return f"https://cssbuy.com/item-1688-{pid}.html"
-            if mp == "weidian":
-                return f"https://cssbuy.com/item-micro-{pid}.html"
-            return f"https://cssbuy.com/item-{pid}.html"
-        if agent_lower == "usfans":
-            code = "1" if mp == "1688" else "2" if mp == "taobao" else "3"
-            ref = f"?ref={enc(aff)}" if aff else ""
-            return f"https://usfans.com/product/{code}/{pid}{ref}"
-        if agent_lower == "superbuy":
-            plat = "ALIBABA" if mp == "1688" else "WD" if mp == "weidian" else "TMALL"
-            ref = f"&partnercode={enc(aff)}" if aff else ""
-            return f"https://www.superbuy.com/en/page/buy/?platform={plat}&id={pid}{ref}"
-        if agent_lower == "basetao":
-            return f"https://www.basetao.com/best-taobao-agent-service/products/agent/{mp}/{pid}.html"
-        if agent_lower == "eastmallbuy":
-            if mp == "1688":
-                return f"https://eastmallbuy.com/item?tp=1688&tid={pid}&inviter={enc(aff or '')}"
-            if mp == "weidian":
-                return f"https://eastmallbuy.com/item?tp=micro&tid={pid}&inviter={enc(aff or '')}"
-            aff_query = f"&inviter={enc(aff)}" if aff else ""
-            return f"https://eastmallbuy.com/index/item/index.html?tp=taobao&url={enc(raw)}{aff_query}"
-        if agent_lower == "pingubuy":
-            if mp == "1688":
-                return f"https://pingubuy.com/item-1688-{pid}.html"
-            if mp == "weidian":
-                return f"https://pingubuy.com/item-micro-{pid}.html"
-            aff_query = f"?promotionCode={enc(aff)}" if aff else ""
-            return f"https://pingubuy.com/item-{pid}.html{aff_query}"
-        if agent_lower == "hoobuy":
-            code = "0" if mp == "1688" else "1" if mp == "taobao" else "2"
-            aff_query = f"?inviteCode={enc(aff)}" if aff else ""
-            return f"https://hoobuy.com/product/{code}/{pid}{aff_query}"
-        if agent_lower == "orientdig":
-            plat = "ALI_1688" if mp == "1688" else "WEIDIAN" if mp == "weidian" else "TAOBAO"
-            ref = f"&ref={enc(aff)}" if aff else ""
-            return f"https://orientdig.com/product?id={pid}&platform={plat}{ref}"
-        if agent_lower == "ootdbuy":
-            ch = "TAOBAO" if mp == "taobao" else mp
-            return f"https://www.ootdbuy.com/goods/details?id={pid}&channel={ch}"
-        if agent_lower == "sugargoo":
-            aff_query = f"&memberId={enc(aff)}" if aff else ""
-            return f"https://www.sugargoo.com/productDetail?productLink={enc(raw)}{aff_query}"
-        if agent_lower == "joyagoo":
-            plat = "ALI_1688" if mp == "1688" else "WEIDIAN" if mp == "weidian" else "TAOBAO"
-            ref = f"&ref={enc(aff)}" if aff else ""
-            return f"https://joyagoo.com/product?id={pid}&platform={plat}{ref}"
-        if agent_lower == "pantherbuy":
-            if mp == "1688":
-                return f"https://pantherbuy.com/item?tp=1688&tid={pid}"
-            if mp == "weidian":
-                return f"https://pantherbuy.com/item?tp=micro&tid={pid}"
-            aff_query = f"&inviteid={enc(aff)}" if aff else ""
-            return f"https://pantherbuy.com/index/item/index.html?tp=taobao&url={enc(raw)}{aff_query}"
-        if agent_lower == "ponybuy":
-            pcode = "2" if mp == "1688" else "1" if mp == "taobao" else "3"
-            aff_query = f"?inviteCode={enc(aff)}" if aff else ""
-            return f"https://www.ponybuy.com/products/{pcode}/{pid}{aff_query}"
-        if agent_lower == "bbdbuy":
-            if mp == "1688":
-                return f"https://bbdbuy.com/index/item1688/index.html?tp=1688&tid={pid}"
-            if mp == "weidian":
-                return f"https://bbdbuy.com/index/item/index.html?tp=micro&tid={pid}"
-            return f"https://bbdbuy.com/index/item/index.html?tp=taobao&tid={pid}"
-        if agent_lower == "gonestbuy":
-            if mp == "1688":
-                return f"https://buy.gonest.cn/en/product/{pid}?platform=1688&type=0"
-            if mp == "taobao":
-                return f"https://buy.gonest.cn/en/product/{pid}?platform=taobao&type=1"
-            return f"https://buy.gonest.cn/en/product/0?platform=micro&type=2&keyword={enc(raw)}"
-        if agent_lower == "loongbuy":
-            if mp in ("1688", "weidian", "taobao"):
-                return f"https://loongbuy.com/product-details?{mp}={pid}"
-            return f"https://loongbuy.com/product-details?url={enc(raw)}"
-
-        return None
+        encoded_raw = ""
+        if template.template_for(mp)[1]:
+            encoded_raw = quote_plus(raw_url or self.build_marketplace_link(mp, pid))
+        return template.build(mp, pid, encoded_raw)
 
     def build_all_agent_links(
-        self, marketplace: str, product_id: str, raw_url: Optional[str] = None
+        self,
+        marketplace: str,
+        product_id: str,
+        raw_url: Optional[str] = None,
+        affcodes: Optional[Mapping[str, str]] = None,
     ) -> Dict[str, str]:
+        pid = self.sanitize_product_id(product_id)
+        mp = (marketplace or "").lower()
+        # Encoded once per item rather than once per agent embedding it
+        encoded_raw = quote_plus(raw_url or self.build_marketplace_link(mp, pid))
         links: Dict[str, str] = {}
-        for agent in DEFAULT_AFFCODES.keys():
-            link = self.build_agent_link(agent, marketplace, product_id, raw_url)
-            if link:
-                links[agent] = link
+        for agent in list(DEFAULT_AFFCODES if affcodes is None else affcodes):
+            template = self._agent_template(agent, affcodes)
+            if template is not None:
+                links[agent] = template.build(mp, pid, encoded_raw)
         return links
 
+    def build_agent_link_columns(
+        self,
+        marketplaces: Sequence[str],
+        product_ids: Sequence[str],
+        raw_urls: Optional[Sequence[Optional[str]]] = None,
+        agents: Optional[Iterable[str]] = None,
+        output: str = "list",
+        affcodes: Optional[Mapping[str, str]] = None,
+    ) -> Any:
+        """
+        Column-oriented build_all_agent_links for whole catalogs.
+
+        Takes parallel sequences of marketplace / product id (and optionally
+        raw URL) and returns one column per agent, row-aligned with the input:
+        a dict of lists (output="list"), a dict of NumPy object arrays
+        ("numpy") or a pyarrow.Table ("arrow"). Templates are bound once per
+        (agent, marketplace), so each cell is a single string join. Unknown
+        agents yield a column of None. `affcodes` is as for build_agent_link.
+        """
+        if len(marketplaces) != len(product_ids):
+            raise ValueError("marketplaces and product_ids must have the same length")
+        if raw_urls is not None and len(raw_urls) != len(product_ids):
+            raise ValueError("raw_urls must have the same length as product_ids")
+        if output not in ("list", "numpy", "arrow"):
+            raise ValueError(f"Unsupported output {output!r}")
+
+        mps = [(mp or "").lower() for mp in marketplaces]
+        pids = [self.sanitize_product_id(pid) for pid in product_ids]
+        rows_by_mp: Dict[str, List[int]] = {}
+        for index, mp in enumerate(mps):
+            rows_by_mp.setdefault(mp, []).append(index)
+
+        encoded_raws: List[str] = []
+
+        def encoded_raw_column() -> List[str]:
+            if encoded_raws:
+                return encoded_raws
+            # A sanitized ASCII id is quote_plus-safe, so the encoded
+            # marketplace URL is encoded(head) + pid + encoded(tail) with the
+            # head/tail taken once per marketplace from a sentinel build.
+            sentinel = "PIDSENTINEL"
+            affixes: Dict[str, Optional[Tuple[str, str]]] = {}
+            for mp in rows_by_mp:
+                built = self.build_marketplace_link(mp, sentinel)
+                affixes[mp] = (
+                    tuple(quote_plus(part) for part in built.split(sentinel))  # type: ignore[misc]
+                    if built.count(sentinel) == 1
+                    else None
+                )
+            for i, pid in enumerate(pids):
+                raw = raw_urls[i] if raw_urls is not None else None
+                affix = affixes[mps[i]]
+                if raw or affix is None or not pid.isascii():
+                    encoded_raws.append(
+                        quote_plus(raw or self.build_marketplace_link(mps[i], pid))
+                    )
+                else:
+                    encoded_raws.append(affix[0] + pid + affix[1])
+            return encoded_raws
+
+        columns: Dict[str, List[Optional[str]]] = {}
+        if agents is None:
+            agents = list(DEFAULT_AFFCODES if affcodes is None else affcodes)
+        for agent in agents:
+            template = self._agent_template(agent.lower(), affcodes)
+            column: List[Optional[str]] = [None] * len(pids)
+            if template is not None:
+                for mp, rows in rows_by_mp.items():
+                    field, head, tail = template.bind(mp)
+                    if field == "pid":
+                        for i in rows:
+                            column[i] = head + pids[i] + tail
+                    elif field == "raw":
+                        values = encoded_raw_column()
+                        for i in rows:
+                            column[i] = head + values[i] + tail
+                    else:
+                        for i in rows:
+                            column[i] = head
+            columns[agent] = column
+
+        if output == "numpy":
+            try:
+                import numpy as np
+            except ImportError as exc:  # pragma: no cover - optional dependency
+                raise ImportError("output='numpy' requires numpy") from exc
+            return {agent: np.array(col, dtype=object) for agent, col in columns.items()}
+        if output == "arrow":
+            try:
+                import pyarrow as pa
+            except ImportError as exc:  # pragma: no cover - optional dependency
+                raise ImportError("output='arrow' requires pyarrow") from exc
+            return pa.table(
+                {agent: pa.array(col, type=pa.string()) for agent, col in columns.items()}
+            )
+        return columns
+
     # ------------------------------------------------------------------ #
     # Internal helpers                                                   #
     # ------------------------------------------------------------------ #
+    # Conversion stages shared by LinkConverter and AsyncLinkConverter. Only
+    # the network calls differ between the two, so everything else lives here.
+    def _sanitize_input(self, encoded_url: str) -> str:
+        sanitized_input = (encoded_url or "").strip()
+        if sanitized_input.startswith("@"):
+            sanitized_input = _LEADING_AT_RE.sub("", sanitized_input).strip()
+        sanitized_input = self.multi_decode(sanitized_input)
+
+        if not self.is_valid_url(sanitized_input):
+            extracted = self.extract_first_url_from_string(sanitized_input)
+            if extracted:
+                sanitized_input = extracted
+        return sanitized_input
+
+    def _unwrap_working_url(
+        self, working_url: str, probe_candidates: List[str]
+    ) -> str:
+        # 1) unwrap query params
+        working_url, extracted_inner = self._try_unwrap_common_params(
+            working_url, probe_candidates
+        )
+        if not extracted_inner:
+            inner = self.unwrap_inner_url_anywhere(working_url)
+            if inner:
+                probe_candidates.append(working_url)
+                working_url = inner
+        return working_url
+
+    def _convert_canonical(
+        self, encoded_url: str, preferred_agent: Optional[str]
+    ) -> Optional[ConvertedLink]:
+        """
+        Fast path for input that already is a canonical taobao/tmall, weidian
+        or 1688 item URL: one anchored match, no decoding, parsing or agent
+        lookups. Returns exactly what the full pipeline would, or None.
+        """
+        m = _CANONICAL_MARKETPLACE_URL_RE.fullmatch((encoded_url or "").strip())
+        if m is None:
+            return None
+        if m.group("taobao"):
+            marketplace, product_id, host = "taobao", m.group("taobao"), m.group("taobao_host")
+        elif m.group("weidian"):
+            marketplace, product_id, host = "weidian", m.group("weidian"), m.group("weidian_host")
+        else:
+            marketplace, product_id, host = "1688", m.group("ali"), m.group("ali_host")
+        return self._result_valid(
+            raw=m.group(0),
+            marketplace=marketplace,
+            product_id=product_id,
+            agent_info=AgentInfo(host),
+            preferred_agent=preferred_agent,
+        )
+
+    def _convert_without_network(
+        self, encoded_url: str, preferred_agent: Optional[str]
+    ) -> Optional[ConvertedLink]:
+        """convert_link's answer when it needs no I/O, else None."""
+        try:
+            canonical = self._convert_canonical(encoded_url, preferred_agent)
+            if canonical is not None:
+                return canonical
+            sanitized_input = self._sanitize_input(encoded_url)
+            if not self.is_valid_url(sanitized_input):
+                return self._result_invalid("Invalid URL format")
+            probe_candidates: List[str] = [sanitized_input]
+            working_url = self._unwrap_working_url(sanitized_input, probe_candidates)
+            if self.is_likely_short_link(working_url):
+                return None
+            result, _ = self._convert_offline(
+                sanitized_input, working_url, probe_candidates, preferred_agent
+            )
+            return result
+        except Exception as exc:  # pragma: no cover - defensive
+            return self._result_error(exc)
+
+    def _split_offline(
+        self, urls: Iterable[str], preferred_agent: Optional[str]
+    ) -> Tuple[List[Optional[ConvertedLink]], Dict[str, List[int]]]:
+        """Batch fast path: offline results by position, plus network-bound
+        inputs mapped to every position they occupy."""
+        results: List[Optional[ConvertedLink]] = []
+        pending: Dict[str, List[int]] = {}
+        for index, url in enumerate(urls):
+            result = self._convert_without_network(url, preferred_agent)
+            if result is None:
+                pending.setdefault(url, []).append(index)
+            results.append(result)
+        return results, pending
+
+    def _accept_resolved(
+        self, working_url: str, resolved: str, probe_candidates: List[str]
+    ) -> str:
+        if self.is_valid_url(resolved):
+            probe_candidates.append(resolved)
+            return resolved
+        return working_url
+
+    def _convert_offline(
+        self,
+        sanitized_input: str,
+        working_url: str,
+        probe_candidates: List[str],
+        preferred_agent: Optional[str],
+    ) -> Tuple[Optional[ConvertedLink], AgentInfo]:
+        """
+        Everything after short-link resolution that needs no network access.
+        Returns (result, agent_info); result is None when probing is required.
+        """
+        # 2b) handle SPA hash params
+        working_url = self._handle_spa_hash(working_url)
+
+        agent_info = self.detect_agent(sanitized_input)
+
+        parsed = _parse_url(working_url)
+        if self._is_registration_or_non_product(parsed):
+            return (
+                self._result_invalid(
+                    "Not a product link (registration/invite)",
+                    agent_info=agent_info,
+                ),
+                agent_info,
+            )
+
+        probe_candidates.append(working_url)
+        working_url = self._normalize_parsed(working_url, parsed)
+
+        product_id, marketplace = self.extract_id_and_marketplace(working_url)
+        if product_id and marketplace:
+            return (
+                self._result_valid(
+                    raw=working_url,
+                    marketplace=marketplace,
+                    product_id=product_id,
+                    agent_info=agent_info,
+                    preferred_agent=preferred_agent,
+                ),
+                agent_info,
+            )
+
+        # fallback: heuristic
+        fallback = self.extract_platform_and_id_from_text(working_url)
+        if fallback["productId"] and fallback["marketplace"]:
+            return (
+                self._result_valid(
+                    raw=self.build_marketplace_link(
+                        fallback["marketplace"], fallback["productId"]
+                    ),
+                    marketplace=fallback["marketplace"],
+                    product_id=fallback["productId"],
+                    agent_info=agent_info,
+                    preferred_agent=preferred_agent,
+                ),
+                agent_info,
+            )
+        return None, agent_info
+
+    def _result_from_probe(
+        self,
+        probed: str,
+        agent_info: AgentInfo,
+        preferred_agent: Optional[str],
+    ) -> Optional[ConvertedLink]:
+        if not self.is_valid_url(probed):
+            return None
+        normalized = self.normalize_agent_url_to_raw(probed)
+        pid2, mp2 = self.extract_id_and_marketplace(normalized)
+        if not (pid2 and mp2):
+            return None
+        return self._result_valid(
+            raw=self.build_marketplace_link(mp2, pid2),
+            marketplace=mp2,
+            product_id=pid2,
+            agent_info=agent_info,
+            preferred_agent=preferred_agent,
+        )
+
+    def _result_from_final_hop(
+        self, final_hop: str, agent_info: AgentInfo
+    ) -> ConvertedLink:
+        if self.is_valid_url(final_hop):
+            info = self.detect_agent(final_hop)
+            return ConvertedLink(
+                ConvertedLink.UNRESOLVED_KEYS,
+                raw_link=final_hop,
+                is_valid=True,
+                is_agent=info.is_agent,
+                agent_name=info.agent_name,
+                original_domain=info.original_domain,
+            )
+        return self._result_invalid(
+            "Could not extract product ID or marketplace",
+            agent_info=agent_info,
+        )
+
+    def _result_error(self, exc: Exception) -> ConvertedLink:
+        return ConvertedLink(
+            ConvertedLink.ERROR_KEYS, error=str(exc), original_domain="error"
+        )
+
     def _result_invalid(
-        self, msg: str, agent_info: Optional[Dict[str, object]] = None
-    ) -> Dict[str, object]:
-        agent_info = agent_info or {"isAgent": False, "originalDomain": "invalid-url"}
-        return {
-            "rawLink": "",
-            "marketplace": "",
-            "productId": "",
-            "isValid": False,
-            "error": msg,
-            "isAgent": agent_info.get("isAgent", False),
-            "agentName": agent_info.get("agentName"),
-            "originalDomain": agent_info.get("originalDomain", "invalid-url"),
-        }
+        self, msg: str, agent_info: Optional[AgentInfo] = None
+    ) -> ConvertedLink:
+        agent_info = agent_info or _INVALID_URL_AGENT
+        return ConvertedLink(
+            ConvertedLink.INVALID_KEYS,
+            error=msg,
+            is_agent=agent_info.is_agent,
+            agent_name=agent_info.agent_name,
+            original_domain=agent_info.original_domain,
+        )
 
     def _result_valid(
         self,
         raw: str,
         marketplace: str,
         product_id: str,
-        agent_info: Dict[str, object],
+        agent_info: AgentInfo,
         preferred_agent: Optional[str] = None,
-    ) -> Dict[str, object]:
+    ) -> ConvertedLink:
         agent = (preferred_agent or "").lower()
         agent_link = (
             self.build_agent_link(agent, marketplace, product_id, raw)
             if agent
             else None
         )
-        return {
-            "rawLink": raw,
-            "marketplace": marketplace,
-            "productId": product_id,
-            "isValid": True,
-            "agentLink": agent_link,
-            "isAgent": agent_info.get("isAgent", False),
-            "agentName": agent_info.get("agentName"),
-            "originalDomain": agent_info.get("originalDomain"),
-        }
+        return ConvertedLink(
+            ConvertedLink.VALID_KEYS,
+            raw_link=raw,
+            marketplace=marketplace,
+            product_id=product_id,
+            is_valid=True,
+            agent_link=agent_link,
+            is_agent=agent_info.is_agent,
+            agent_name=agent_info.agent_name,
+            original_domain=agent_info.original_domain,
+        )
 
     # Agent detection
-    def detect_agent(self, original_url: str) -> Dict[str, object]:
+    def detect_agent(self, original_url: str) -> AgentInfo:
         try:
-            url_obj = urlparse(original_url)
-            domain = url_obj.netloc.lower().replace("www.", "")
-            agent_map: Dict[str, str] = {
-                "cnfans.com": "CNFans",
-                "pandabuy.com": "PandaBuy",
-                "wegobuy.com": "WegoBuy",
-                "superbuy.com": "SuperBuy",
-                "cssbuy.com": "CSSBuy",
-                "sugargoo.com": "SugarGoo",
-                "acbuy.com": "ACBuy",
-                "kakobuy.com": "KakoBuy",
-                "oopbuy.com": "OopBuy",
-                "hipobuy.com": "HipoBuy",
-                "mulebuy.com": "MuleBuy",
-                "lovegobuy.com": "LoveGoBuy",
-                "itaobuy.com": "ItaoBuy",
-                "usfans.com": "USFans",
-                "basetao.com": "BaseTao",
-                "eastmallbuy.com": "EastMallBuy",
-                "pingubuy.com": "PinguBuy",
-                "hoobuy.com": "HooBuy",
-                "orientdig.com": "OrientDig",
-                "ootdbuy.com": "OotdBuy",
-                "joyagoo.com": "JoyaGoo",
-                "pantherbuy.com": "PantherBuy",
-                "ponybuy.com": "PonyBuy",
-                "bbdbuy.com": "BBDBuy",
-                "gonest.cn": "GonestBuy",
-                "loongbuy.com": "LoongBuy",
-            }
-
-            for agent_domain, agent_name in agent_map.items():
-                if domain == agent_domain or domain.endswith(f".{agent_domain}"):
-                    return {
-                        "isAgent": True,
-                        "agentName": agent_name,
-                        "originalDomain": domain,
-                    }
-
-            for agent_domain, agent_name in agent_map.items():
-                if agent_domain.split(".")[0] in domain:
-                    return {
-                        "isAgent": True,
-                        "agentName": agent_name,
-                        "originalDomain": domain,
-                    }
-
-            return {"isAgent": False, "originalDomain": domain}
+            return self._host_classifier.agent_info(_parse_url(original_url).bare_host)
         except Exception:
-            return {"isAgent": False, "originalDomain": "invalid-url"}
+            return _INVALID_URL_AGENT
 
     # ID + marketplace extraction
     def extract_id_and_marketplace(self, raw_url: str) -> Tuple[str, str]:
         try:
-            url = urlparse(raw_url)
-            hostname = url.netloc.lower().replace("www.", "")
+            url = _parse_url(raw_url)
+            hostname = url.bare_host
 
             if "taobao.com" in hostname or "tmall.com" in hostname:
-                params = parse_qs(url.query)
+                params = url.query_params
                 return params.get("id", [""])[0], "taobao"
 
             if "weidian.com" in hostname:
-                params = parse_qs(url.query)
+                params = url.query_params
                 id_ = params.get("itemID", [""])[0] or params.get("itemId", [""])[0]
                 return id_, "weidian"
 
             if "1688.com" in hostname:
-                m = re.search(r"/offer/(\d+)", url.path)
+                m = _OFFER_PATH_RE.search(url.path)
                 if m:
                     return m.group(1), "1688"
 
@@ -543,57 +2245,127 @@ class LinkConverter:
             return "", ""
 
     # Network helpers
-    def probe_for_raw_url_via_http(self, url_str: str) -> str:
+    def _probe_first(
+        self,
+        candidates: List[str],
+        agent_info: AgentInfo,
+        preferred_agent: Optional[str],
+        deadline: Optional[Deadline],
+    ) -> Optional[ConvertedLink]:
+        """
+        Probes the distinct candidates concurrently; the first usable result
+        wins. Probes still queued are cancelled, running ones finish in the
+        background (a concurrent conversion may share them).
+        """
+        unique = list(dict.fromkeys(candidates))
+        if len(unique) == 1:
+            probed = self.probe_for_raw_url_via_http(unique[0], deadline=deadline)
+            return self._result_from_probe(probed, agent_info, preferred_agent)
+        pool = self._executor()
+        order = {
+            pool.submit(self.probe_for_raw_url_via_http, candidate, deadline=deadline): i
+            for i, candidate in enumerate(unique)
+        }
+        pending = set(order)
         try:
-            resp = httpx.get(
-                url_str,
-                follow_redirects=True,
-                timeout=6.0,
-                headers={"User-Agent": "python-link-converter"},
-            )
-            final_url = str(resp.url) if resp.url else ""
-            if final_url and self.is_valid_url(final_url):
-                host = urlparse(final_url).netloc.lower()
-                if re.search(r"(taobao|tmall|weidian|1688)\.com$", host) or "kakobuy" in host or "cnfans" in host:
-                    return final_url
-
-            if isinstance(resp.text, str):
-                html = resp.text
-                enc_match = re.search(
-                    r"https%3A%2F%2F(?:weidian\.com%2Fitem\.html%3FitemID%3D\d+|item\.taobao\.com%2Fitem\.htm%3Fid%3D\d+|detail\.1688\.com%2Foffer%2F\d+\.html)",
-                    html,
-                    re.IGNORECASE,
+            while pending:
+                done, pending = wait(
+                    pending, timeout=_time_left(deadline), return_when=FIRST_COMPLETED
                 )
-                if enc_match:
-                    decoded = self.safe_decode(enc_match.group(0))
-                    if self.is_valid_url(decoded):
-                        return decoded
-
-                plain_match = re.search(
-                    r"https?://(?:weidian\.com/item\.html\?itemID=\d+|item\.taobao\.com/item\.htm\?id=\d+|detail\.1688\.com/offer/\d+\.html)",
-                    html,
-                    re.IGNORECASE,
-                )
-                if plain_match and self.is_valid_url(plain_match.group(0)):
-                    return plain_match.group(0)
-
-                id_in_html = self.extract_platform_and_id_from_text(html)
-                if id_in_html["productId"] and id_in_html["marketplace"]:
-                    return self.build_marketplace_link(
-                        id_in_html["marketplace"], id_in_html["productId"]
+                if not done:  # budget exhausted
+                    return None
+                for future in sorted(done, key=order.__getitem__):
+                    result = self._result_from_probe(
+                        future.result(), agent_info, preferred_agent
                     )
+                    if result is not None:
+                        return result
+            return None
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Separate from convert_many's pool: probe and hedge tasks never wait
+        # on conversions, so a full conversion pool cannot deadlock them.
+        # Their callers wait with the deadline, so they need no _bounded.
+        with self._client_lock:
+            if self._probe_pool is None:
+                self._probe_pool = ThreadPoolExecutor(
+                    max_workers=self.probe_workers,
+                    thread_name_prefix="link-probe",
+                    initializer=_mark_bounded_thread,
+                )
+            return self._probe_pool
 
+    def _bounded(
+        self, deadline: Optional[Deadline], fn: Callable[..., _T], *args: Any
+    ) -> _T:
+        """
+        fn(*args), given up with _BudgetExhausted when `deadline` runs out:
+        httpx timeouts only bound each read, so a trickling response would
+        otherwise hold the caller far past its budget. The abandoned call
+        finishes on its worker thread and still fills the caches.
+        """
+        if deadline is None or getattr(_bounded_thread, "active", False):
+            return fn(*args)
+        with self._client_lock:
+            if self._stage_pool is None:
+                self._stage_pool = ThreadPoolExecutor(
+                    max_workers=self.stage_workers,
+                    thread_name_prefix="link-stage",
+                    initializer=_mark_bounded_thread,
+                )
+            future = self._stage_pool.submit(fn, *args)
+        try:
+            return future.result(timeout=deadline.remaining())
+        except FutureTimeoutError as exc:
+            future.cancel()
+            raise _BudgetExhausted("conversion budget exhausted") from exc
+
+    def probe_for_raw_url_via_http(
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> str:
+        # Concurrent probes of the same page share one request
+        try:
+            return self._inflight.do(
+                f"probe {self._resolution_cache_key(url_str)}",
+                lambda: self._bounded(deadline, self._probe_uncached, url_str, deadline),
+                timeout=_time_left(deadline),
+            )
+        except _BudgetExhausted:
             return ""
+
+    def _probe_uncached(self, url_str: str, deadline: Optional[Deadline] = None) -> str:
+        try:
+            with self._stream(
+                url_str, deadline, follow_redirects=True, headers=_REQUEST_HEADERS
+            ) as resp:
+                found = self._marketplace_final_url(resp)
+                if found:
+                    return found
+                # Leaving the block on a hit closes the connection unread
+                scanner = self._probe_scanner(resp)
+                for chunk in resp.iter_bytes(self.probe_chunk_size):
+                    found = scanner.feed(chunk)
+                    if found or scanner.full:
+                        break
+                    if _expired(deadline):
+                        raise _BudgetExhausted(f"budget exhausted reading {url_str}")
+                return found or scanner.finish()
+        except _BudgetExhausted:
+            # A miss for this caller only: the page was not read to the end
+            raise _Unsettled("")
         except Exception:
             return ""
 
     def is_likely_short_link(self, url_str: str) -> bool:
         try:
-            u = urlparse(url_str)
-            host = u.netloc.lower().replace("www.", "")
-            if host in self.known_shortener_hosts:
+            u = _parse_url(url_str)
+            host_class = self._host_classifier.classify(u.bare_host)
+            if host_class.shortener:
                 return True
-            if any(host.endswith(h) for h in self.known_agent_or_marketplace_hosts):
+            if host_class.known_site:
                 return False
             path_compact_length = len(u.path.replace("/", ""))
             has_query = bool(u.query)
@@ -601,254 +2373,762 @@ class LinkConverter:
         except Exception:
             return False
 
-    def resolve_short_link_via_api(self, url_str: str) -> str:
-        # Best-effort; falls back to manual redirect follow
+    def resolve_short_link_via_api(
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> str:
+        key = self._resolution_cache_key(url_str)
+        cached = self._lookup_resolution(key)
+        if cached is not None:
+            return cached
+        # Concurrent callers with the same short link share one resolution
         try:
-            api_url = f"https://api.redirect-checker.net/?url={url_str}"
-            resp = httpx.get(api_url, timeout=6.0)
-            body = resp.json()
-            if not body or body.get("error") or not isinstance(body.get("data"), list):
-                return url_str
-            final_url: Optional[str] = None
-            for step in body["data"]:
-                redirect_url = (
-                    step.get("response", {})
-                    .get("info", {})
-                    .get("redirect_url")
-                )
-                http_code = (
-                    step.get("response", {})
-                    .get("info", {})
-                    .get("http_code")
-                )
-                current_url = (
-                    step.get("response", {}).get("info", {}).get("url")
-                    or step.get("request", {}).get("info", {}).get("url")
-                )
-                if redirect_url:
-                    final_url = redirect_url
-                elif http_code and 200 <= http_code < 400:
-                    final_url = current_url or final_url
-            return final_url or url_str
-        except Exception:
-            try:
-                manual = self.follow_redirects_manually(url_str)
-                if self.is_valid_url(manual) and manual != url_str:
-                    return manual
-            except Exception:
-                pass
-            try:
-                resp = httpx.get(
+            return self._inflight.do(
+                f"resolve {key}",
+                lambda: self._bounded(
+                    deadline, self._resolve_and_remember, key, url_str, deadline
+                ),
+                timeout=_time_left(deadline),
+            )
+        except _BudgetExhausted:
+            return url_str
+
+    def _resolve_and_remember(
+        self, key: str, url_str: str, deadline: Optional[Deadline] = None
+    ) -> str:
+        resolved, skipped = (
+            self._resolve_hedged(url_str, deadline)
+            if self.hedge
+            else self._resolve_short_link_uncached(url_str, deadline)
+        )
+        # A failure caused by the budget or by the open circuit of any host
+        # the chain called says nothing about the link itself
+        if resolved != url_str or not (skipped or _expired(deadline)):
+            self._remember_resolution(key, url_str, resolved)
+        elif _expired(deadline):
+            raise _Unsettled(resolved)
+        return resolved
+
+    def _resolve_hedged(
+        self, url_str: str, deadline: Optional[Deadline]
+    ) -> Tuple[str, bool]:
+        """
+        Runs the resolver chain; if it has not answered within the p95 delay
+        and the extra-load cap allows, races the hedge_resolvers chain against
+        it. The first real answer wins; the loser finishes in the background.
+        Returns like _resolve_short_link_uncached.
+        """
+        hedger = self._hedger
+        pool = self._executor()
+        started = time.monotonic()
+        hedger.start()
+        primary = pool.submit(self._resolve_short_link_uncached, url_str, deadline)
+        # Sampled even when the hedge wins, so slow primaries keep the p95 honest
+        primary.add_done_callback(lambda _: hedger.observe(time.monotonic() - started))
+        delay = hedger.delay()
+        left = _time_left(deadline)
+        done, _ = wait([primary], timeout=delay if left is None else min(delay, left))
+        pending = {primary}
+        if not done and not _expired(deadline) and hedger.admit():
+            pending.add(
+                pool.submit(
+                    self._resolve_short_link_uncached,
                     url_str,
-                    follow_redirects=True,
-                    timeout=6.0,
-                    headers={"User-Agent": "python-link-converter"},
+                    deadline,
+                    self.hedge_resolvers,
                 )
-                possible = str(resp.url) if resp.url else ""
-                if possible and self.is_valid_url(possible):
-                    return possible
-                if isinstance(resp.text, str):
-                    m = re.search(
-                        r'(?:http-equiv="refresh" content="\d+;\s*url=|href=")(https?://[^"\' >\s]+)',
-                        resp.text,
-                        re.IGNORECASE,
-                    )
-                    if m and self.is_valid_url(m.group(1)):
-                        return m.group(1)
-                return url_str
-            except Exception:
-                return url_str
+            )
+        skipped = False
+        while pending:
+            done, pending = wait(
+                pending, timeout=_time_left(deadline), return_when=FIRST_COMPLETED
+            )
+            if not done:
+                return url_str, True
+            for future in done:
+                resolved, attempt_skipped = future.result()
+                if resolved != url_str:
+                    if future is not primary:
+                        hedger.hedge_wins += 1
+                    return resolved, False
+                skipped = skipped or attempt_skipped
+        return url_str, skipped
+
+    def hedge_stats(self) -> Dict[str, float]:
+        """Primary attempts, hedges started and won, current hedge delay."""
+        return self._hedger.stats()
+
+    def _resolve_short_link_uncached(
+        self,
+        url_str: str,
+        deadline: Optional[Deadline] = None,
+        stages: Optional[Sequence[str]] = None,
+    ) -> Tuple[str, bool]:
+        """
+        (resolved URL, or url_str when no stage answered; whether a stage
+        was cut short by the budget or an open circuit rather than by the
+        link itself).
+        """
+        # Best-effort; each stage either answers or hands over to the next
+        skipped = False
+        for stage in stages or self.short_link_resolvers:
+            if _expired(deadline):
+                return url_str, True
+            started = time.monotonic()
+            try:
+                resolved = getattr(self, self._short_link_stages[stage])(url_str, deadline)
+            except Exception as exc:
+                self._record_stage(stage, started, False, failed=True)
+                skipped = skipped or isinstance(exc, (_CircuitOpen, _BudgetExhausted))
+                continue
+            answered = bool(resolved) and self._resolved_to(url_str, resolved)
+            self._record_stage(stage, started, answered)
+            if answered:
+                return resolved, False
+        return url_str, skipped
+
+    def _resolve_via_redirects(
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        return self.follow_redirects_manually(url_str, deadline=deadline)
+
+    def _resolve_via_html(
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        resp = self._get(
+            url_str, deadline, follow_redirects=True, headers=_REQUEST_HEADERS
+        )
+        return self._url_from_landing_response(resp, url_str)
+
+    def _resolve_via_api(
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        api_url = f"https://api.redirect-checker.net/?url={url_str}"
+        resp = self._get(api_url, deadline)
+        return self._final_url_from_redirect_checker(resp.json(), url_str)
+
+    def follow_redirects_manually(
+        self,
+        start_url: str,
+        max_hops: int = 5,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        key = self._resolution_cache_key(start_url)
+        stored = self.store.get_redirect(key) if self.store is not None else None
+        if stored is not None:
+            return stored[0]
+        try:
+            return self._inflight.do(
+                f"redirects {key}",
+                lambda: self._bounded(
+                    deadline, self._walk_redirects, key, start_url, max_hops, deadline
+                ),
+                timeout=_time_left(deadline),
+            )
+        except _BudgetExhausted:
+            return start_url
+
+    def _walk_redirects(
+        self,
+        key: str,
+        start_url: str,
+        max_hops: int,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        hops: List[Dict[str, object]] = []
+        try:
+            self._trace_into(hops, start_url, max_hops, deadline)
+        except _BudgetExhausted:
+            # Partial walk: usable now, but neither persisted nor shared
+            raise _Unsettled(self._redirect_chain(start_url, hops)[-1])
+        return self._remember_redirect_chain(key, self._redirect_chain(start_url, hops))
 
-    def follow_redirects_manually(self, start_url: str, max_hops: int = 5) -> str:
+    def trace_redirects(
+        self,
+        start_url: str,
+        max_hops: int = 5,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Dict[str, object]]:
+        """
+        Uncached redirect walk reporting every hop as {"url", "method",
+        "status", "location", "ms"}; `location` is the absolute next URL, None
+        on the hop that ends the chain. Stops early when `deadline` runs out.
+        """
+        hops: List[Dict[str, object]] = []
+        try:
+            self._trace_into(hops, start_url, max_hops, deadline)
+        except _BudgetExhausted:
+            pass
+        return hops
+
+    def _trace_into(
+        self,
+        hops: List[Dict[str, object]],
+        start_url: str,
+        max_hops: int,
+        deadline: Optional[Deadline],
+    ) -> None:
         current = start_url
         for _ in range(max_hops):
-            resp = httpx.get(
-                current,
-                follow_redirects=False,
-                timeout=6.0,
-                headers={"User-Agent": "python-link-converter"},
+            if _expired(deadline):
+                raise _BudgetExhausted(f"budget exhausted walking {start_url}")
+            started = time.monotonic()
+            method, status, location = self._hop(current, deadline)
+            next_url = self._redirect_target(current, status, location)
+            hops.append(self._hop_record(current, method, status, next_url, started))
+            if next_url is None:
+                return
+            current = next_url
+
+    def _hop(
+        self, url: str, deadline: Optional[Deadline]
+    ) -> Tuple[str, int, Optional[str]]:
+        """One hop as (method, status, Location), HEAD first; no body is read."""
+        host = _parse_url(url).host
+        gate = self._host_gate(host)
+        head_rejected = False
+        if host not in self.head_rejecting_hosts and not gate.rejects_head:
+            resp = self._request(
+                "HEAD", url, deadline, follow_redirects=False, headers=_REQUEST_HEADERS
             )
-            status = resp.status_code
-            if 300 <= status < 400:
-                location = resp.headers.get("location")
-                if not location:
-                    return current
-                try:
-                    absolute = httpx.URL(location, base=current).human_repr()
-                    current = absolute
-                    continue
-                except Exception:
-                    return current
-            return current
-        return current
+            if resp.status_code not in _HEAD_REJECTED_STATUSES:
+                return "HEAD", resp.status_code, resp.headers.get("location")
+            head_rejected = True
+        with self._stream(
+            url, deadline, follow_redirects=False, headers=_REQUEST_HEADERS
+        ) as resp:
+            if head_rejected and resp.status_code not in _HEAD_REJECTED_STATUSES:
+                gate.rejects_head = True
+            return "GET", resp.status_code, resp.headers.get("location")
+
+    def _get(
+        self, url: str, deadline: Optional[Deadline] = None, **kwargs: Any
+    ) -> httpx.Response:
+        return self._request("GET", url, deadline, **kwargs)
+
+    def _request(
+        self, method: str, url: str, deadline: Optional[Deadline] = None, **kwargs: Any
+    ) -> httpx.Response:
+        timeout = self._stage_timeout(deadline)
+        with self._host_slot(url, _time_left(deadline)) as observe:
+            return observe(self.client.request(method, url, timeout=timeout, **kwargs))
+
+    @contextmanager
+    def _stream(
+        self, url: str, deadline: Optional[Deadline] = None, **kwargs: Any
+    ) -> Iterator[httpx.Response]:
+        """Like _get, but the body is left unread for the caller to iterate."""
+        timeout = self._stage_timeout(deadline)
+        with self._host_slot(url, _time_left(deadline)) as observe:
+            with self.client.stream("GET", url, timeout=timeout, **kwargs) as resp:
+                yield observe(resp)
+
+    @contextmanager
+    def _host_slot(
+        self, url: str, timeout: Optional[float] = None
+    ) -> Iterator[Callable[[httpx.Response], httpx.Response]]:
+        """
+        Refuses the call with _CircuitOpen while the host's breaker is open,
+        then waits for the host's concurrency slot and rate limit, giving up
+        with _BudgetExhausted when that would take longer than `timeout`.
+
+        Yields `observe`, which the caller passes the response to so its
+        status and latency reach the breaker; transport errors are recorded
+        here.
+        """
+        gate = self._host_gate(_parse_url(url).host)
+        if not gate.breaker.allow():
+            raise _CircuitOpen(f"circuit open for {url}")
+        started = time.monotonic()
+        if not gate.slot.acquire(timeout=timeout):
+            raise _BudgetExhausted(f"no free connection slot for {url}")
+        try:
+            if gate.bucket is not None:
+                delay = gate.bucket.take()
+                if timeout is not None and started + timeout < time.monotonic() + delay:
+                    gate.bucket.give_back()
+                    raise _BudgetExhausted(f"rate limit for {url} exceeds the budget")
+                if delay:
+                    time.sleep(delay)
+            gate.record(time.monotonic() - started)
+            yield self._observer(gate)
+        except httpx.TransportError:
+            gate.breaker.record_failure()
+            raise
+        finally:
+            gate.slot.release()
+
+    @staticmethod
+    def _observer(gate: _HostGate) -> Callable[[httpx.Response], httpx.Response]:
+        sent = time.monotonic()
+
+        def observe(resp: httpx.Response) -> httpx.Response:
+            # A rejected HEAD says nothing about the host's health (501 would
+            # count as a failure); the GET retry is what gets recorded
+            if (
+                resp.request.method == "HEAD"
+                and resp.status_code in _HEAD_REJECTED_STATUSES
+            ):
+                return resp
+            gate.breaker.record_response(resp.status_code, time.monotonic() - sent)
+            return resp
+
+        return observe
+
+    def _host_gate(self, host: str) -> _HostGate:
+        """
+        The host's gate, created on first use. At most max_host_gates are
+        kept (LRU); a dropped host later starts over with a fresh gate while
+        callers still holding the old one finish with it.
+        """
+        with self._host_gates_lock:
+            gate = self._host_gates.get(host)
+            if gate is not None:
+                self._host_gates.move_to_end(host)
+                return gate
+            limit = self._host_limit(host)
+            concurrency = limit.max_concurrency or self._max_connections_per_host
+            bucket = (
+                _TokenBucket(limit.rate, limit.burst or max(1.0, limit.rate))
+                if limit.rate
+                else None
+            )
+            breaker = CircuitBreaker(
+                self.breaker_failure_threshold,
+                self.breaker_slow_call,
+                self.breaker_reset_timeout,
+            )
+            gate = _HostGate(self._new_host_slot(concurrency), bucket, breaker)
+            self._host_gates[host] = gate
+            while len(self._host_gates) > self.max_host_gates:
+                self._host_gates.popitem(last=False)
+            return gate
+
+    def _new_host_slot(self, concurrency: int) -> Any:
+        return threading.BoundedSemaphore(concurrency)
+
+    def _host_limit(self, host: str) -> HostLimit:
+        """The most specific configured limit: the host itself, then its parents."""
+        labels = host.split(":")[0].split(".")
+        for i in range(len(labels) - 1):
+            limit = self.host_limits.get(".".join(labels[i:]))
+            if limit is not None:
+                return limit
+        return HostLimit()
+
+    def host_stats(self) -> Dict[str, Dict[str, object]]:
+        """Per-host request counts, time queued at the host gate, circuit state."""
+        with self._host_gates_lock:
+            gates = list(self._host_gates.items())
+        return {host: gate.stats() for host, gate in gates}
+
+    # Short-link resolver stages: name -> method(url_str, deadline) returning
+    # the resolved URL, or None/url_str when the stage has no answer
+    _short_link_stages: Dict[str, str] = {
+        "redirects": "_resolve_via_redirects",
+        "html": "_resolve_via_html",
+        "api": "_resolve_via_api",
+    }
+
+    def _resolved_to(self, url_str: str, resolved: str) -> bool:
+        return resolved != url_str and self.is_valid_url(resolved)
+
+    def _record_stage(
+        self, stage: str, started: float, answered: bool, failed: bool = False
+    ) -> None:
+        # Unlocked like the host gate counters: metrics only
+        stats = self._stage_stats[stage]
+        stats["calls"] += 1
+        stats["seconds"] += time.monotonic() - started
+        if failed:
+            stats["errors"] += 1
+        elif answered:
+            stats["resolved"] += 1
+
+    def resolver_stats(self) -> Dict[str, Dict[str, float]]:
+        """Per resolver stage: calls, answers, errors, total and mean time."""
+        report = {}
+        for stage, stats in self._stage_stats.items():
+            calls = stats["calls"]
+            mean_ms = stats["seconds"] * 1000 / calls if calls else 0.0
+            report[stage] = dict(stats, mean_ms=mean_ms)
+        return report
+
+    # Short-link cache helpers
+    def _resolution_cache_key(self, url_str: str) -> str:
+        """Scheme/host lowercased, `www.` and fragment dropped, no trailing slash."""
+        try:
+            u = urlparse(url_str.strip())
+            host = u.netloc.lower()
+            if host.startswith("www."):
+                host = host[4:]
+            path = u.path.rstrip("/")
+            query = f"?{u.query}" if u.query else ""
+            return f"{u.scheme.lower()}://{host}{path}{query}"
+        except Exception:
+            return url_str
+
+    def _conversion_key(self, sanitized_input: str) -> str:
+        """The resolution cache key with the fragment kept: agent SPA links
+        carry the item in it (`/#/?url=...`), so it tells inputs apart."""
+        key = self._resolution_cache_key(sanitized_input)
+        try:
+            fragment = urlparse(sanitized_input.strip()).fragment
+        except Exception:
+            return key
+        return f"{key}#{fragment}" if fragment else key
+
+    def _lookup_resolution(self, key: str) -> Optional[str]:
+        cached = self.resolution_cache.get(key)
+        if cached is not None or self.store is None:
+            return cached
+        return self._load_resolution(key)
+
+    def _load_resolution(self, key: str) -> Optional[str]:
+        """The store's resolution for `key`, copied into the memory cache."""
+        if self.store is None:
+            return None
+        stored = self.store.get_redirect(key)
+        if stored is None:
+            return None
+        final_url, chain = stored
+        self.resolution_cache.set(key, final_url, negative=len(chain) < 2)
+        return final_url
+
+    def _remember_resolution(self, key: str, url_str: str, resolved: str) -> None:
+        failed = resolved == url_str or not self.is_valid_url(resolved)
+        self.resolution_cache.set(key, resolved, negative=failed)
+        if self.store is not None:
+            chain = [url_str] if failed else [url_str, resolved]
+            self.store.put_redirect(key, resolved, chain, negative=failed)
+
+    def _remember_redirect_chain(self, key: str, chain: List[str]) -> str:
+        if self.store is not None:
+            self.store.put_redirect(key, chain[-1], chain, negative=len(chain) < 2)
+        return chain[-1]
+
+    # Persistent conversion results; only network-derived results are stored
+    # and convert_link only looks up input the offline path could not
+    # convert, which is cheaper than a SQLite round-trip. Results without a
+    # product ID may come from a transient failure (a 503, an open circuit),
+    # so they are kept for the store's negative_ttl only.
+    def _load_conversion(
+        self, sanitized_input: str, preferred_agent: Optional[str]
+    ) -> Optional[ConvertedLink]:
+        if self.store is None:
+            return None
+        stored = self.store.get_conversion(self._conversion_key(sanitized_input))
+        if stored is None:
+            return None
+        result = ConvertedLink.from_dict(stored)
+        agent = (preferred_agent or "").lower()
+        if agent and "agentLink" in result:
+            result.agent_link = self.build_agent_link(
+                agent, result.marketplace, result.product_id, result.raw_link
+            )
+        return result
+
+    def _save_conversion(
+        self, sanitized_input: str, result: ConvertedLink
+    ) -> ConvertedLink:
+        if self.store is not None:
+            stored = result.as_dict()
+            if "agentLink" in stored:
+                stored["agentLink"] = None
+            self.store.put_conversion(
+                self._conversion_key(sanitized_input),
+                stored,
+                negative=not result.product_id,
+            )
+        return result
+
+    # Latency budget
+    def _start_deadline(self, budget_ms: Optional[float]) -> Optional[Deadline]:
+        budget = self.budget_ms if budget_ms is None else budget_ms
+        return Deadline(budget) if budget is not None else None
+
+    def _stage_timeout(self, deadline: Optional[Deadline]) -> float:
+        if deadline is None:
+            return self.request_timeout
+        remaining = deadline.remaining()
+        if remaining <= 0:
+            raise _BudgetExhausted("conversion budget exhausted")
+        return min(self.request_timeout, remaining)
+
+    def _finish_conversion(
+        self,
+        sanitized_input: str,
+        result: ConvertedLink,
+        deadline: Optional[Deadline],
+    ) -> ConvertedLink:
+        """Flags answers cut short by the budget; persists complete ones."""
+        if _expired(deadline) and not result.product_id:
+            return result.replace(timed_out=True)
+        return self._save_conversion(sanitized_input, result)
+
+    # Response parsing shared by the sync and async network helpers
+    def _marketplace_final_url(self, resp: httpx.Response) -> str:
+        """The probe's final URL when redirects already landed on a product page."""
+        final_url = str(resp.url) if resp.url else ""
+        if final_url and self.is_valid_url(final_url):
+            host = _parse_url(final_url).host
+            if _MARKETPLACE_HOST_RE.search(host) or "kakobuy" in host or "cnfans" in host:
+                return final_url
+        return ""
+
+    def _probe_scanner(self, resp: httpx.Response) -> _ProbeScanner:
+        return _ProbeScanner(self, resp.encoding or "utf-8", self.probe_max_bytes)
+
+    def _final_url_from_redirect_checker(self, body: Any, url_str: str) -> str:
+        if not body or body.get("error") or not isinstance(body.get("data"), list):
+            return url_str
+        final_url: Optional[str] = None
+        for step in body["data"]:
+            redirect_url = (
+                step.get("response", {})
+                .get("info", {})
+                .get("redirect_url")
+            )
+            http_code = (
+                step.get("response", {})
+                .get("info", {})
+                .get("http_code")
+            )
+            current_url = (
+                step.get("response", {}).get("info", {}).get("url")
+                or step.get("request", {}).get("info", {}).get("url")
+            )
+            if redirect_url:
+                final_url = redirect_url
+            elif http_code and 200 <= http_code < 400:
+                final_url = current_url or final_url
+        return final_url or url_str
+
+    def _url_from_landing_response(self, resp: httpx.Response, url_str: str) -> str:
+        """Where the landing page sends the browser: HTTP, meta refresh or JS."""
+        possible = str(resp.url) if resp.url else ""
+        if possible and possible != url_str and self.is_valid_url(possible):
+            return possible
+        if isinstance(resp.text, str):
+            m = _META_REFRESH_RE.search(resp.text)
+            if m and self.is_valid_url(m.group(1)):
+                return m.group(1)
+            m = _JS_LOCATION_RE.search(resp.text)
+            if m and self.is_valid_url(m.group(1) or m.group(2)):
+                return m.group(1) or m.group(2)
+        return url_str
+
+    def _redirect_target(
+        self, current: str, status_code: int, location: Optional[str]
+    ) -> Optional[str]:
+        """Absolute Location of a 3xx response, or None when the walk should stop."""
+        if not 300 <= status_code < 400 or not location:
+            return None
+        try:
+            return str(httpx.URL(current).join(location))
+        except Exception:
+            return None
+
+    @staticmethod
+    def _redirect_chain(start_url: str, hops: List[Dict[str, object]]) -> List[str]:
+        return [start_url] + [str(hop["location"]) for hop in hops if hop["location"]]
+
+    @staticmethod
+    def _hop_record(
+        url: str, method: str, status: int, location: Optional[str], started: float
+    ) -> Dict[str, object]:
+        return {
+            "url": url,
+            "method": method,
+            "status": status,
+            "location": location,
+            "ms": round((time.monotonic() - started) * 1000, 2),
+        }
 
     # Normalization
     def normalize_agent_url_to_raw(self, url_str: str) -> str:
         try:
-            u = urlparse(url_str)
-            host = u.netloc.lower().replace("www.", "")
-            hash_query = self.parse_hash_query(u)
+            u = _parse_url(url_str)
+            if self._is_registration_or_non_product(u):
+                return url_str
+            return self._normalize_parsed(url_str, u)
+        except Exception:
+            return url_str
 
-            if self.is_registration_or_non_product_link(url_str):
+    def _normalize_parsed(self, url_str: str, u: _ParsedUrl) -> str:
+        """Dispatch on the registrable domain (last two host labels)."""
+        try:
+            host = u.bare_host
+            normalizer = self._agent_normalizers.get(".".join(host.rsplit(".", 2)[-2:]))
+            if normalizer is None:
                 return url_str
+            return normalizer(self, url_str, u) or url_str
+        except Exception:
+            return url_str
 
-            if host.endswith("picks.ly"):
-                m = re.search(r"/item/([A-Z_]+)/(\d+)", u.path)
-                if m:
-                    plat_raw, pid = m.group(1), m.group(2)
-                    platform = (
-                        "1688"
-                        if plat_raw.upper() == "1688"
-                        else "weidian"
-                        if plat_raw.upper() == "WEIDIAN"
-                        else "taobao"
-                    )
-                    return self.build_marketplace_link(platform, pid)
+    # Per-agent normalizers: (url_str, _ParsedUrl) -> raw marketplace URL or None
+    def _normalize_picksly(self, url_str: str, u: _ParsedUrl) -> Optional[str]:
+        m = _PICKSLY_ITEM_RE.search(u.path)
+        if m:
+            plat_raw, pid = m.group(1), m.group(2)
+            platform = (
+                "1688"
+                if plat_raw.upper() == "1688"
+                else "weidian"
+                if plat_raw.upper() == "WEIDIAN"
+                else "taobao"
+            )
+            return self.build_marketplace_link(platform, pid)
+        return None
 
-            # Broad agent normalization (subset of TS logic focusing on main patterns)
-            if host.endswith(("kakobuy.com", "kakobuy.co", "kabobuy.com")):
-                inner = parse_qs(u.query).get("url", [None])[0]
-                if inner:
-                    return self.safe_decode(inner)
+    def _normalize_kakobuy(self, url_str: str, u: _ParsedUrl) -> Optional[str]:
+        inner = u.query_params.get("url", [None])[0]
+        if inner:
+            return self.safe_decode(inner)
+        return None
 
-            if host.endswith(("hipobuy.com", "oopbuy.com")):
-                parts = [p for p in u.path.split("/") if p]
-                if len(parts) >= 3 and parts[0] == "product":
-                    channel = parts[1].lower()
-                    pid = parts[2]
-                    platform = (
-                        "1688"
-                        if channel in ("0", "ali", "ali_1688", "1688")
-                        else "taobao"
-                        if channel in ("1", "tb", "tmall")
-                        else "weidian"
-                    )
-                    return self.build_marketplace_link(platform, pid)
+    def _normalize_hipobuy(self, url_str: str, u: _ParsedUrl) -> Optional[str]:
+        # hipobuy.com and oopbuy.com share the /product/<channel>/<id> shape
+        parts = [p for p in u.path.split("/") if p]
+        if len(parts) >= 3 and parts[0] == "product":
+            channel = parts[1].lower()
+            pid = parts[2]
+            platform = (
+                "1688"
+                if channel in ("0", "ali", "ali_1688", "1688")
+                else "taobao"
+                if channel in ("1", "tb", "tmall")
+                else "weidian"
+            )
+            return self.build_marketplace_link(platform, pid)
+        return None
 
-            if host.endswith("superbuy.com"):
-                qs = parse_qs(u.query)
-                inner = qs.get("url", [None])[0] or (hash_query.get("url") if hash_query else None)
-                if inner:
-                    return self.safe_decode(inner)
-                platform_raw = qs.get("platform", [None])[0] or (hash_query.get("platform") if hash_query else "")
-                pid = qs.get("id", [None])[0] or (hash_query.get("id") if hash_query else "")
-                plat = (platform_raw or "").upper()
-                platform = (
-                    "1688"
-                    if plat == "ALIBABA"
-                    else "weidian"
-                    if plat == "WD"
-                    else "taobao"
-                    if plat in ("TMALL", "TAOBAO")
-                    else ""
-                )
-                if platform and pid:
-                    return self.build_marketplace_link(platform, pid)
-
-            if host.endswith("cssbuy.com"):
-                m1688 = re.search(r"item-1688-(\d+)\.html", u.path)
-                mw = re.search(r"item-micro-(\d+)\.html", u.path)
-                mtb = re.search(r"item-(\d+)\.html", u.path)
-                if m1688:
-                    return self.build_marketplace_link("1688", m1688.group(1))
-                if mw:
-                    return self.build_marketplace_link("weidian", mw.group(1))
-                if mtb:
-                    return self.build_marketplace_link("taobao", mtb.group(1))
-
-            if host.endswith("pingubuy.com"):
-                m1688 = re.search(r"item-1688-(\d+)\.html", u.path)
-                mw = re.search(r"item-micro-(\d+)\.html", u.path)
-                mtb = re.search(r"item-(\d+)\.html", u.path)
-                if m1688:
-                    return self.build_marketplace_link("1688", m1688.group(1))
-                if mw:
-                    return self.build_marketplace_link("weidian", mw.group(1))
-                if mtb:
-                    return self.build_marketplace_link("taobao", mtb.group(1))
-
-            if host.endswith(("bbdbuy.com", "pantherbuy.com")):
-                qs = parse_qs(u.query)
-                inner = qs.get("url", [None])[0] or (hash_query.get("url") if hash_query else None)
-                if inner:
-                    return self.safe_decode(inner)
-                tid = qs.get("tid", [None])[0] or (hash_query.get("tid") if hash_query else "")
-                tp_raw = (qs.get("tp", [None])[0] or (hash_query.get("tp") if hash_query else "") or "").lower()
-                platform = (
-                    "1688"
-                    if "1688" in tp_raw
-                    else "weidian"
-                    if "micro" in tp_raw
-                    else "taobao"
-                    if "taobao" in tp_raw
-                    else ""
-                )
-                if tid and platform:
-                    return self.build_marketplace_link(platform, tid)
+    def _normalize_superbuy(self, url_str: str, u: _ParsedUrl) -> Optional[str]:
+        hash_query = u.hash_params
+        qs = u.query_params
+        inner = qs.get("url", [None])[0] or (hash_query.get("url") if hash_query else None)
+        if inner:
+            return self.safe_decode(inner)
+        platform_raw = qs.get("platform", [None])[0] or (hash_query.get("platform") if hash_query else "")
+        pid = qs.get("id", [None])[0] or (hash_query.get("id") if hash_query else "")
+        plat = (platform_raw or "").upper()
+        platform = (
+            "1688"
+            if plat == "ALIBABA"
+            else "weidian"
+            if plat == "WD"
+            else "taobao"
+            if plat in ("TMALL", "TAOBAO")
+            else ""
+        )
+        if platform and pid:
+            return self.build_marketplace_link(platform, pid)
+        return None
 
-            if host.endswith("eastmallbuy.com"):
-                qs = parse_qs(u.query)
-                inner = qs.get("url", [None])[0]
-                if inner:
-                    return self.safe_decode(inner)
-                href = url_str
-                m_any = re.search(r"(?:1688ID|itemID)=(\d+)", href)
-                if m_any:
-                    platform = "1688" if "1688ID" in href else "weidian"
-                    return self.build_marketplace_link(platform, m_any.group(1))
-                tid = qs.get("tid", [""])[0]
-                tp = (qs.get("tp", [""])[0]).lower()
-                platform = (
-                    "1688"
-                    if "1688" in tp
-                    else "weidian"
-                    if "micro" in tp
-                    else "taobao"
-                    if "taobao" in tp
-                    else ""
-                )
-                if tid and platform:
-                    return self.build_marketplace_link(platform, tid)
+    def _normalize_item_html(self, url_str: str, u: _ParsedUrl) -> Optional[str]:
+        # cssbuy.com and pingubuy.com: /item-1688-N.html, /item-micro-N.html, /item-N.html
+        m1688 = _ITEM_HTML_1688_RE.search(u.path)
+        mw = _ITEM_HTML_MICRO_RE.search(u.path)
+        mtb = _ITEM_HTML_RE.search(u.path)
+        if m1688:
+            return self.build_marketplace_link("1688", m1688.group(1))
+        if mw:
+            return self.build_marketplace_link("weidian", mw.group(1))
+        if mtb:
+            return self.build_marketplace_link("taobao", mtb.group(1))
+        return None
 
-            if host.endswith("loongbuy.com"):
-                qs = parse_qs(u.query)
-                inner = qs.get("url", [None])[0]
-                if inner:
-                    return self.safe_decode(inner)
-                id1688 = qs.get("1688", [None])[0]
-                idtb = qs.get("taobao", [None])[0]
-                idwd = qs.get("weidian", [None])[0]
-                if id1688:
-                    return self.build_marketplace_link("1688", id1688)
-                if idtb:
-                    return self.build_marketplace_link("taobao", idtb)
-                if idwd:
-                    return self.build_marketplace_link("weidian", idwd)
+    def _normalize_bbdbuy(self, url_str: str, u: _ParsedUrl) -> Optional[str]:
+        # bbdbuy.com and pantherbuy.com
+        hash_query = u.hash_params
+        qs = u.query_params
+        inner = qs.get("url", [None])[0] or (hash_query.get("url") if hash_query else None)
+        if inner:
+            return self.safe_decode(inner)
+        tid = qs.get("tid", [None])[0] or (hash_query.get("tid") if hash_query else "")
+        tp_raw = (qs.get("tp", [None])[0] or (hash_query.get("tp") if hash_query else "") or "").lower()
+        platform = (
+            "1688"
+            if "1688" in tp_raw
+            else "weidian"
+            if "micro" in tp_raw
+            else "taobao"
+            if "taobao" in tp_raw
+            else ""
+        )
+        if tid and platform:
+            return self.build_marketplace_link(platform, tid)
+        return None
 
-            return url_str
-        except Exception:
-            return url_str
+    def _normalize_eastmallbuy(self, url_str: str, u: _ParsedUrl) -> Optional[str]:
+        qs = u.query_params
+        inner = qs.get("url", [None])[0]
+        if inner:
+            return self.safe_decode(inner)
+        href = url_str
+        m_any = _EASTMALL_ID_RE.search(href)
+        if m_any:
+            platform = "1688" if "1688ID" in href else "weidian"
+            return self.build_marketplace_link(platform, m_any.group(1))
+        tid = qs.get("tid", [""])[0]
+        tp = (qs.get("tp", [""])[0]).lower()
+        platform = (
+            "1688"
+            if "1688" in tp
+            else "weidian"
+            if "micro" in tp
+            else "taobao"
+            if "taobao" in tp
+            else ""
+        )
+        if tid and platform:
+            return self.build_marketplace_link(platform, tid)
+        return None
+
+    def _normalize_loongbuy(self, url_str: str, u: _ParsedUrl) -> Optional[str]:
+        qs = u.query_params
+        inner = qs.get("url", [None])[0]
+        if inner:
+            return self.safe_decode(inner)
+        id1688 = qs.get("1688", [None])[0]
+        idtb = qs.get("taobao", [None])[0]
+        idwd = qs.get("weidian", [None])[0]
+        if id1688:
+            return self.build_marketplace_link("1688", id1688)
+        if idtb:
+            return self.build_marketplace_link("taobao", idtb)
+        if idwd:
+            return self.build_marketplace_link("weidian", idwd)
+        return None
+
+    # Registrable domain -> normalizer, built once at class creation
+    _agent_normalizers: Dict[str, Callable[..., Optional[str]]] = {
+        "picks.ly": _normalize_picksly,
+        "kakobuy.com": _normalize_kakobuy,
+        "kakobuy.co": _normalize_kakobuy,
+        "kabobuy.com": _normalize_kakobuy,
+        "hipobuy.com": _normalize_hipobuy,
+        "oopbuy.com": _normalize_hipobuy,
+        "superbuy.com": _normalize_superbuy,
+        "cssbuy.com": _normalize_item_html,
+        "pingubuy.com": _normalize_item_html,
+        "bbdbuy.com": _normalize_bbdbuy,
+        "pantherbuy.com": _normalize_bbdbuy,
+        "eastmallbuy.com": _normalize_eastmallbuy,
+        "loongbuy.com": _normalize_loongbuy,
+    }
 
     # SPA hash parse
     def parse_hash_query(self, u) -> Optional[Dict[str, str]]:
         try:
-            hash_part = u.fragment or u.fragment
-            if not hash_part:
-                return None
-            q_index = hash_part.find("?")
-            if q_index == -1:
-                return None
-            query = hash_part[q_index + 1 :]
-            parsed = parse_qs(query)
-            return {k: v[0] for k, v in parsed.items() if v}
+            return _hash_query(u.fragment)
         except Exception:
             return None
 
     def _handle_spa_hash(self, working_url: str) -> str:
         try:
-            mobile_url = urlparse(working_url)
-            hash_params = self.parse_hash_query(mobile_url)
-            host = mobile_url.netloc.lower().replace("www.", "")
+            mobile_url = _parse_url(working_url)
+            hash_params = mobile_url.hash_params
+            host = mobile_url.bare_host
             if hash_params:
                 inner_from_hash = hash_params.get("url")
                 if inner_from_hash and self.is_valid_url(self.safe_decode(inner_from_hash)):
@@ -886,8 +3166,13 @@ class LinkConverter:
     # Registration / non-product detection
     def is_registration_or_non_product_link(self, url_str: str) -> bool:
         try:
-            u = urlparse(url_str)
-            host = u.netloc.lower().replace("www.", "")
+            return self._is_registration_or_non_product(_parse_url(url_str))
+        except Exception:
+            return False
+
+    def _is_registration_or_non_product(self, u: _ParsedUrl) -> bool:
+        try:
+            host = u.bare_host
             path = u.path.lower()
             if "/register" in path or "/login" in path:
                 return True
@@ -942,19 +3227,18 @@ class LinkConverter:
         decoded = self.multi_decode(text)
         idx = max(decoded.rfind("https://"), decoded.rfind("http://"))
         if idx != -1:
-            candidate = re.split(r"[\s\]\)<>'\"]+", decoded[idx:])[0]
-            trimmed = re.sub(r"[.,;:!?)+\]]+$", "", candidate)
+            candidate = _URL_TERMINATOR_RE.split(decoded[idx:], 1)[0]
+            trimmed = _URL_TRAILING_PUNCT_RE.sub("", candidate)
             if self.is_valid_url(trimmed):
                 return trimmed
-        m = re.search(r"https?://[^\s\"')<>]+", decoded, re.IGNORECASE)
+        m = _URL_IN_TEXT_RE.search(decoded)
         return m.group(0) if m and self.is_valid_url(m.group(0)) else None
 
     def unwrap_inner_url_anywhere(self, text: str) -> Optional[str]:
         if not text:
             return None
         decoded = self.multi_decode(text)
-        re_obj = re.compile(r"(?:^|[?&#])(?:url|link|u|productLink)=([^&#\s]+)", re.IGNORECASE)
-        for match in re_obj.finditer(decoded):
+        for match in _INNER_URL_PARAM_RE.finditer(decoded):
             raw = match.group(1)
             candidate = self.multi_decode(raw)
             if not self.is_valid_url(candidate):
@@ -967,28 +3251,34 @@ class LinkConverter:
 
     def extract_platform_and_id_from_text(self, text: str) -> Dict[str, str]:
         decoded = self.multi_decode(text or "")
-        m = re.search(r"offer/(\d+)\.html", decoded)
-        if m:
-            return {"productId": m.group(1), "marketplace": "1688"}
-        m = re.search(r"(?:itemID|itemId)=(\d{6,})", decoded)
-        if m:
-            return {"productId": m.group(1), "marketplace": "weidian"}
-        m = re.search(r"[?&]id=(\d{6,})", decoded)
-        if m:
-            return {"productId": m.group(1), "marketplace": "taobao"}
-        m = re.search(r"/item/(TAOBAO|TMALL|WEIDIAN|ALIBABA|1688)/(\d+)", decoded, re.IGNORECASE)
-        if m:
-            plat = m.group(1).upper()
-            pid = m.group(2)
-            marketplace = (
-                "1688"
-                if plat in ("ALIBABA", "1688")
-                else "weidian"
-                if plat == "WEIDIAN"
-                else "taobao"
-            )
-            return {"productId": pid, "marketplace": marketplace}
-        return {"productId": "", "marketplace": ""}
+        # Single pass; the best-ranked match wins, ties go to the earliest
+        best = None
+        for m in _TEXT_ID_RE.finditer(decoded):
+            if best is None or _TEXT_ID_RANK[m.lastgroup] < _TEXT_ID_RANK[best.lastgroup]:
+                best = m
+                if _TEXT_ID_RANK[m.lastgroup] == 0:
+                    break
+        if best is None:
+            return {"productId": "", "marketplace": ""}
+        return self._text_id_from_match(best)
+
+    def _text_id_from_match(self, best: "re.Match[str]") -> Dict[str, str]:
+        kind = best.lastgroup
+        if kind == "offer":
+            return {"productId": best.group("offer"), "marketplace": "1688"}
+        if kind == "itemid":
+            return {"productId": best.group("itemid"), "marketplace": "weidian"}
+        if kind == "id":
+            return {"productId": best.group("id"), "marketplace": "taobao"}
+        plat = best.group("platform").upper()
+        marketplace = (
+            "1688"
+            if plat in ("ALIBABA", "1688")
+            else "weidian"
+            if plat == "WEIDIAN"
+            else "taobao"
+        )
+        return {"productId": best.group("platform_id"), "marketplace": marketplace}
 
     def sanitize_product_id(self, product_id: str) -> str:
         if not product_id:
@@ -998,12 +3288,11 @@ class LinkConverter:
             pid = pid.split("/")[0]
         if "?" in pid:
             pid = pid.split("?")[0]
-        return re.sub(r"[^\w\-]", "", pid)
+        return _PID_INVALID_CHARS_RE.sub("", pid)
 
     def is_valid_url(self, url: str) -> bool:
         try:
-            parsed = urlparse(url)
-            return bool(parsed.scheme and parsed.netloc)
+            return _parse_url(url).is_absolute
         except Exception:
             return False
 
@@ -1013,8 +3302,7 @@ class LinkConverter:
     ) -> Tuple[str, bool]:
         extracted_inner = False
         try:
-            u = urlparse(working_url)
-            qs = parse_qs(u.query)
+            qs = _parse_url(working_url).query_params
             for key in self._url_param_keys:
                 if key in qs and qs[key]:
                     inner = qs[key][0]
@@ -1031,3 +3319,692 @@ class LinkConverter:
         return working_url, extracted_inner
 
 
+class AsyncLinkConverter(LinkConverter):
+    """
+    asyncio flavour of LinkConverter for the /convert endpoint.
+
+    Shares every offline stage with LinkConverter; only the network helpers
+    are coroutines, driven by one long-lived httpx.AsyncClient so thousands
+    of conversions can be in flight on a single event loop. Results are the
+    same ConvertedLink-like dicts.
+
+        async with AsyncLinkConverter() as converter:
+            result = await converter.convert_link(url)
+    """
+
+    def __init__(
+        self, client: Optional[httpx.AsyncClient] = None, **pool_options: Any
+    ) -> None:
+        super().__init__(client, **pool_options)  # type: ignore[arg-type]
+        self._inflight = _AsyncSingleFlight()  # type: ignore[assignment]
+
+    @property
+    def client(self) -> httpx.AsyncClient:  # type: ignore[override]
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self) -> httpx.AsyncClient:  # type: ignore[override]
+        return httpx.AsyncClient(
+            limits=self._limits, http2=self._http2, timeout=self.request_timeout
+        )
+
+    def close(self) -> None:
+        raise TypeError("AsyncLinkConverter must be closed with 'await aclose()'")
+
+    async def aclose(self) -> None:
+        if self._client is not None and self._owns_client:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "AsyncLinkConverter":
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        await self.aclose()
+
+    async def _store_call(self, fn: Callable[..., _T], *args: Any) -> _T:
+        """fn(*args) for a helper that may use the store: SQLite calls block,
+        so with a store it runs on a worker thread, off the event loop."""
+        if self.store is None:
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
+
+    # ------------------------------------------------------------------ #
+    # Public API                                                         #
+    # ------------------------------------------------------------------ #
+    async def convert_link(  # type: ignore[override]
+        self,
+        encoded_url: str,
+        preferred_agent: Optional[str] = None,
+        budget_ms: Optional[float] = None,
+    ) -> ConvertedLink:
+        """Async counterpart of LinkConverter.convert_link."""
+        try:
+            canonical = self._convert_canonical(encoded_url, preferred_agent)
+            if canonical is not None:
+                return canonical
+
+            sanitized_input = self._sanitize_input(encoded_url)
+            if not self.is_valid_url(sanitized_input):
+                return self._result_invalid("Invalid URL format")
+
+            probe_candidates: List[str] = [sanitized_input]
+            working_url = self._unwrap_working_url(sanitized_input, probe_candidates)
+            short_link = self.is_likely_short_link(working_url)
+            if not short_link:
+                result, agent_info = self._convert_offline(
+                    sanitized_input, working_url, probe_candidates, preferred_agent
+                )
+                if result is not None:
+                    return result
+
+            stored = await self._store_call(
+                self._load_conversion, sanitized_input, preferred_agent
+            )
+            if stored is not None:
+                return stored
+            deadline = self._start_deadline(budget_ms)
+
+            if short_link:
+                resolved = await self.resolve_short_link_via_api(
+                    working_url, deadline=deadline
+                )
+                working_url = self._accept_resolved(
+                    working_url, resolved, probe_candidates
+                )
+                result, agent_info = self._convert_offline(
+                    sanitized_input, working_url, probe_candidates, preferred_agent
+                )
+                if result is not None:
+                    return await self._store_call(
+                        self._finish_conversion, sanitized_input, result, deadline
+                    )
+
+            result = await self._probe_first(
+                probe_candidates, agent_info, preferred_agent, deadline
+            )
+            if result is not None:
+                return await self._store_call(
+                    self._finish_conversion, sanitized_input, result, deadline
+                )
+
+            final_hop = (
+                probe_candidates[-1]
+                if _expired(deadline)
+                else await self.follow_redirects_manually(
+                    sanitized_input, deadline=deadline
+                )
+            )
+            return await self._store_call(
+                self._finish_conversion,
+                sanitized_input,
+                self._result_from_final_hop(final_hop, agent_info),
+                deadline,
+            )
+        except Exception as exc:  # pragma: no cover - defensive
+            return self._result_error(exc)
+
+    async def convert_many(  # type: ignore[override]
+        self,
+        urls: Iterable[str],
+        preferred_agent: Optional[str] = None,
+        concurrency: int = 16,
+        budget_ms: Optional[float] = None,
+    ) -> List[ConvertedLink]:
+        """Async counterpart of LinkConverter.convert_many."""
+        results, pending = self._split_offline(urls, preferred_agent)
+        if pending:
+            semaphore = asyncio.Semaphore(max(1, concurrency))
+
+            async def bounded(url: str) -> ConvertedLink:
+                async with semaphore:
+                    return await self.convert_link(url, preferred_agent, budget_ms)
+
+            converted = await asyncio.gather(*(bounded(url) for url in pending))
+            for result, indexes in zip(converted, pending.values()):
+                for index in indexes:
+                    results[index] = result
+        return results  # type: ignore[return-value]
+
+    # ------------------------------------------------------------------ #
+    # Network helpers                                                    #
+    # ------------------------------------------------------------------ #
+    async def _get(  # type: ignore[override]
+        self, url: str, deadline: Optional[Deadline] = None, **kwargs: Any
+    ) -> httpx.Response:
+        return await self._request("GET", url, deadline, **kwargs)
+
+    async def _request(  # type: ignore[override]
+        self, method: str, url: str, deadline: Optional[Deadline] = None, **kwargs: Any
+    ) -> httpx.Response:
+        timeout = self._stage_timeout(deadline)
+
+        async def send() -> httpx.Response:
+            async with self._host_slot(url) as observe:
+                return observe(
+                    await self.client.request(method, url, timeout=timeout, **kwargs)
+                )
+
+        return await self._within(deadline, send())
+
+    @staticmethod
+    async def _within(deadline: Optional[Deadline], call: Awaitable[_T]) -> _T:
+        if deadline is None:
+            return await call
+        # httpx timeouts are per phase; wait_for enforces the total budget
+        try:
+            return await asyncio.wait_for(call, deadline.remaining())
+        except asyncio.TimeoutError as exc:
+            raise _BudgetExhausted("conversion budget exhausted") from exc
+
+    @asynccontextmanager
+    async def _host_slot(  # type: ignore[override]
+        self, url: str
+    ) -> AsyncIterator[Callable[[httpx.Response], httpx.Response]]:
+        # No timeout here: _get's wait_for bounds the whole request, queueing
+        # included
+        gate = self._host_gate(_parse_url(url).host)
+        if not gate.breaker.allow():
+            raise _CircuitOpen(f"circuit open for {url}")
+        started = time.monotonic()
+        async with gate.slot:
+            if gate.bucket is not None:
+                delay = gate.bucket.take()
+                if delay:
+                    try:
+                        await asyncio.sleep(delay)
+                    except asyncio.CancelledError:
+                        gate.bucket.give_back()
+                        raise
+            gate.record(time.monotonic() - started)
+            try:
+                yield self._observer(gate)
+            except httpx.TransportError:
+                gate.breaker.record_failure()
+                raise
+
+    def _new_host_slot(self, concurrency: int) -> Any:
+        return asyncio.Semaphore(concurrency)
+
+    async def _probe_first(  # type: ignore[override]
+        self,
+        candidates: List[str],
+        agent_info: AgentInfo,
+        preferred_agent: Optional[str],
+        deadline: Optional[Deadline],
+    ) -> Optional[ConvertedLink]:
+        unique = list(dict.fromkeys(candidates))
+        if len(unique) == 1:
+            probed = await self.probe_for_raw_url_via_http(unique[0], deadline=deadline)
+            return self._result_from_probe(probed, agent_info, preferred_agent)
+        order = {
+            asyncio.ensure_future(
+                self.probe_for_raw_url_via_http(candidate, deadline=deadline)
+            ): i
+            for i, candidate in enumerate(unique)
+        }
+        pending = set(order)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=_time_left(deadline), return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    return None
+                for task in sorted(done, key=order.__getitem__):
+                    result = self._result_from_probe(
+                        task.result(), agent_info, preferred_agent
+                    )
+                    if result is not None:
+                        return result
+            return None
+        finally:
+            # Losers are cancelled outright, connections included, unless
+            # another conversion is waiting on the same probe
+            for task in pending:
+                task.cancel()
+
+    async def probe_for_raw_url_via_http(  # type: ignore[override]
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> str:
+        try:
+            return await self._inflight.do(
+                f"probe {self._resolution_cache_key(url_str)}",
+                lambda: self._probe_uncached(url_str, deadline),
+                timeout=_time_left(deadline),
+            )
+        except _BudgetExhausted:
+            return ""
+
+    async def _probe_uncached(  # type: ignore[override]
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> str:
+        try:
+            timeout = self._stage_timeout(deadline)
+            return await self._within(
+                deadline, self._probe_stream(url_str, timeout, deadline)
+            )
+        except _BudgetExhausted:
+            raise _Unsettled("")
+        except Exception:
+            return ""
+
+    async def _probe_stream(
+        self, url_str: str, timeout: float, deadline: Optional[Deadline] = None
+    ) -> str:
+        async with self._host_slot(url_str) as observe:
+            async with self.client.stream(
+                "GET",
+                url_str,
+                follow_redirects=True,
+                timeout=timeout,
+                headers=_REQUEST_HEADERS,
+            ) as resp:
+                found = self._marketplace_final_url(observe(resp))
+                if found:
+                    return found
+                scanner = self._probe_scanner(resp)
+                async for chunk in resp.aiter_bytes(self.probe_chunk_size):
+                    found = scanner.feed(chunk)
+                    if found or scanner.full:
+                        break
+                    if _expired(deadline):
+                        raise _BudgetExhausted(f"budget exhausted reading {url_str}")
+                return found or scanner.finish()
+
+    async def resolve_short_link_via_api(  # type: ignore[override]
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> str:
+        key = self._resolution_cache_key(url_str)
+        cached = self.resolution_cache.get(key)
+        if cached is None and self.store is not None:
+            cached = await asyncio.to_thread(self._load_resolution, key)
+        if cached is not None:
+            return cached
+        try:
+            return await self._inflight.do(
+                f"resolve {key}",
+                lambda: self._resolve_and_remember(key, url_str, deadline),
+                timeout=_time_left(deadline),
+            )
+        except _BudgetExhausted:
+            return url_str
+
+    async def _resolve_and_remember(  # type: ignore[override]
+        self, key: str, url_str: str, deadline: Optional[Deadline] = None
+    ) -> str:
+        resolved, skipped = await (
+            self._resolve_hedged(url_str, deadline)
+            if self.hedge
+            else self._resolve_short_link_uncached(url_str, deadline)
+        )
+        if resolved != url_str or not (skipped or _expired(deadline)):
+            await self._store_call(self._remember_resolution, key, url_str, resolved)
+        elif _expired(deadline):
+            raise _Unsettled(resolved)
+        return resolved
+
+    async def _resolve_hedged(  # type: ignore[override]
+        self, url_str: str, deadline: Optional[Deadline]
+    ) -> Tuple[str, bool]:
+        hedger = self._hedger
+        started = time.monotonic()
+        hedger.start()
+        primary = asyncio.ensure_future(
+            self._resolve_short_link_uncached(url_str, deadline)
+        )
+
+        def observe(task: "asyncio.Future[Tuple[str, bool]]") -> None:
+            # A cancelled primary (the hedge won, or the budget ran out) never
+            # ran to its end; its truncated time would drag the p95 down
+            if not task.cancelled():
+                hedger.observe(time.monotonic() - started)
+
+        primary.add_done_callback(observe)
+        delay = hedger.delay()
+        left = _time_left(deadline)
+        done, pending = await asyncio.wait(
+            {primary}, timeout=delay if left is None else min(delay, left)
+        )
+        if not done and not _expired(deadline) and hedger.admit():
+            pending.add(
+                asyncio.ensure_future(
+                    self._resolve_short_link_uncached(
+                        url_str, deadline, self.hedge_resolvers
+                    )
+                )
+            )
+        pending |= done
+        skipped = False
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=_time_left(deadline), return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    return url_str, True
+                for task in done:
+                    resolved, attempt_skipped = task.result()
+                    if resolved != url_str:
+                        if task is not primary:
+                            hedger.hedge_wins += 1
+                        return resolved, False
+                    skipped = skipped or attempt_skipped
+            return url_str, skipped
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _resolve_short_link_uncached(  # type: ignore[override]
+        self,
+        url_str: str,
+        deadline: Optional[Deadline] = None,
+        stages: Optional[Sequence[str]] = None,
+    ) -> Tuple[str, bool]:
+        skipped = False
+        for stage in stages or self.short_link_resolvers:
+            if _expired(deadline):
+                return url_str, True
+            started = time.monotonic()
+            try:
+                resolved = await getattr(self, self._short_link_stages[stage])(
+                    url_str, deadline
+                )
+            except Exception as exc:
+                self._record_stage(stage, started, False, failed=True)
+                skipped = skipped or isinstance(exc, (_CircuitOpen, _BudgetExhausted))
+                continue
+            answered = bool(resolved) and self._resolved_to(url_str, resolved)
+            self._record_stage(stage, started, answered)
+            if answered:
+                return resolved, False
+        return url_str, skipped
+
+    async def _resolve_via_redirects(  # type: ignore[override]
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        return await self.follow_redirects_manually(url_str, deadline=deadline)
+
+    async def _resolve_via_html(  # type: ignore[override]
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        resp = await self._get(
+            url_str, deadline, follow_redirects=True, headers=_REQUEST_HEADERS
+        )
+        return self._url_from_landing_response(resp, url_str)
+
+    async def _resolve_via_api(  # type: ignore[override]
+        self, url_str: str, deadline: Optional[Deadline] = None
+    ) -> Optional[str]:
+        api_url = f"https://api.redirect-checker.net/?url={url_str}"
+        resp = await self._get(api_url, deadline)
+        return self._final_url_from_redirect_checker(resp.json(), url_str)
+
+    async def follow_redirects_manually(  # type: ignore[override]
+        self,
+        start_url: str,
+        max_hops: int = 5,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        key = self._resolution_cache_key(start_url)
+        stored = (
+            await asyncio.to_thread(self.store.get_redirect, key)
+            if self.store is not None
+            else None
+        )
+        if stored is not None:
+            return stored[0]
+        try:
+            return await self._inflight.do(
+                f"redirects {key}",
+                lambda: self._walk_redirects(key, start_url, max_hops, deadline),
+                timeout=_time_left(deadline),
+            )
+        except _BudgetExhausted:
+            return start_url
+
+    async def _walk_redirects(  # type: ignore[override]
+        self,
+        key: str,
+        start_url: str,
+        max_hops: int,
+        deadline: Optional[Deadline] = None,
+    ) -> str:
+        hops: List[Dict[str, object]] = []
+        try:
+            await self._trace_into(hops, start_url, max_hops, deadline)
+        except _BudgetExhausted:
+            raise _Unsettled(self._redirect_chain(start_url, hops)[-1])
+        return await self._store_call(
+            self._remember_redirect_chain, key, self._redirect_chain(start_url, hops)
+        )
+
+    async def trace_redirects(  # type: ignore[override]
+        self,
+        start_url: str,
+        max_hops: int = 5,
+        deadline: Optional[Deadline] = None,
+    ) -> List[Dict[str, object]]:
+        hops: List[Dict[str, object]] = []
+        try:
+            await self._trace_into(hops, start_url, max_hops, deadline)
+        except _BudgetExhausted:
+            pass
+        return hops
+
+    async def _trace_into(  # type: ignore[override]
+        self,
+        hops: List[Dict[str, object]],
+        start_url: str,
+        max_hops: int,
+        deadline: Optional[Deadline],
+    ) -> None:
+        current = start_url
+        for _ in range(max_hops):
+            if _expired(deadline):
+                raise _BudgetExhausted(f"budget exhausted walking {start_url}")
+            started = time.monotonic()
+            method, status, location = await self._hop(current, deadline)
+            next_url = self._redirect_target(current, status, location)
+            hops.append(self._hop_record(current, method, status, next_url, started))
+            if next_url is None:
+                return
+            current = next_url
+
+    async def _hop(  # type: ignore[override]
+        self, url: str, deadline: Optional[Deadline]
+    ) -> Tuple[str, int, Optional[str]]:
+        host = _parse_url(url).host
+        gate = self._host_gate(host)
+        head_rejected = False
+        if host not in self.head_rejecting_hosts and not gate.rejects_head:
+            resp = await self._request(
+                "HEAD", url, deadline, follow_redirects=False, headers=_REQUEST_HEADERS
+            )
+            if resp.status_code not in _HEAD_REJECTED_STATUSES:
+                return "HEAD", resp.status_code, resp.headers.get("location")
+            head_rejected = True
+        timeout = self._stage_timeout(deadline)
+        status, location = await self._within(deadline, self._peek(url, timeout))
+        if head_rejected and status not in _HEAD_REJECTED_STATUSES:
+            gate.rejects_head = True
+        return "GET", status, location
+
+    async def _peek(self, url: str, timeout: float) -> Tuple[int, Optional[str]]:
+        """Status and Location of a GET, closed before the body is read."""
+        async with self._host_slot(url) as observe:
+            async with self.client.stream(
+                "GET",
+                url,
+                follow_redirects=False,
+                timeout=timeout,
+                headers=_REQUEST_HEADERS,
+            ) as resp:
+                observe(resp)
+                return resp.status_code, resp.headers.get("location")
+
+
+# ---------------------------------------------------------------------- #
+# Command line: python -m link_converter                                 #
+# ---------------------------------------------------------------------- #
+def _detect_input_format(path: str) -> str:
+    lowered = path.lower()
+    if lowered.endswith(".csv"):
+        return "csv"
+    if lowered.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "text"
+
+
+def _iter_input_records(stream: TextIO, fmt: str, column: str) -> Iterator[str]:
+    """Yields one URL/text per input record without reading ahead."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        if reader.fieldnames is not None and column not in reader.fieldnames:
+            raise ValueError(f"CSV input has no column named {column!r}")
+        for row in reader:
+            yield row.get(column) or ""
+    elif fmt == "jsonl":
+        for line in stream:
+            if line.strip():
+                record = json.loads(line)
+                yield str(record.get(column) or "") if isinstance(record, dict) else str(record)
+    else:
+        for line in stream:
+            if line.strip():
+                yield line.strip()
+
+
+def _read_checkpoint(path: Optional[str]) -> Tuple[int, Optional[int]]:
+    """(records done, output size in bytes when they were); no size for
+    stdout output or checkpoints written before it was recorded."""
+    if not path or not os.path.exists(path):
+        return 0, None
+    with open(path, encoding="utf-8") as fh:
+        state = json.load(fh)
+    offset = state.get("offset")
+    return int(state.get("records", 0)), None if offset is None else int(offset)
+
+
+def _write_checkpoint(
+    path: Optional[str], records: int, offset: Optional[int] = None
+) -> None:
+    if not path:
+        return
+    state: Dict[str, int] = {"records": records}
+    if offset is not None:
+        state["offset"] = offset
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m link_converter",
+        description=(
+            "Convert links in bulk. Reads plain text (one link per line), CSV "
+            "or JSONL and writes one ConvertedLink JSON object per line, in "
+            "input order, with \"record\" (1-based input record number; blank "
+            "lines are not records) and \"input\" (the link as read) added."
+        ),
+    )
+    parser.add_argument("input", nargs="?", default="-", help="input file, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file, '-' for stdout")
+    parser.add_argument(
+        "--format",
+        choices=("auto", "text", "csv", "jsonl"),
+        default="auto",
+        help="input format; 'auto' picks by file extension",
+    )
+    parser.add_argument("--column", default="url", help="CSV column / JSONL field holding the link")
+    parser.add_argument("--agent", default=None, help="preferred agent for agentLink")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=500,
+        help="records held in memory at once; the checkpoint advances per batch",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="progress file; an existing one resumes after the recorded record",
+    )
+    parser.add_argument("--store", default=None, help="SQLite resolution store path")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=None,
+        help="latency budget per link; slower links come back with timedOut",
+    )
+    args = parser.parse_args(argv)
+
+    fmt = args.format
+    if fmt == "auto":
+        fmt = "text" if args.input == "-" else _detect_input_format(args.input)
+
+    done, offset = _read_checkpoint(args.checkpoint)
+    owns_source = args.input != "-"
+    source: TextIO = (
+        open(args.input, encoding="utf-8", newline="")
+        if owns_source
+        else io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+    )
+    if done and offset is not None and os.path.exists(args.output):
+        # Drop lines written after the last checkpoint by a run that died
+        # mid-batch; those records are converted again
+        os.truncate(args.output, offset)
+    sink: TextIO = (
+        sys.stdout
+        if args.output == "-"
+        else open(args.output, "a" if done else "w", encoding="utf-8")
+    )
+    store = SQLiteResolutionStore(args.store) if args.store else None
+    converted = valid = 0
+    try:
+        with LinkConverter(store=store, budget_ms=args.budget_ms) as converter:
+            records = itertools.islice(
+                _iter_input_records(source, fmt, args.column), done, None
+            )
+            while True:
+                batch = list(itertools.islice(records, max(1, args.batch_size)))
+                if not batch:
+                    break
+                results = converter.convert_many(batch, args.agent, args.concurrency)
+                first = done + converted + 1
+                for record, (text, result) in enumerate(zip(batch, results), first):
+                    line = {"record": record, "input": text, **result.as_dict()}
+                    sink.write(json.dumps(line, ensure_ascii=False) + "\n")
+                    valid += result.is_valid
+                sink.flush()
+                converted += len(batch)
+                _write_checkpoint(
+                    args.checkpoint,
+                    done + converted,
+                    None if sink is sys.stdout else os.fstat(sink.fileno()).st_size,
+                )
+    except (ValueError, csv.Error) as exc:  # malformed CSV/JSONL input
+        print(f"error: {exc} (after {done + converted} records)", file=sys.stderr)
+        return 2
+    finally:
+        if owns_source:
+            source.close()
+        else:
+            source.detach()  # leave sys.stdin usable
+        if sink is not sys.stdout:
+            sink.close()
+        if store is not None:
+            store.close()
+
+    print(
+        f"converted {converted} records ({valid} valid), skipped {done} already done",
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
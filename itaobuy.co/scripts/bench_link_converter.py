@@ -0,0 +1,370 @@
+"""
+Micro-benchmarks for the LinkConverter stages.
+
+Times convert_link, normalize_agent_url_to_raw, build_all_agent_links,
+detect_agent and extract_platform_and_id_from_text separately over fixed
+corpora (canonical marketplace URLs, every agent's product URL, wrapped and
+percent-encoded links, SPA-hash URLs, short links, marketplace pages that
+are not products and messy pasted text).
+
+Every run first checks each stage's output against the expected results
+stored next to this script, so a speed-up that changes answers fails
+loudly. Timings can be saved as a baseline and compared on a later run:
+
+    python scripts/bench_link_converter.py --save-baseline before.json
+    ... change link_converter.py ...
+    python scripts/bench_link_converter.py --compare before.json
+
+No request leaves the machine: the converter's client answers every
+request with a local 404, so inputs needing the network measure the
+failure path. Caches are warm after the first round, as in a long-running
+process.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from link_converter import LinkConverter  # noqa: E402
+
+EXPECTED_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "bench_link_converter.expected.json"
+)
+
+CANONICAL = [
+    "https://item.taobao.com/item.htm?id=652874123456",
+    "https://detail.tmall.com/item.htm?id=652874123456",
+    "https://weidian.com/item.html?itemID=7573302426",
+    "https://detail.1688.com/offer/612345678901.html",
+    "https://item.taobao.com/item.htm?spm=a21wu.241046-global&id=652874123456",
+    "https://weidian.com/item.html?itemID=7573302426&spider_token=d389",
+]
+
+# One product page per agent, as build_all_agent_links writes them
+AGENT_URLS = [
+    "https://www.kakobuy.com/item/details?url=https%3A%2F%2Fweidian.com%2Fitem.html%3FitemID%3D7573302426&affcode=peter",
+    "https://hipobuy.com/product/weidian/7573302426?inviteCode=SBCXYTYKF",
+    "https://cnfans.com/product?id=7573302426&platform=WEIDIAN&ref=15340480",
+    "https://www.acbuy.com/product?id=7573302426&source=WD&u=VDFVGW",
+    "https://mulebuy.com/product?id=7573302426&platform=WEIDIAN&ref=200311823",
+    "https://oopbuy.com/product/weidian/7573302426?inviteCode=5I6VVS7GI",
+    "https://lovegobuy.com/product?id=7573302426&shop_type=weidian&invite_code=9RN41U",
+    "https://www.itaobuy.com/product-detail?url=https%3A%2F%2Fweidian.com%2Fitem.html%3FitemID%3D7573302426&inviteCode=5E6LZQUE",
+    "https://cssbuy.com/item-micro-7573302426.html",
+    "https://usfans.com/product/3/7573302426?ref=GAYXBM",
+    "https://www.superbuy.com/en/page/buy/?platform=WD&id=7573302426&partnercode=EVZK8D",
+    "https://www.basetao.com/best-taobao-agent-service/products/agent/weidian/7573302426.html",
+    "https://eastmallbuy.com/item?tp=micro&tid=7573302426&inviter=petopagi",
+    "https://pingubuy.com/item-micro-7573302426.html",
+    "https://hoobuy.com/product/2/7573302426?inviteCode=AXnBBwX7",
+    "https://orientdig.com/product?id=7573302426&platform=WEIDIAN&ref=100123295",
+    "https://www.ootdbuy.com/goods/details?id=7573302426&channel=weidian",
+    "https://www.sugargoo.com/productDetail?productLink=https%3A%2F%2Fweidian.com%2Fitem.html%3FitemID%3D7573302426&memberId=2533720779801838919",
+    "https://joyagoo.com/product?id=7573302426&platform=WEIDIAN",
+    "https://pantherbuy.com/item?tp=micro&tid=7573302426",
+    "https://www.ponybuy.com/products/3/7573302426?inviteCode=fee1a5754a",
+    "https://bbdbuy.com/index/item/index.html?tp=micro&tid=7573302426",
+    "https://buy.gonest.cn/en/product/0?platform=micro&type=2&keyword=https%3A%2F%2Fweidian.com%2Fitem.html%3FitemID%3D7573302426",
+    "https://loongbuy.com/product-details?weidian=7573302426",
+    "https://www.kakobuy.com/item/details?url=https%3A%2F%2Fitem.taobao.com%2Fitem.htm%3Fid%3D652874123456&affcode=peter",
+    "https://hipobuy.com/product/1/652874123456?inviteCode=SBCXYTYKF",
+    "https://cnfans.com/product?id=652874123456&platform=TAOBAO&ref=15340480",
+    "https://www.acbuy.com/product?id=652874123456&source=TB&u=VDFVGW",
+    "https://mulebuy.com/product?id=652874123456&platform=TAOBAO&ref=200311823",
+    "https://oopbuy.com/product/1/652874123456?inviteCode=5I6VVS7GI",
+    "https://lovegobuy.com/product?id=652874123456&shop_type=taobao&invite_code=9RN41U",
+    "https://www.itaobuy.com/product-detail?url=https%3A%2F%2Fitem.taobao.com%2Fitem.htm%3Fid%3D652874123456&inviteCode=5E6LZQUE",
+    "https://cssbuy.com/item-652874123456.html",
+    "https://usfans.com/product/2/652874123456?ref=GAYXBM",
+    "https://www.superbuy.com/en/page/buy/?platform=TMALL&id=652874123456&partnercode=EVZK8D",
+    "https://www.basetao.com/best-taobao-agent-service/products/agent/taobao/652874123456.html",
+    "https://eastmallbuy.com/index/item/index.html?tp=taobao&url=https%3A%2F%2Fitem.taobao.com%2Fitem.htm%3Fid%3D652874123456&inviter=petopagi",
+    "https://pingubuy.com/item-652874123456.html?promotionCode=blBaSG5JMTE",
+    "https://hoobuy.com/product/1/652874123456?inviteCode=AXnBBwX7",
+    "https://orientdig.com/product?id=652874123456&platform=TAOBAO&ref=100123295",
+    "https://www.ootdbuy.com/goods/details?id=652874123456&channel=TAOBAO",
+    "https://www.sugargoo.com/productDetail?productLink=https%3A%2F%2Fitem.taobao.com%2Fitem.htm%3Fid%3D652874123456&memberId=2533720779801838919",
+    "https://joyagoo.com/product?id=652874123456&platform=TAOBAO",
+    "https://pantherbuy.com/index/item/index.html?tp=taobao&url=https%3A%2F%2Fitem.taobao.com%2Fitem.htm%3Fid%3D652874123456&inviteid=MTM0OQ%3D%3D",
+    "https://www.ponybuy.com/products/1/652874123456?inviteCode=fee1a5754a",
+    "https://bbdbuy.com/index/item/index.html?tp=taobao&tid=652874123456",
+    "https://buy.gonest.cn/en/product/652874123456?platform=taobao&type=1",
+    "https://loongbuy.com/product-details?taobao=652874123456",
+]
+
+WRAPPED = [
+    "https%3A%2F%2Fitem.taobao.com%2Fitem.htm%3Fid%3D652874123456",
+    "https%253A%252F%252Fweidian.com%252Fitem.html%253FitemID%253D7573302426",
+    "https://www.google.com/url?q=https%3A%2F%2Fweidian.com%2Fitem.html%3FitemID%3D7573302426",
+    "https://l.facebook.com/l.php?u=https%3A%2F%2Fitem.taobao.com%2Fitem.htm%3Fid%3D652874123456",
+    "https://www.kakobuy.com/item/details?url=https%3A%2F%2Fdetail.1688.com%2Foffer%2F612345678901.html",
+    "https://www.sugargoo.com/productDetail?productLink=https%253A%252F%252Fitem.taobao.com%252Fitem.htm%253Fid%253D652874123456",
+]
+
+SPA_HASH = [
+    "https://www.superbuy.com/en/page/buy/#/?platform=WD&id=7573302426",
+    "https://m.superbuy.com/#/goodsDetail?url=https%3A%2F%2Fweidian.com%2Fitem.html%3FitemID%3D7573302426",
+    "https://pantherbuy.com/#/item?tp=micro&tid=7573302426",
+    "https://www.superbuy.com/en/page/buy?nTag=Home-search&url=https%3A%2F%2Fitem.taobao.com%2Fitem.htm%3Fid%3D652874123456#/",
+    "https://eastmallbuy.com/#/item?tp=taobao&tid=652874123456",
+]
+
+# Need the network: resolution fails locally, so these time the miss path
+SHORT_LINKS = [
+    "https://m.tb.cn/h.UxYz123",
+    "https://e.tb.cn/h.gU3k2Lm",
+    "https://bit.ly/3xYzAbc",
+]
+
+# Marketplace pages without a product id (shops, home and search pages)
+UNSUPPORTED = [
+    "https://shop123.taobao.com/",
+    "https://weidian.com/?userid=1234567",
+    "https://www.taobao.com/",
+    "https://s.1688.com/selloffer/offer_search.htm?keywords=shoes",
+]
+
+MESSY_TEXT = [
+    "  @@https://item.taobao.com/item.htm?id=652874123456  ",
+    "check this out https://weidian.com/item.html?itemID=7573302426), nice!",
+    "W2C?? -> <https://cnfans.com/product?id=7573302426&platform=WEIDIAN&ref=1>",
+    "taobao 652874123456",
+    "weidian itemID=7573302426 size M",
+    "【淘宝】https://m.tb.cn/h.UxYz123 复制这条信息打开手机淘宝",
+    "1688 offer 612345678901 batch 2",
+    "no link here, just vibes",
+]
+
+CORPORA: Dict[str, List[str]] = {
+    "canonical": CANONICAL,
+    "agent": AGENT_URLS,
+    "wrapped": WRAPPED,
+    "spa_hash": SPA_HASH,
+    "short_link": SHORT_LINKS,
+    "unsupported": UNSUPPORTED,
+    "messy_text": MESSY_TEXT,
+}
+
+# (marketplace, product id) pairs for build_all_agent_links
+ITEMS: List[Tuple[str, str]] = [
+    ("taobao", "652874123456"),
+    ("weidian", "7573302426"),
+    ("1688", "612345678901"),
+    ("tmall", "652874123456"),
+]
+
+
+def _jsonable(value: Any) -> Any:
+    if hasattr(value, "as_dict"):
+        return value.as_dict()
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+
+def _offline_converter() -> LinkConverter:
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(404)))
+    return LinkConverter(client=client)
+
+
+def stages(converter: LinkConverter) -> Dict[str, Tuple[Callable[[Any], Any], Dict[str, list]]]:
+    """stage name -> (function of one input, {corpus name: inputs})."""
+    urls = {name: corpus for name, corpus in CORPORA.items() if name != "messy_text"}
+    return {
+        "convert_link": (converter.convert_link, CORPORA),
+        "normalize_agent_url_to_raw": (converter.normalize_agent_url_to_raw, urls),
+        "build_all_agent_links": (
+            lambda item: converter.build_all_agent_links(*item),
+            {"items": ITEMS},
+        ),
+        "detect_agent": (converter.detect_agent, urls),
+        "extract_platform_and_id_from_text": (
+            converter.extract_platform_and_id_from_text,
+            CORPORA,
+        ),
+    }
+
+
+def collect_outputs(converter: LinkConverter) -> Dict[str, Dict[str, list]]:
+    return {
+        stage: {
+            corpus: [_jsonable(fn(value)) for value in inputs]
+            for corpus, inputs in corpora.items()
+        }
+        for stage, (fn, corpora) in stages(converter).items()
+    }
+
+
+def _stage_inputs(stage: str, corpus: str) -> list:
+    return ITEMS if stage == "build_all_agent_links" else CORPORA[corpus]
+
+
+def check_outputs(
+    outputs: Dict[str, Dict[str, list]], expected: Dict[str, Dict[str, list]]
+) -> List[str]:
+    """Human-readable differences between two collect_outputs() results."""
+    problems = []
+    for stage, by_corpus in expected.items():
+        for corpus, values in by_corpus.items():
+            got = outputs.get(stage, {}).get(corpus)
+            if got is None:
+                problems.append(f"{stage}/{corpus}: missing")
+                continue
+            inputs = _stage_inputs(stage, corpus)
+            for index, (want, have) in enumerate(zip(values, got)):
+                if want != have:
+                    problems.append(
+                        f"{stage}/{corpus}[{index}] {inputs[index]!r}:\n"
+                        f"    expected {want!r}\n    got      {have!r}"
+                    )
+            if len(values) != len(got):
+                problems.append(f"{stage}/{corpus}: {len(got)} outputs, expected {len(values)}")
+    return problems
+
+
+def time_stage(
+    fn: Callable[[Any], Any], inputs: Sequence[Any], repeat: int, min_time: float
+) -> Dict[str, float]:
+    """
+    Per-call microseconds over `inputs`: the corpus is run in a loop
+    calibrated to take at least `min_time` seconds, `repeat` times; min is
+    the least noisy estimate, median shows the spread.
+    """
+    def run(loops: int) -> float:
+        start = time.perf_counter()
+        for _ in range(loops):
+            for value in inputs:
+                fn(value)
+        return time.perf_counter() - start
+
+    loops = 1
+    while run(loops) < min_time:
+        loops *= 2
+    calls = loops * len(inputs)
+    samples = [run(loops) / calls * 1e6 for _ in range(repeat)]
+    return {"min_us": min(samples), "median_us": statistics.median(samples), "calls": calls}
+
+
+def run_timings(
+    converter: LinkConverter,
+    only: Optional[Sequence[str]],
+    repeat: int,
+    min_time: float,
+) -> Dict[str, Dict[str, Dict[str, float]]]:
+    timings: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for stage, (fn, corpora) in stages(converter).items():
+        if only and stage not in only:
+            continue
+        for corpus, inputs in corpora.items():
+            timings.setdefault(stage, {})[corpus] = time_stage(fn, inputs, repeat, min_time)
+    return timings
+
+
+def print_report(
+    timings: Dict[str, Dict[str, Dict[str, float]]],
+    baseline: Optional[Dict[str, Dict[str, Dict[str, float]]]],
+    threshold: float,
+) -> List[str]:
+    """Prints the table; returns the stage/corpus pairs slower than
+    `threshold` times the baseline."""
+    regressions = []
+    header = f"{'stage':36} {'corpus':11} {'min us':>9} {'median us':>10}"
+    if baseline is not None:
+        header += f" {'base us':>9} {'ratio':>6}"
+    print(header)
+    for stage, by_corpus in timings.items():
+        for corpus, t in by_corpus.items():
+            line = f"{stage:36} {corpus:11} {t['min_us']:9.2f} {t['median_us']:10.2f}"
+            before = (baseline or {}).get(stage, {}).get(corpus)
+            if before:
+                ratio = t["min_us"] / before["min_us"]
+                flag = "  SLOWER" if ratio > threshold else ""
+                line += f" {before['min_us']:9.2f} {ratio:6.2f}{flag}"
+                if flag:
+                    regressions.append(f"{stage}/{corpus}")
+            print(line)
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python scripts/bench_link_converter.py",
+        description="Time each LinkConverter stage over fixed corpora.",
+    )
+    parser.add_argument("--stage", action="append", help="only time this stage (repeatable)")
+    parser.add_argument("--repeat", type=int, default=7, help="timed rounds per stage/corpus")
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.1,
+        help="seconds each round should last at least",
+    )
+    parser.add_argument("--save-baseline", metavar="PATH", help="write timings to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="compare timings with a saved baseline")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.20,
+        help="with --compare, fail when min time exceeds baseline by this factor",
+    )
+    parser.add_argument(
+        "--update-expected",
+        action="store_true",
+        help="store the current outputs as the expected ones instead of checking",
+    )
+    args = parser.parse_args(argv)
+
+    with _offline_converter() as converter:
+        outputs = collect_outputs(converter)
+        if args.update_expected:
+            with open(EXPECTED_PATH, "w", encoding="utf-8") as fh:
+                json.dump(outputs, fh, indent=1, ensure_ascii=False, sort_keys=True)
+                fh.write("\n")
+            print(f"wrote {EXPECTED_PATH}")
+        else:
+            with open(EXPECTED_PATH, encoding="utf-8") as fh:
+                problems = check_outputs(outputs, json.load(fh))
+            if problems:
+                print("outputs differ from the expected ones:", file=sys.stderr)
+                for problem in problems:
+                    print("  " + problem, file=sys.stderr)
+                return 1
+
+        baseline = None
+        if args.compare:
+            with open(args.compare, encoding="utf-8") as fh:
+                baseline = json.load(fh)["timings"]
+        timings = run_timings(converter, args.stage, args.repeat, args.min_time)
+
+    regressions = print_report(timings, baseline, args.threshold)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "python": sys.version.split()[0],
+                    "machine": platform.machine(),
+                    "timings": timings,
+                },
+                fh,
+                indent=1,
+            )
+        print(f"baseline saved to {args.save_baseline}")
+    if regressions:
+        print(f"slower than baseline: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
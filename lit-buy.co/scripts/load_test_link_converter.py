@@ -0,0 +1,264 @@
+"""
+Load test for LinkConverter's network paths against the local mock upstream
+(see mock_upstream.py): drives convert_link from many workers and reports
+throughput and latency percentiles, overall and per kind of input.
+
+    python scripts/load_test_link_converter.py --requests 2000 --concurrency 64
+    python scripts/load_test_link_converter.py --async --latency-dist exponential \\
+        --error-rate 0.02 --budget-ms 1500
+
+The inputs mix short links behind 3xx chains, short links landing on meta
+refresh and JavaScript redirect pages, large agent pages that need an HTML
+probe, and dead links. Every input carries a unique product id, so no
+answer comes from a cache and each one costs real (local) round trips.
+The converter keeps its DEFAULT_HOST_LIMITS, so api-heavy runs
+(--resolvers api) also measure the redirect-checker rate limit.
+
+By default the mock server runs in this process and competes with the
+converter for the GIL; for high concurrency start mock_upstream.py
+separately and pass --upstream.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from link_converter import AsyncLinkConverter, LinkConverter  # noqa: E402
+from mock_upstream import (  # noqa: E402
+    AsyncUpstreamTransport,
+    MockUpstream,
+    UpstreamTransport,
+    add_profile_arguments,
+    profile_from_args,
+)
+
+# kind -> URL template; {hops} and {id} are filled per request
+INPUT_KINDS: Dict[str, str] = {
+    "redirect_chain": "https://sl.kakobuy.com/r/{hops}/{id}",
+    "meta_refresh": "https://bit.ly/m/{id}",
+    "js_redirect": "https://tinyurl.com/j/{id}",
+    "agent_page": "https://shop.agent-mock.test/p/{id}",
+    "dead_link": "https://is.gd/gone/{id}",
+}
+DEFAULT_MIX = "redirect_chain=5,meta_refresh=2,js_redirect=1,agent_page=3,dead_link=1"
+
+Sample = Tuple[str, float, bool, bool]  # kind, seconds, isValid with id, timedOut
+
+
+def parse_mix(spec: str) -> List[Tuple[str, int]]:
+    mix = []
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in INPUT_KINDS:
+            raise argparse.ArgumentTypeError(f"unknown input kind: {kind}")
+        mix.append((kind, int(weight or 1)))
+    return mix
+
+
+def build_inputs(count: int, mix: List[Tuple[str, int]], hops: int) -> List[Tuple[str, str]]:
+    """`count` (kind, url) pairs, kinds interleaved by weight."""
+    cycle = [kind for kind, weight in mix for _ in range(weight)]
+    inputs = []
+    for i in range(count):
+        kind = cycle[i % len(cycle)]
+        inputs.append((kind, INPUT_KINDS[kind].format(hops=hops, id=7_000_000_000 + i)))
+    return inputs
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _summary(seconds: List[float]) -> Dict[str, float]:
+    ordered = sorted(seconds)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000 if ordered else 0.0,
+        "p50_ms": percentile(ordered, 50) * 1000,
+        "p90_ms": percentile(ordered, 90) * 1000,
+        "p99_ms": percentile(ordered, 99) * 1000,
+        "max_ms": (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+def run_sync(
+    converter: LinkConverter,
+    inputs: List[Tuple[str, str]],
+    concurrency: int,
+) -> List[Sample]:
+    def one(item: Tuple[str, str]) -> Sample:
+        kind, url = item
+        started = time.perf_counter()
+        result = converter.convert_link(url)
+        elapsed = time.perf_counter() - started
+        return kind, elapsed, bool(result.get("productId")), bool(result.get("timedOut"))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, inputs))
+
+
+async def run_async(
+    converter: AsyncLinkConverter,
+    client: httpx.AsyncClient,
+    inputs: List[Tuple[str, str]],
+    concurrency: int,
+) -> List[Sample]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(item: Tuple[str, str]) -> Sample:
+        kind, url = item
+        async with semaphore:
+            started = time.perf_counter()
+            result = await converter.convert_link(url)
+            elapsed = time.perf_counter() - started
+        return kind, elapsed, bool(result.get("productId")), bool(result.get("timedOut"))
+
+    async with client, converter:
+        return list(await asyncio.gather(*(one(item) for item in inputs)))
+
+
+def report(samples: List[Sample], wall: float) -> Dict[str, object]:
+    by_kind: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        by_kind.setdefault(sample[0], []).append(sample)
+    return {
+        "requests": len(samples),
+        "seconds": wall,
+        "throughput_per_s": len(samples) / wall if wall else 0.0,
+        "resolved": sum(s[2] for s in samples),
+        "timed_out": sum(s[3] for s in samples),
+        "latency": _summary([s[1] for s in samples]),
+        "by_kind": {
+            kind: dict(_summary([s[1] for s in group]), resolved=sum(s[2] for s in group))
+            for kind, group in by_kind.items()
+        },
+    }
+
+
+def print_report(result: Dict[str, object]) -> None:
+    latency = result["latency"]
+    print(
+        f"{result['requests']} conversions in {result['seconds']:.2f}s "
+        f"({result['throughput_per_s']:.1f}/s), {result['resolved']} with a product id, "
+        f"{result['timed_out']} timed out"
+    )
+    print(
+        f"{'kind':16} {'count':>6} {'resolved':>8} "
+        f"{'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+    )
+    rows = [("all", dict(latency, resolved=result["resolved"]))]  # type: ignore[arg-type]
+    rows += sorted(result["by_kind"].items())  # type: ignore[union-attr]
+    for kind, s in rows:
+        print(
+            f"{kind:16} {s['count']:6d} {s['resolved']:8d} {s['p50_ms']:8.1f} "
+            f"{s['p90_ms']:8.1f} {s['p99_ms']:8.1f} {s['max_ms']:8.1f}"
+        )
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python scripts/load_test_link_converter.py",
+        description="Drive convert_link against the local mock upstream.",
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix(DEFAULT_MIX),
+        help=f"input kinds and weights (default {DEFAULT_MIX})",
+    )
+    parser.add_argument("--hops", type=int, default=3, help="3xx hops per redirect chain")
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="use AsyncLinkConverter instead of threads",
+    )
+    parser.add_argument("--budget-ms", type=float, default=None)
+    parser.add_argument(
+        "--resolvers",
+        default=None,
+        help="comma-separated short-link resolver chain, e.g. api",
+    )
+    parser.add_argument("--hedge", action="store_true")
+    parser.add_argument(
+        "--per-host", type=int, default=10, help="converter's max_connections_per_host"
+    )
+    parser.add_argument(
+        "--upstream",
+        default=None,
+        help="base URL of an already running mock_upstream.py instead of starting one",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    inputs = build_inputs(args.requests, args.mix, args.hops)
+    limits = httpx.Limits(
+        max_connections=max(100, args.concurrency * 2),
+        max_keepalive_connections=args.concurrency,
+    )
+    options = dict(
+        budget_ms=args.budget_ms,
+        resolvers=args.resolvers.split(",") if args.resolvers else None,
+        hedge=args.hedge,
+        max_connections_per_host=args.per_host,
+    )
+
+    upstream = None
+    if args.upstream is None:
+        upstream = MockUpstream(profile_from_args(args)).start()
+    base_url = args.upstream or upstream.url  # type: ignore[union-attr]
+    try:
+        started = time.perf_counter()
+        if args.use_async:
+            async_client = httpx.AsyncClient(
+                transport=AsyncUpstreamTransport(base_url, limits=limits)
+            )
+            async_converter = AsyncLinkConverter(async_client, **options)
+            samples = asyncio.run(
+                run_async(async_converter, async_client, inputs, args.concurrency)
+            )
+            converter: LinkConverter = async_converter
+        else:
+            with httpx.Client(
+                transport=UpstreamTransport(base_url, limits=limits)
+            ) as client, LinkConverter(client, **options) as converter:
+                samples = run_sync(converter, inputs, args.concurrency)
+        result = report(samples, time.perf_counter() - started)
+    finally:
+        if upstream is not None:
+            upstream.stop()
+
+    result["resolver_stats"] = converter.resolver_stats()
+    if upstream is not None:
+        result["upstream_requests"] = dict(sorted(upstream.counts.items()))
+    if args.json:
+        print(json.dumps(result, indent=1))
+    else:
+        print_report(result)
+        print("resolvers:", json.dumps(result["resolver_stats"]))
+        if upstream is not None:
+            print("upstream requests:", json.dumps(result["upstream_requests"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""
+Local stand-in for the hosts LinkConverter talks to, for exercising its
+network paths (short-link resolution, HTML probing, manual redirect walks)
+without touching the internet.
+
+The server ignores which host a request was meant for except for the
+redirect-checker API; everything else is routed by path:
+
+    /r/<hops>/<id>   <hops> 302s on the same host, then a 301 to
+                     https://item.taobao.com/item.htm?id=<id>
+    /m/<id>          200 page with a meta refresh to the weidian item
+    /j/<id>          200 page with a JavaScript redirect to the 1688 offer
+    /p/<id>          large agent product page (--page-kb) with the weidian
+                     item URL, encoded and plain, near the end
+    /gone/<id>       404
+    anything else    small 200 page
+
+    api.redirect-checker.net/?url=<target>
+                     the redirect-checker JSON for <target>'s chain above
+
+Every request first waits a latency drawn from --latency-dist around
+--latency-ms; --error-rate of them then get a 503 and --stall-rate hang for
+--stall-ms (to trip client timeouts).
+
+Point a converter at it with UpstreamTransport, which sends every request
+to the server while keeping the original URL and Host header:
+
+    client = httpx.Client(transport=UpstreamTransport(server.url))
+    converter = LinkConverter(client=client)
+
+Run standalone with `python scripts/mock_upstream.py --port 8765`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+import httpx
+
+REDIRECT_CHECKER_HOST = "api.redirect-checker.net"
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+Response = Tuple[int, Dict[str, str], bytes]
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once
+    request_queue_size = 256
+
+    def handle_error(self, request: object, client_address: object) -> None:
+        # Clients hanging up mid-request (probes that have their answer,
+        # cancelled hedges, timeouts) are routine here, not worth a traceback
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+        super().handle_error(request, client_address)  # type: ignore[arg-type]
+
+
+class UpstreamProfile:
+    """Latency and failure injection shared by all handler threads."""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        latency_dist: str = "fixed",
+        error_rate: float = 0.0,
+        stall_rate: float = 0.0,
+        stall_ms: float = 10_000.0,
+        page_kb: int = 256,
+        seed: Optional[int] = None,
+    ) -> None:
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"unknown latency distribution: {latency_dist}")
+        self.latency_ms = latency_ms
+        self.latency_dist = latency_dist
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_ms = stall_ms
+        self.page_kb = page_kb
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def latency(self) -> float:
+        """Seconds to wait before answering; latency_ms is the median."""
+        median = self.latency_ms / 1000
+        if median <= 0:
+            return 0.0
+        with self._lock:
+            if self.latency_dist == "uniform":
+                return self._random.uniform(0, 2 * median)
+            if self.latency_dist == "exponential":
+                return self._random.expovariate(math.log(2) / median)
+            if self.latency_dist == "lognormal":
+                return self._random.lognormvariate(math.log(median), 0.75)
+        return median
+
+    def fault(self) -> Optional[str]:
+        """"error", "stall" or None for this request."""
+        with self._lock:
+            roll = self._random.random()
+        if roll < self.error_rate:
+            return "error"
+        if roll < self.error_rate + self.stall_rate:
+            return "stall"
+        return None
+
+
+def _html(head: str, body: str = "") -> bytes:
+    return f"<!doctype html><html><head>{head}</head><body>{body}</body></html>".encode()
+
+
+def _agent_page(product_id: str, size_kb: int) -> bytes:
+    item = f"https://weidian.com/item.html?itemID={product_id}"
+    encoded = item.replace(":", "%3A").replace("/", "%2F").replace("?", "%3F").replace("=", "%3D")
+    card = (
+        '<div class="card"><img src="/static/img/placeholder.webp" alt="">'
+        '<span class="price">¥ 129.00</span><a href="/p/related">related item</a></div>\n'
+    )
+    filler = card * max(0, (size_kb * 1024) // len(card))
+    return (
+        "<!doctype html><html><head><title>Product</title></head><body>\n"
+        f"{filler}"
+        f'<div id="product" data-source="{encoded}"></div>\n'
+        f'<script>window.__ITEM__ = {{"sourceUrl": "{item}"}};</script>\n'
+        "</body></html>"
+    ).encode()
+
+
+class MockUpstream:
+    """
+    The server on a background thread. Use as a context manager or call
+    start()/stop(); `url` is its base URL and `counts` the requests served
+    per route (plus injected "error"/"stall").
+    """
+
+    def __init__(
+        self,
+        profile: Optional[UpstreamProfile] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.profile = profile or UpstreamProfile()
+        self.counts: Dict[str, int] = {}
+        self._counts_lock = threading.Lock()
+        self._pages: Dict[str, bytes] = {}
+        self._server = _Server((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockUpstream":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="mock-upstream", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "MockUpstream":
+        return self.start()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.stop()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def _count(self, route: str) -> None:
+        with self._counts_lock:
+            self.counts[route] = self.counts.get(route, 0) + 1
+
+    # Routing; pure, so the redirect-checker emulation can replay it
+    def route(self, host: str, path: str) -> Tuple[str, Response]:
+        parts = path.split("?", 1)[0].strip("/").split("/")
+        kind, args = parts[0], parts[1:]
+        if kind == "r" and len(args) == 2 and args[0].isdigit():
+            hops = int(args[0])
+            location = (
+                f"https://{host}/r/{hops - 1}/{args[1]}"
+                if hops > 0
+                else f"https://item.taobao.com/item.htm?id={args[1]}"
+            )
+            return "redirect", (302 if hops > 0 else 301, {"Location": location}, b"")
+        if kind == "m" and args:
+            target = f"https://weidian.com/item.html?itemID={args[0]}"
+            body = _html(f'<meta http-equiv="refresh" content="0; url={target}">')
+            return "meta_refresh", (200, {"Content-Type": "text/html"}, body)
+        if kind == "j" and args:
+            target = f"https://detail.1688.com/offer/{args[0]}.html"
+            body = _html("", f"<script>window.location.href = '{target}';</script>")
+            return "js_redirect", (200, {"Content-Type": "text/html"}, body)
+        if kind == "p" and args:
+            return "agent_page", (200, {"Content-Type": "text/html"}, self._agent_page(args[0]))
+        if kind == "gone":
+            body = _html("<title>Not found</title>")
+            return "not_found", (404, {"Content-Type": "text/html"}, body)
+        return "page", (200, {"Content-Type": "text/html"}, _html("<title>ok</title>"))
+
+    def _agent_page(self, product_id: str) -> bytes:
+        page = self._pages.get(product_id)
+        if page is None:
+            page = _agent_page(product_id, self.profile.page_kb)
+            if len(self._pages) < 4096:
+                self._pages[product_id] = page
+        return page
+
+    def redirect_checker(self, target: str) -> Response:
+        """redirect-checker.net's JSON for the chain starting at `target`."""
+        if "://" not in target:
+            target = unquote(target)
+        steps: List[Dict[str, object]] = []
+        current = target
+        for _ in range(10):
+            url = httpx.URL(current)
+            _, (status, headers, _) = self.route(url.host, url.raw_path.decode())
+            location = headers.get("Location")
+            info: Dict[str, object] = {"url": current, "http_code": status}
+            if location:
+                info["redirect_url"] = location
+            steps.append({"request": {"info": {"url": current}}, "response": {"info": info}})
+            if not location:
+                break
+            current = location
+        body = json.dumps({"data": steps}).encode()
+        return 200, {"Content-Type": "application/json"}, body
+
+    def _handler_class(self) -> type:
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                self._serve(send_body=True)
+
+            def do_HEAD(self) -> None:
+                self._serve(send_body=False)
+
+            def _serve(self, send_body: bool) -> None:
+                profile = upstream.profile
+                time.sleep(profile.latency())
+                fault = profile.fault()
+                host = (self.headers.get("Host") or "").split(":")[0]
+                if fault == "stall":
+                    upstream._count("stall")
+                    time.sleep(profile.stall_ms / 1000)
+                if fault == "error":
+                    upstream._count("error")
+                    status, headers, body = 503, {"Content-Type": "text/plain"}, b"unavailable"
+                elif host == REDIRECT_CHECKER_HOST:
+                    upstream._count("redirect_checker")
+                    query = self.path.split("?", 1)[1] if "?" in self.path else ""
+                    target = query[4:] if query.startswith("url=") else ""
+                    status, headers, body = upstream.redirect_checker(target)
+                else:
+                    route, (status, headers, body) = upstream.route(host, self.path)
+                    upstream._count(route)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if send_body:
+                    try:
+                        self.wfile.write(body)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # Probes hang up once they have their answer
+                        self.close_connection = True
+
+            def log_message(self, format: str, *args: object) -> None:
+                pass
+
+        return Handler
+
+
+def _redirect_to(request: httpx.Request, base: httpx.URL) -> httpx.URL:
+    return request.url.copy_with(scheme=base.scheme, host=base.host, port=base.port)
+
+
+class UpstreamTransport(httpx.HTTPTransport):
+    """
+    Sends every request to the mock server instead of the host in its URL.
+    The Host header still names the original host, and the response keeps
+    the original URL, so the converter sees the URLs it asked for.
+    """
+
+    def __init__(self, base_url: str, **kwargs: object) -> None:
+        super().__init__(**kwargs)  # type: ignore[arg-type]
+        self._base = httpx.URL(base_url)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        original = request.url
+        request.url = _redirect_to(request, self._base)
+        try:
+            return super().handle_request(request)
+        finally:
+            request.url = original
+
+
+class AsyncUpstreamTransport(httpx.AsyncHTTPTransport):
+    """Async counterpart of UpstreamTransport."""
+
+    def __init__(self, base_url: str, **kwargs: object) -> None:
+        super().__init__(**kwargs)  # type: ignore[arg-type]
+        self._base = httpx.URL(base_url)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        original = request.url
+        request.url = _redirect_to(request, self._base)
+        try:
+            return await super().handle_async_request(request)
+        finally:
+            request.url = original
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="median latency per request")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with 503")
+    parser.add_argument(
+        "--stall-rate", type=float, default=0.0, help="fraction that hang for --stall-ms"
+    )
+    parser.add_argument("--stall-ms", type=float, default=10_000.0)
+    parser.add_argument("--page-kb", type=int, default=256, help="size of /p/ agent pages")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def profile_from_args(args: argparse.Namespace) -> UpstreamProfile:
+    return UpstreamProfile(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        error_rate=args.error_rate,
+        stall_rate=args.stall_rate,
+        stall_ms=args.stall_ms,
+        page_kb=args.page_kb,
+        seed=args.seed,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python scripts/mock_upstream.py",
+        description="Serve the mock upstream hosts until interrupted.",
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_profile_arguments(parser)
+    args = parser.parse_args(argv)
+
+    upstream = MockUpstream(profile_from_args(args), args.host, args.port)
+    print(f"mock upstream on {upstream.url}")
+    try:
+        upstream.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        upstream.stop()
+        print(json.dumps(upstream.counts, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,100 @@
+"""
+The tests exercise the canonical copy of link_converter.py (see
+tools/sync_link_converter.py) against httpx.MockTransport handlers, so no
+request leaves the process.
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import types
+from typing import Any, Callable, Iterator, Tuple
+
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "acbuy-spreadsheet.xyz"))
+sys.path.insert(0, os.path.join(ROOT, "tools"))
+
+
+def _install_marketplace_stub() -> None:
+    """Provide `app.marketplace` when the deployment's module is not importable.
+
+    The builders mirror app/lib/link-converter/marketplace.ts.
+    """
+    try:
+        import app.marketplace  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    builders = {
+        "taobao": lambda item_id: f"https://item.taobao.com/item.htm?id={item_id}",
+        "weidian": lambda item_id: f"https://weidian.com/item.html?itemID={item_id}",
+        "1688": lambda item_id: f"https://detail.1688.com/offer/{item_id}.html",
+    }
+    marketplace = types.ModuleType("app.marketplace")
+    marketplace.build_taobao_url = builders["taobao"]
+    marketplace.build_weidian_url = builders["weidian"]
+    marketplace.build_1688_url = builders["1688"]
+    marketplace.build_marketplace_url = lambda mp, item_id: builders.get(
+        mp, builders["taobao"]
+    )(item_id)
+    package = sys.modules.get("app") or types.ModuleType("app")
+    package.__path__ = getattr(package, "__path__", [])
+    package.marketplace = marketplace
+    sys.modules["app"] = package
+    sys.modules["app.marketplace"] = marketplace
+
+
+_install_marketplace_stub()
+
+import link_converter  # noqa: E402
+
+TAOBAO_ITEM = "https://item.taobao.com/item.htm?id=652874123456"
+WEIDIAN_ITEM = "https://weidian.com/item.html?itemID=7573302426"
+
+
+class FakeClock:
+    """Settable clock for the caches and breakers that take a `clock`."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def redirect_checker_json(target: str) -> dict:
+    """The redirect-checker API's answer for a chain ending at `target`."""
+    return {"data": [{"response": {"info": {"redirect_url": target}}}]}
+
+
+@pytest.fixture
+def make_converter() -> Iterator[Callable[..., link_converter.LinkConverter]]:
+    """LinkConverter factory over a MockTransport handler; closed after the test."""
+    converters = []
+
+    def make(
+        handler: Callable[[httpx.Request], httpx.Response], **options: Any
+    ) -> link_converter.LinkConverter:
+        client = httpx.Client(transport=httpx.MockTransport(handler))
+        converter = link_converter.LinkConverter(client, **options)
+        converters.append((client, converter))
+        return converter
+
+    yield make
+    for client, converter in converters:
+        converter.close()
+        client.close()
+
+
+def async_converter(
+    handler: Callable[..., Any], **options: Any
+) -> Tuple[httpx.AsyncClient, link_converter.AsyncLinkConverter]:
+    """(client, converter) over an async MockTransport handler, for
+    `async with client, converter`."""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client, link_converter.AsyncLinkConverter(client, **options)
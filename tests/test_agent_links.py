@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import link_converter
+from link_converter import DEFAULT_AFFCODES, LinkConverter
+
+KAKOBUY_ITEM = (
+    "https://www.kakobuy.com/item/details?url="
+    "https%3A%2F%2Fitem.taobao.com%2Fitem.htm%3Fid%3D123"
+)
+
+
+def test_links_carry_the_default_affiliate_code():
+    converter = LinkConverter()
+    assert converter.build_agent_link("KakoBuy", "taobao", "123") == (
+        f"{KAKOBUY_ITEM}&affcode={DEFAULT_AFFCODES['kakobuy']}"
+    )
+    assert converter.build_agent_link("nosuchagent", "taobao", "123") is None
+
+
+def test_changes_to_default_affcodes_apply_at_once(monkeypatch):
+    converter = LinkConverter()
+    converter.build_agent_link("kakobuy", "taobao", "123")
+    monkeypatch.setitem(link_converter.DEFAULT_AFFCODES, "kakobuy", "changed")
+
+    assert converter.build_agent_link("kakobuy", "taobao", "123") == (
+        f"{KAKOBUY_ITEM}&affcode=changed"
+    )
+    assert converter.build_all_agent_links("taobao", "123")["kakobuy"] == (
+        f"{KAKOBUY_ITEM}&affcode=changed"
+    )
+
+
+def test_affcodes_replace_the_defaults_for_one_call():
+    converter = LinkConverter()
+    affcodes = {"kakobuy": "a b", "cssbuy": ""}
+
+    link = converter.build_agent_link("kakobuy", "taobao", "123", affcodes=affcodes)
+    assert link == f"{KAKOBUY_ITEM}&affcode=a+b"
+    links = converter.build_all_agent_links("taobao", "123", affcodes=affcodes)
+    assert sorted(links) == ["cssbuy", "kakobuy"]
+    columns = converter.build_agent_link_columns(
+        ["taobao"], ["123"], affcodes=affcodes
+    )
+    assert columns == {agent: [link] for agent, link in links.items()}
+    # The defaults are untouched
+    assert converter.build_agent_link("kakobuy", "taobao", "123") == (
+        f"{KAKOBUY_ITEM}&affcode={DEFAULT_AFFCODES['kakobuy']}"
+    )
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import httpx
+
+from conftest import FakeClock, TAOBAO_ITEM, redirect_checker_json
+from link_converter import CircuitBreaker
+
+SHORT_LINK = "https://bit.ly/3xYzAbc"
+
+
+def test_breaker_opens_after_consecutive_failures_and_half_opens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        failure_threshold=3, slow_call=1.0, reset_timeout=10, clock=clock
+    )
+    breaker.record_response(503, 0.1)
+    breaker.record_response(200, 0.1)  # a success resets the count
+    breaker.record_response(429, 0.1)
+    breaker.record_response(200, 2.0)  # too slow: a failure
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now += 10
+    assert breaker.allow()  # the single trial call
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock.now += 10
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.stats() == {"state": "closed", "opened": 1, "rejected": 2}
+
+
+def test_open_circuit_skips_the_host(make_converter):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.host)
+        return httpx.Response(503)
+
+    converter = make_converter(handler, resolvers=["html"])
+    for i in range(converter.breaker_failure_threshold + 3):
+        converter.resolve_short_link_via_api(f"https://bit.ly/a{i}")
+
+    assert calls.count("bit.ly") == converter.breaker_failure_threshold
+    assert converter.host_stats()["bit.ly"]["circuit"]["state"] == "open"
+
+
+def test_miss_behind_another_hosts_open_circuit_is_not_cached(make_converter):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "api.redirect-checker.net":
+            return httpx.Response(200, json=redirect_checker_json(TAOBAO_ITEM))
+        return httpx.Response(200, text="<html>nothing here</html>")
+
+    converter = make_converter(handler)
+    api = converter._host_gate("api.redirect-checker.net").breaker
+    for _ in range(converter.breaker_failure_threshold):
+        api.record_failure()
+
+    assert converter.resolve_short_link_via_api(SHORT_LINK) == SHORT_LINK
+    api.record_success()
+    assert converter.resolve_short_link_via_api(SHORT_LINK) == TAOBAO_ITEM
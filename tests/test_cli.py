@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import link_converter
+
+# Canonical item URLs convert offline, so the CLI never opens a connection
+LINKS = [f"https://item.taobao.com/item.htm?id={100000000 + i}" for i in range(5)]
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Input, output and checkpoint paths plus the argv converting between them."""
+    paths = SimpleNamespace(
+        source=tmp_path / "in.txt",
+        output=tmp_path / "out.jsonl",
+        checkpoint=tmp_path / "ck.json",
+    )
+    paths.source.write_text("\n".join(LINKS) + "\n")
+    paths.argv = [
+        str(paths.source),
+        "-o",
+        str(paths.output),
+        "--batch-size",
+        "2",
+        "--checkpoint",
+        str(paths.checkpoint),
+    ]
+    return paths
+
+
+def test_converts_in_batches_and_checkpoints(run):
+    assert link_converter.main(run.argv) == 0
+
+    records = [json.loads(line) for line in run.output.read_text().splitlines()]
+    assert [record["productId"] for record in records] == [
+        url.rsplit("=", 1)[1] for url in LINKS
+    ]
+    assert [record["record"] for record in records] == [1, 2, 3, 4, 5]
+    assert [record["input"] for record in records] == LINKS
+    assert json.loads(run.checkpoint.read_text()) == {
+        "records": 5,
+        "offset": run.output.stat().st_size,
+    }
+
+
+def test_resume_drops_lines_written_after_the_checkpoint(run):
+    assert link_converter.main(run.argv) == 0
+    expected = run.output.read_text()
+
+    # A run that died mid-batch: two records checkpointed, a third written
+    lines = expected.splitlines(keepends=True)
+    run.output.write_text("".join(lines[:3]))
+    offset = len("".join(lines[:2]).encode())
+    run.checkpoint.write_text(json.dumps({"records": 2, "offset": offset}))
+
+    assert link_converter.main(run.argv) == 0
+    assert run.output.read_text() == expected
+
+
+def test_resume_from_a_checkpoint_without_offset(run):
+    assert link_converter.main(run.argv) == 0
+    expected = run.output.read_text()
+    lines = expected.splitlines(keepends=True)
+    run.output.write_text("".join(lines[:2]))
+    run.checkpoint.write_text(json.dumps({"records": 2}))
+
+    assert link_converter.main(run.argv) == 0
+    assert run.output.read_text() == expected
+
+
+def test_output_records_point_back_at_the_input(run):
+    # Blank lines are not records, so numbering matches the checkpoint
+    run.source.write_text(f"{LINKS[0]}\n\n  {LINKS[1]}\nnot a link\n")
+    assert link_converter.main(run.argv) == 0
+
+    records = [json.loads(line) for line in run.output.read_text().splitlines()]
+    assert [(record["record"], record["input"]) for record in records] == [
+        (1, LINKS[0]),
+        (2, LINKS[1]),
+        (3, "not a link"),
+    ]
+    assert records[2]["isValid"] is False
+
+
+def test_malformed_csv_exits_with_status_2(tmp_path, capsys):
+    source = tmp_path / "in.csv"
+    source.write_text('url\n"' + "a" * 200_000 + '"\n')
+
+    assert link_converter.main([str(source), "-o", str(tmp_path / "out.jsonl")]) == 2
+    assert "field larger than field limit" in capsys.readouterr().err
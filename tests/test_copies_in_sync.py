@@ -0,0 +1,11 @@
+from __future__ import annotations
+
+import sync_link_converter
+
+
+def test_every_site_ships_the_canonical_copy():
+    assert len(sync_link_converter.site_dirs()) > 1
+    assert sync_link_converter.drifted() == [], (
+        "run `python tools/sync_link_converter.py` after editing "
+        f"{sync_link_converter.CANONICAL_SITE}"
+    )
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+
+from conftest import WEIDIAN_ITEM, async_converter
+from link_converter import Deadline
+
+# Non-product page on no known host: needs the HTML probe and a redirect walk
+AGENT_PAGE = "https://agent.example.com/p/some/long/path?x=1"
+SHORT_LINK = "https://bit.ly/abc"
+
+
+def trickle(seconds: float = 2.0):
+    for _ in range(int(seconds / 0.1)):
+        time.sleep(0.1)
+        yield b"x"
+
+
+async def atrickle(seconds: float = 2.0):
+    for _ in range(int(seconds / 0.1)):
+        await asyncio.sleep(0.1)
+        yield b"x"
+
+
+def trickling_handler(request: httpx.Request) -> httpx.Response:
+    if request.method == "HEAD":
+        return httpx.Response(200)
+    return httpx.Response(
+        200, content=trickle(), headers={"content-type": "text/html"}
+    )
+
+
+async def async_trickling_handler(request: httpx.Request) -> httpx.Response:
+    if request.method == "HEAD":
+        return httpx.Response(200)
+    return httpx.Response(
+        200, content=atrickle(), headers={"content-type": "text/html"}
+    )
+
+
+def test_deadline_counts_down():
+    deadline = Deadline(50)
+    assert 0 < deadline.remaining() <= 0.05
+    assert not deadline.expired
+    time.sleep(0.06)
+    assert deadline.remaining() == 0.0
+    assert deadline.expired
+
+
+def test_budget_bounds_a_trickling_response(make_converter):
+    # httpx's read timeout never fires on a byte every 100 ms
+    converter = make_converter(trickling_handler)
+    for url in (SHORT_LINK, AGENT_PAGE):
+        started = time.monotonic()
+        result = converter.convert_link(url, budget_ms=300)
+        assert time.monotonic() - started < 0.6
+        assert result["timedOut"] is True
+
+
+def test_async_budget_bounds_a_trickling_response():
+    async def main():
+        client, converter = async_converter(async_trickling_handler)
+        async with client, converter:
+            for url in (SHORT_LINK, AGENT_PAGE):
+                started = time.monotonic()
+                result = await converter.convert_link(url, budget_ms=300)
+                assert time.monotonic() - started < 0.6
+                assert result["timedOut"] is True
+
+    asyncio.run(main())
+
+
+def test_timed_out_conversion_does_not_poison_later_ones(make_converter):
+    slow = {"on": True}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "bit.ly":
+            if slow["on"]:
+                time.sleep(0.2)
+            return httpx.Response(302, headers={"location": WEIDIAN_ITEM})
+        return httpx.Response(200)
+
+    converter = make_converter(handler)
+    assert converter.convert_link(SHORT_LINK, budget_ms=50)["timedOut"] is True
+    slow["on"] = False
+    assert converter.convert_link(SHORT_LINK)["productId"] == "7573302426"
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+
+from conftest import TAOBAO_ITEM, redirect_checker_json
+from link_converter import AsyncLinkConverter, LinkConverter
+
+SHORT_LINK = "https://bit.ly/3xYzAbc"
+
+
+class HedgingConverter(LinkConverter):
+    hedge_max_ratio = 1.0
+    hedge_default_delay = 0.05
+
+
+class AsyncHedgingConverter(AsyncLinkConverter):
+    hedge_max_ratio = 1.0
+    hedge_default_delay = 0.05
+
+
+def slow_primary(request: httpx.Request) -> httpx.Response:
+    if request.url.host == "api.redirect-checker.net":
+        return httpx.Response(200, json=redirect_checker_json(TAOBAO_ITEM))
+    time.sleep(0.5)
+    return httpx.Response(302, headers={"location": TAOBAO_ITEM})
+
+
+async def async_slow_primary(request: httpx.Request) -> httpx.Response:
+    if request.url.host == "api.redirect-checker.net":
+        return httpx.Response(200, json=redirect_checker_json(TAOBAO_ITEM))
+    await asyncio.sleep(0.5)
+    return httpx.Response(302, headers={"location": TAOBAO_ITEM})
+
+
+def test_hedge_answers_for_a_slow_primary():
+    with httpx.Client(transport=httpx.MockTransport(slow_primary)) as client:
+        with HedgingConverter(client, resolvers=["redirects"], hedge=True) as converter:
+            started = time.monotonic()
+            assert converter.resolve_short_link_via_api(SHORT_LINK) == TAOBAO_ITEM
+            assert time.monotonic() - started < 0.4
+            stats = converter.hedge_stats()
+
+    assert stats["primaries"] == 1
+    assert stats["hedged"] == 1
+    assert stats["hedge_wins"] == 1
+
+
+def test_hedges_stay_under_the_extra_load_cap():
+    with httpx.Client(transport=httpx.MockTransport(slow_primary)) as client:
+        with LinkConverter(client, resolvers=["redirects"], hedge=True) as converter:
+            converter._hedger.default_delay = 0.05
+            converter.resolve_short_link_via_api(SHORT_LINK)
+            stats = converter.hedge_stats()
+
+    # hedge_max_ratio 0.1: the first attempt alone cannot be hedged
+    assert stats["primaries"] == 1
+    assert stats["hedged"] == 0
+
+
+def test_cancelled_async_primary_is_not_sampled():
+    async def main():
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(async_slow_primary)
+        ) as client, AsyncHedgingConverter(
+            client, resolvers=["redirects"], hedge=True
+        ) as converter:
+            for i in range(3):
+                url = f"{SHORT_LINK}{i}"
+                assert await converter.resolve_short_link_via_api(url) == TAOBAO_ITEM
+            await asyncio.sleep(0)
+            return converter
+
+    converter = asyncio.run(main())
+    assert converter.hedge_stats()["hedge_wins"] == 3
+    # Each primary lost and was cancelled; none of them reached the p95
+    assert len(converter._hedger._samples) == 0
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import threading
+import time
+
+import httpx
+
+from conftest import FakeClock
+from link_converter import HostLimit, _TokenBucket
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    clock = FakeClock()
+    bucket = _TokenBucket(rate=10.0, capacity=2, clock=clock)
+
+    assert bucket.take() == 0.0
+    assert bucket.take() == 0.0
+    assert abs(bucket.take() - 0.1) < 1e-9
+    assert abs(bucket.take() - 0.2) < 1e-9  # reservations queue up
+
+    clock.now += 1.0
+    assert bucket.take() == 0.0
+
+
+def test_requests_to_one_host_are_capped(make_converter):
+    lock = threading.Lock()
+    in_flight, peak = [0], [0]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return httpx.Response(200)
+
+    converter = make_converter(
+        handler, host_limits={"slow.example.com": HostLimit(max_concurrency=2)}
+    )
+    threads = [
+        threading.Thread(
+            target=converter.follow_redirects_manually,
+            args=(f"https://slow.example.com/{i}",),
+        )
+        for i in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert peak[0] == 2
+    assert converter.host_stats()["slow.example.com"]["requests"] == 6
+
+
+def test_rate_limit_applies_to_subdomains(make_converter):
+    converter = make_converter(
+        lambda request: httpx.Response(200),
+        host_limits={"example.com": HostLimit(rate=20.0, burst=1)},
+    )
+    started = time.monotonic()
+    for i in range(4):
+        converter.follow_redirects_manually(f"https://a.example.com/{i}")
+
+    assert time.monotonic() - started >= 0.14
+    assert converter.host_stats()["a.example.com"]["delayed"] == 3
+
+
+def test_host_gates_are_bounded(make_converter):
+    converter = make_converter(lambda request: httpx.Response(200))
+    converter.max_host_gates = 3
+    for host in ["a", "b", "c", "a", "d", "e"]:
+        converter.follow_redirects_manually(f"https://{host}.example.com/")
+
+    assert sorted(converter.host_stats()) == [
+        "a.example.com",
+        "d.example.com",
+        "e.example.com",
+    ]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import time
+
+import httpx
+
+from conftest import WEIDIAN_ITEM
+from link_converter import Deadline
+
+AGENT_PAGE = "https://agent.example.com/p/some/long/path?x=1"
+ITEM_IN_PAGE = WEIDIAN_ITEM.encode()
+HTML = {"content-type": "text/html"}
+
+
+def chunked_page(chunks: list, body: bytes, size: int = 1000):
+    def handler(request: httpx.Request) -> httpx.Response:
+        def stream():
+            for start in range(0, len(body), size):
+                chunks.append(start)
+                yield body[start : start + size]
+
+        return httpx.Response(200, content=stream(), headers=HTML)
+
+    return handler
+
+
+def test_probe_finds_the_link_across_chunk_boundaries(make_converter):
+    # The URL straddles two 1000-byte chunks
+    body = b"<html>" + b"x" * 994 + b" " + ITEM_IN_PAGE + b" " + b"y" * 5000
+    chunks: list = []
+    converter = make_converter(chunked_page(chunks, body))
+    converter.probe_chunk_size = 1000
+
+    assert converter.convert_link(AGENT_PAGE)["productId"] == "7573302426"
+    assert len(chunks) < 4  # stopped reading once the link was found
+
+
+def test_probe_reads_at_most_probe_max_bytes(make_converter):
+    body = b"<html>" + b"x" * 50_000 + ITEM_IN_PAGE + b"</html>"
+    chunks: list = []
+    converter = make_converter(chunked_page(chunks, body))
+    converter.probe_chunk_size = 1000
+    converter.probe_max_bytes = 10_000
+
+    assert converter.probe_for_raw_url_via_http(AGENT_PAGE) == ""
+    assert len(chunks) <= 12
+
+
+def test_probe_takes_a_marketplace_final_url_without_reading(make_converter):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "agent.example.com":
+            return httpx.Response(302, headers={"location": WEIDIAN_ITEM})
+        return httpx.Response(200, text="<html></html>")
+
+    converter = make_converter(handler)
+    assert converter.probe_for_raw_url_via_http(AGENT_PAGE) == WEIDIAN_ITEM
+
+
+def test_probe_stops_at_the_deadline(make_converter):
+    def trickle():
+        for _ in range(20):
+            time.sleep(0.05)
+            yield b"x" * 100
+
+    converter = make_converter(
+        lambda request: httpx.Response(200, content=trickle(), headers=HTML)
+    )
+    converter.probe_chunk_size = 100
+    started = time.monotonic()
+    probed = converter.probe_for_raw_url_via_http(AGENT_PAGE, deadline=Deadline(200))
+    assert probed == ""
+    assert time.monotonic() - started < 0.5
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+
+from conftest import TAOBAO_ITEM, async_converter
+
+START = "https://nohead.example.com/start"
+
+
+def head_rejecting_host(calls: list, status: int = 405):
+    """nohead.example.com answers HEAD with `status` and redirects GETs."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.host))
+        if request.url.host == "nohead.example.com":
+            if request.method == "HEAD":
+                return httpx.Response(status)
+            return httpx.Response(302, headers={"location": TAOBAO_ITEM})
+        return httpx.Response(200)
+
+    return handler
+
+
+def test_redirects_are_walked_with_head(make_converter):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.host))
+        if request.url.host == "bit.ly":
+            return httpx.Response(301, headers={"location": TAOBAO_ITEM})
+        return httpx.Response(200)
+
+    converter = make_converter(handler)
+    hops = converter.trace_redirects("https://bit.ly/abc")
+
+    assert [hop["location"] for hop in hops] == [TAOBAO_ITEM, None]
+    assert [hop["method"] for hop in hops] == ["HEAD", "HEAD"]
+    assert calls == [("HEAD", "bit.ly"), ("HEAD", "item.taobao.com")]
+
+
+def test_head_rejection_falls_back_to_get_and_is_remembered(make_converter):
+    calls = []
+    converter = make_converter(head_rejecting_host(calls))
+
+    assert converter.follow_redirects_manually(START) == TAOBAO_ITEM
+    assert converter.follow_redirects_manually(START + "2") == TAOBAO_ITEM
+    nohead = [method for method, host in calls if host == "nohead.example.com"]
+    assert nohead == ["HEAD", "GET", "GET"]
+
+
+def test_configured_hosts_are_walked_with_get(make_converter):
+    calls = []
+    converter = make_converter(head_rejecting_host(calls))
+    converter.head_rejecting_hosts = frozenset({"nohead.example.com"})
+
+    assert converter.follow_redirects_manually(START) == TAOBAO_ITEM
+    assert ("HEAD", "nohead.example.com") not in calls
+
+
+def test_rejected_head_does_not_count_against_the_breaker(make_converter):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(501 if request.method == "HEAD" else 503)
+
+    converter = make_converter(handler)
+    gate = converter._host_gate("nohead.example.com")
+    for i in range(converter.breaker_failure_threshold - 1):
+        # Forget the verdict so every walk starts with a rejected HEAD
+        gate.rejects_head = False
+        hops = converter.trace_redirects(f"{START}{i}")
+        assert [hop["method"] for hop in hops] == ["GET"]
+
+    # Only the failed GETs count: one short of opening the circuit
+    assert gate.breaker.state == "closed"
+
+
+def test_async_head_rejection_falls_back_to_get():
+    calls = []
+    sync_handler = head_rejecting_host(calls, status=501)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return sync_handler(request)
+
+    async def main():
+        client, converter = async_converter(handler)
+        async with client, converter:
+            return await converter.follow_redirects_manually(START)
+
+    assert asyncio.run(main()) == TAOBAO_ITEM
+    assert calls[:2] == [
+        ("HEAD", "nohead.example.com"),
+        ("GET", "nohead.example.com"),
+    ]
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import httpx
+
+from conftest import FakeClock, TAOBAO_ITEM
+from link_converter import ResolutionCache
+
+SHORT_LINK = "https://m.tb.cn/h.UxYz123"
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = ResolutionCache(ttl=10, negative_ttl=2, clock=clock)
+    cache.set("hit", "https://example.com/a")
+    cache.set("miss", "miss", negative=True)
+
+    clock.now += 3
+    assert cache.get("hit") == "https://example.com/a"
+    assert cache.get("miss") is None  # negative entries expire sooner
+
+    clock.now += 8
+    assert cache.get("hit") is None
+    assert cache.stats() == {"hits": 1, "misses": 2, "evictions": 0, "size": 0}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResolutionCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # "b" is now the oldest
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.evictions == 1
+
+
+def test_zero_entries_disables_caching():
+    cache = ResolutionCache(max_entries=0)
+    cache.set("a", "1")
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_resolution_is_memoized(make_converter):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.host)
+        if request.url.host == "m.tb.cn":
+            return httpx.Response(302, headers={"location": TAOBAO_ITEM})
+        return httpx.Response(200)
+
+    converter = make_converter(handler)
+    assert converter.convert_link(SHORT_LINK)["productId"] == "652874123456"
+    sent = len(calls)
+    assert converter.convert_link(SHORT_LINK + "/")["productId"] == "652874123456"
+    assert len(calls) == sent
+
+
+def test_failed_resolution_is_retried_after_negative_ttl(make_converter):
+    clock = FakeClock()
+    answer = {"location": None}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "m.tb.cn" and answer["location"]:
+            return httpx.Response(302, headers={"location": answer["location"]})
+        return httpx.Response(404)
+
+    converter = make_converter(
+        handler,
+        resolution_cache=ResolutionCache(negative_ttl=60, clock=clock),
+        resolvers=["redirects"],
+    )
+    assert converter.resolve_short_link_via_api(SHORT_LINK) == SHORT_LINK
+
+    answer["location"] = TAOBAO_ITEM
+    assert converter.resolve_short_link_via_api(SHORT_LINK) == SHORT_LINK  # cached miss
+    clock.now += 61
+    assert converter.resolve_short_link_via_api(SHORT_LINK) == TAOBAO_ITEM
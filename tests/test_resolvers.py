@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+from conftest import TAOBAO_ITEM, redirect_checker_json
+
+SHORT_LINK = "https://bit.ly/3xYzAbc"
+API_HOST = "api.redirect-checker.net"
+
+
+def shortener(calls: list, *, redirects: bool = False, meta_refresh: bool = False):
+    """bit.ly answering with a 302 and/or a meta-refresh page, as asked; the
+    redirect-checker API always knows the target."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.host))
+        if request.url.host == API_HOST:
+            return httpx.Response(200, json=redirect_checker_json(TAOBAO_ITEM))
+        if request.url.host != "bit.ly":
+            return httpx.Response(200)
+        if redirects:
+            return httpx.Response(302, headers={"location": TAOBAO_ITEM})
+        if meta_refresh and request.method == "GET":
+            return httpx.Response(
+                200,
+                text=f'<meta http-equiv="refresh" content="0;url={TAOBAO_ITEM}">',
+                headers={"content-type": "text/html"},
+            )
+        return httpx.Response(200)
+
+    return handler
+
+
+def test_local_redirects_answer_before_the_api(make_converter):
+    calls = []
+    converter = make_converter(shortener(calls, redirects=True))
+
+    assert converter.resolve_short_link_via_api(SHORT_LINK) == TAOBAO_ITEM
+    assert all(host != API_HOST for _, host in calls)
+    stats = converter.resolver_stats()
+    assert stats["redirects"]["resolved"] == 1
+    assert stats["html"]["calls"] == stats["api"]["calls"] == 0
+
+
+def test_landing_page_answers_when_there_is_no_redirect(make_converter):
+    calls = []
+    converter = make_converter(shortener(calls, meta_refresh=True))
+
+    assert converter.resolve_short_link_via_api(SHORT_LINK) == TAOBAO_ITEM
+    assert all(host != API_HOST for _, host in calls)
+    stats = converter.resolver_stats()
+    assert stats["redirects"]["calls"] == 1
+    assert stats["redirects"]["resolved"] == 0
+    assert stats["html"]["resolved"] == 1
+
+
+def test_api_is_the_last_resort(make_converter):
+    calls = []
+    converter = make_converter(shortener(calls))
+
+    assert converter.resolve_short_link_via_api(SHORT_LINK) == TAOBAO_ITEM
+    assert calls[-1] == ("GET", API_HOST)
+    assert converter.resolver_stats()["api"]["resolved"] == 1
+
+
+def test_resolvers_reorder_and_trim_the_chain(make_converter):
+    calls = []
+    converter = make_converter(shortener(calls, redirects=True), resolvers=["api"])
+
+    assert converter.resolve_short_link_via_api(SHORT_LINK) == TAOBAO_ITEM
+    assert calls == [("GET", API_HOST)]
+
+
+def test_unknown_resolver_is_rejected(make_converter):
+    with pytest.raises(ValueError, match="unknown short-link resolvers: dns"):
+        make_converter(shortener([]), resolvers=["redirects", "dns"])
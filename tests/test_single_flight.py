@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import httpx
+
+from conftest import TAOBAO_ITEM, async_converter
+from link_converter import _SingleFlight, _Unsettled
+
+SHORT_LINK = "https://m.tb.cn/h.UxYz123"
+
+
+def slow_short_link_handler(calls: list, delay: float):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(str(request.url))
+        if request.url.host == "m.tb.cn":
+            time.sleep(delay)
+            return httpx.Response(302, headers={"location": TAOBAO_ITEM})
+        return httpx.Response(200)
+
+    return handler
+
+
+def test_concurrent_callers_share_one_call():
+    flight = _SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def fn() -> str:
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return "answer"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", fn)))
+    leader.start()
+    started.wait(5)
+    followers = [
+        threading.Thread(target=lambda: results.append(flight.do("k", fn)))
+        for _ in range(3)
+    ]
+    for thread in followers:
+        thread.start()
+    while flight.coalesced < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert results == ["answer"] * 4
+    assert len(runs) == 1
+
+
+def test_unsettled_answer_is_not_shared():
+    flight = _SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    results = {}
+
+    def partial() -> str:
+        started.set()
+        release.wait(5)
+        raise _Unsettled("partial")
+
+    leader = threading.Thread(
+        target=lambda: results.update(leader=flight.do("k", partial))
+    )
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(
+        target=lambda: results.update(follower=flight.do("k", lambda: "complete"))
+    )
+    follower.start()
+    while flight.coalesced < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert results == {"leader": "partial", "follower": "complete"}
+
+
+def test_concurrent_conversions_resolve_a_short_link_once(make_converter):
+    calls = []
+    converter = make_converter(slow_short_link_handler(calls, 0.1))
+    urls = [SHORT_LINK, SHORT_LINK + "/", SHORT_LINK + "#x"] * 3
+    results = converter.convert_many(urls)
+
+    assert {result["productId"] for result in results} == {"652874123456"}
+    assert sum("m.tb.cn" in url for url in calls) == 1
+
+
+def test_follower_retries_when_leader_runs_out_of_budget(make_converter):
+    calls = []
+    converter = make_converter(slow_short_link_handler(calls, 0.3))
+    results = {}
+
+    def convert(name: str, budget_ms) -> None:
+        results[name] = converter.convert_link(SHORT_LINK, budget_ms=budget_ms)
+
+    leader = threading.Thread(target=convert, args=("leader", 50))
+    leader.start()
+    time.sleep(0.02)
+    follower = threading.Thread(target=convert, args=("follower", None))
+    follower.start()
+    leader.join(5)
+    follower.join(5)
+
+    assert results["leader"]["timedOut"] is True
+    assert results["follower"]["productId"] == "652874123456"
+    assert converter.convert_link(SHORT_LINK)["productId"] == "652874123456"
+
+
+def test_async_follower_retries_when_leader_runs_out_of_budget():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "m.tb.cn":
+            await asyncio.sleep(0.3)
+            return httpx.Response(302, headers={"location": TAOBAO_ITEM})
+        return httpx.Response(200)
+
+    async def main():
+        client, converter = async_converter(handler)
+        async with client, converter:
+
+            async def follower():
+                await asyncio.sleep(0.02)
+                return await converter.convert_link(SHORT_LINK)
+
+            return await asyncio.gather(
+                converter.convert_link(SHORT_LINK, budget_ms=50), follower()
+            )
+
+    leader, follower = asyncio.run(main())
+    assert leader["timedOut"] is True
+    assert follower["productId"] == "652874123456"
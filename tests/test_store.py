@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import httpx
+import pytest
+
+import link_converter
+from conftest import FakeClock
+from link_converter import SQLiteResolutionStore
+
+AGENT_PAGE = "https://agent.example.com/p/some/long/path?x=1"
+
+
+def taobao_item(item_id: str) -> str:
+    return f"https://item.taobao.com/item.htm?id={item_id}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Drives the store's wall-clock expiry."""
+    clock = FakeClock()
+    monkeypatch.setattr(link_converter.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    stores = []
+
+    def make(**options) -> SQLiteResolutionStore:
+        store = SQLiteResolutionStore(str(tmp_path / "store.sqlite3"), **options)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_conversions_and_redirects_round_trip(make_store):
+    store = make_store()
+    result = {"rawLink": taobao_item("1"), "productId": "1", "isValid": True}
+    store.put_conversion("k", result)
+    store.put_redirect("r", taobao_item("1"), ["https://bit.ly/x", taobao_item("1")])
+
+    # A second store on the same file sees what the first wrote
+    other = make_store()
+    assert other.get_conversion("k") == result
+    assert other.get_redirect("r") == (
+        taobao_item("1"),
+        ["https://bit.ly/x", taobao_item("1")],
+    )
+    assert other.get_conversion("missing") is None
+
+
+def test_rows_expire_after_their_ttl(make_store, clock):
+    store = make_store(ttl=100, negative_ttl=10, compact_interval=1e9)
+    store.put_conversion("hit", {"productId": "1"})
+    store.put_conversion("miss", {"productId": ""}, negative=True)
+    store.put_redirect("r", "https://bit.ly/x", ["https://bit.ly/x"], negative=True)
+
+    clock.now += 11
+    assert store.get_conversion("hit") == {"productId": "1"}
+    assert store.get_conversion("miss") is None
+    assert store.get_redirect("r") is None
+
+    clock.now += 90
+    assert store.get_conversion("hit") is None
+
+
+def test_compact_deletes_expired_rows(make_store, clock):
+    store = make_store(ttl=100, negative_ttl=10, compact_interval=1e9)
+    store.put_conversion("hit", {"productId": "1"})
+    store.put_conversion("miss", {"productId": ""}, negative=True)
+    store.put_redirect("r", "https://bit.ly/x", ["https://bit.ly/x"], negative=True)
+
+    clock.now += 11
+    assert store.compact() == 2
+    assert store.compact() == 0
+    assert store.get_conversion("hit") == {"productId": "1"}
+
+
+def test_writes_compact_every_compact_interval(make_store, clock):
+    store = make_store(ttl=10, compact_interval=60)
+    store.put_conversion("old", {"productId": "1"})
+
+    clock.now += 61
+    store.put_conversion("new", {"productId": "2"})
+    count = store._connection().execute("SELECT COUNT(*) FROM conversions")
+    assert count.fetchone()[0] == 1
+
+
+def test_inputs_differing_only_in_the_fragment_are_stored_apart(
+    make_converter, make_store
+):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "e.tb.cn":
+            item_id = {"/aaa": "111111", "/bbb": "222222"}[request.url.path]
+            return httpx.Response(302, headers={"location": taobao_item(item_id)})
+        return httpx.Response(404)
+
+    converter = make_converter(handler, store=make_store())
+    first = converter.convert_link("https://x.com/#/?url=https://e.tb.cn/aaa")
+    second = converter.convert_link("https://x.com/#/?url=https://e.tb.cn/bbb")
+
+    assert first["productId"] == "111111"
+    assert second["productId"] == "222222"
+
+
+def test_result_without_product_id_is_kept_for_negative_ttl_only(
+    make_converter, make_store
+):
+    upstream = {"status": 503}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if upstream["status"] != 200:
+            return httpx.Response(upstream["status"])
+        return httpx.Response(
+            200,
+            text=f"<html><a href='{taobao_item('333333')}'></a></html>",
+            headers={"content-type": "text/html"},
+        )
+
+    store = make_store(negative_ttl=0)
+    converter = make_converter(handler, store=store)
+    failed = converter.convert_link(AGENT_PAGE)
+    assert failed["isValid"] is True
+    assert failed["productId"] == ""
+
+    upstream["status"] = 200
+    assert converter.convert_link(AGENT_PAGE)["productId"] == "333333"
+    # Complete answers are stored for the full ttl
+    assert converter.convert_link(AGENT_PAGE)["productId"] == "333333"
+    assert store.get_conversion(converter._conversion_key(AGENT_PAGE)) is not None
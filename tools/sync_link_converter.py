@@ -0,0 +1,90 @@
+"""
+Keeps the per-site copies of the link converter identical.
+
+Every site ships its own link_converter.py and the Python scripts around
+it; acbuy-spreadsheet.xyz holds the copy that gets edited. After changing
+it, copy the shared files to every other site with
+
+    python tools/sync_link_converter.py
+
+`--check` only lists the copies that differ (exit status 1 if any); the
+test suite runs it, so a forgotten sync fails CI.
+"""
+
+from __future__ import annotations
+
+import argparse
+import filecmp
+import os
+import shutil
+import sys
+from typing import List, Optional, Sequence
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CANONICAL_SITE = "acbuy-spreadsheet.xyz"
+SHARED_FILES = (
+    "link_converter.py",
+    "scripts/bench_link_converter.py",
+    "scripts/bench_link_converter.expected.json",
+    "scripts/load_test_link_converter.py",
+    "scripts/mock_upstream.py",
+)
+
+
+def site_dirs(root: str = ROOT) -> List[str]:
+    """Every site directory shipping a link converter, canonical one first."""
+    sites = sorted(
+        name
+        for name in os.listdir(root)
+        if os.path.isfile(os.path.join(root, name, "link_converter.py"))
+    )
+    sites.remove(CANONICAL_SITE)
+    return [CANONICAL_SITE] + sites
+
+
+def drifted(root: str = ROOT) -> List[str]:
+    """Site-relative paths of the copies that differ from the canonical site."""
+    stale = []
+    for site in site_dirs(root)[1:]:
+        for path in SHARED_FILES:
+            source = os.path.join(root, CANONICAL_SITE, path)
+            copy = os.path.join(root, site, path)
+            if not os.path.isfile(copy) or not filecmp.cmp(source, copy, shallow=False):
+                stale.append(f"{site}/{path}")
+    return stale
+
+
+def sync(root: str = ROOT) -> List[str]:
+    """Copies the canonical shared files over every stale copy; returns those."""
+    stale = drifted(root)
+    for target in stale:
+        path = target.split("/", 1)[1]
+        os.makedirs(os.path.dirname(os.path.join(root, target)), exist_ok=True)
+        shutil.copyfile(
+            os.path.join(root, CANONICAL_SITE, path), os.path.join(root, target)
+        )
+    return stale
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python tools/sync_link_converter.py",
+        description=f"Copy the shared files from {CANONICAL_SITE} to every site.",
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="only list copies that differ"
+    )
+    args = parser.parse_args(argv)
+
+    if args.check:
+        stale = drifted()
+        for target in stale:
+            print(f"differs from {CANONICAL_SITE}: {target}")
+        return 1 if stale else 0
+    for target in sync():
+        print(f"updated {target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())